@@ -4,11 +4,16 @@
 整合所有分布式功能模块，提供统一的分布式数据库接口
 """
 
+import asyncio
+import os
+import re
 import threading
 import time
 import uuid
 from typing import Dict, List, Any, Optional, Tuple
 import logging
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
 
 from .sharding import ShardManager, ShardingType
 from .query_processor import DistributedQueryProcessor
@@ -18,17 +23,27 @@ from .fault_tolerance import FaultToleranceManager, NodeInfo, NodeStatus
 from .coordination import ClusterCoordinator, NodeRole
 from .monitoring import DistributedMonitor
 
+# 只有普通SELECT进入结果缓存，其余语句（含REPLACE、MERGE、WITH ... UPDATE等）都视为写操作
+_CACHEABLE_QUERY_RE = re.compile(r'\s*SELECT\b(?!.*\b(?:INTO|FOR\s+UPDATE)\b)', re.IGNORECASE | re.DOTALL)
+
 class DistributedDatabase:
     """分布式数据库主控制器"""
     
-    def __init__(self, node_id: str, initial_cluster_members: List[str] = None):
+    def __init__(self, node_id: str, initial_cluster_members: List[str] = None,
+                 query_cache_size: int = 0, query_cache_ttl: float = 5.0):
         self.node_id = node_id
         self.is_distributed_mode = bool(initial_cluster_members)
         
+        # 各子系统共享同一个线程池，减少常驻线程数和GIL争用
+        self._shared_pool = ThreadPoolExecutor(
+            max_workers=(os.cpu_count() or 1) * 2,
+            thread_name_prefix=f"ddb-{node_id}"
+        )
+        
         # 核心组件
         self.shard_manager = ShardManager()
-        self.query_processor = DistributedQueryProcessor(self.shard_manager)
-        self.replication_manager = ReplicationManager(node_id)
+        self.query_processor = DistributedQueryProcessor(self.shard_manager, executor=self._shared_pool)
+        self.replication_manager = ReplicationManager(node_id, executor=self._shared_pool)
         self.transaction_manager = DistributedTransactionManager(node_id)
         self.fault_tolerance = FaultToleranceManager(node_id)
         self.coordinator = ClusterCoordinator(node_id, initial_cluster_members) if self.is_distributed_mode else None
@@ -39,6 +54,20 @@ class DistributedDatabase:
         self.lock = threading.RLock()
         self.logger = logging.getLogger(__name__)
         
+        # 查询结果缓存（默认关闭）: (sql, table_name, 分片元数据epoch) -> (过期时间, data, columns)
+        # 只能感知经由execute_query的写操作，开启时需能接受TTL内的过期结果
+        self._query_cache: "OrderedDict[Tuple[str, Optional[str], int], Tuple[float, List[Dict[str, Any]], List[str]]]" = OrderedDict()
+        self._query_cache_size = query_cache_size
+        self._query_cache_ttl = query_cache_ttl
+        self._query_cache_lock = threading.Lock()
+        # 写操作计数，查询期间发生过写操作时其结果不写入缓存
+        self._write_generation = 0
+        
+        # 预绑定回调热路径上的方法，避免每次事件分发时重复属性查找
+        self._log_info = self.logger.info
+        self._log_warning = self.logger.warning
+        self._ft_record = self.fault_tolerance.record_failure_event
+        
         # 设置组件间的回调
         self._setup_callbacks()
     
@@ -109,6 +138,7 @@ class DistributedDatabase:
                 if self.coordinator:
                     self.coordinator.stop()
                 
+                self._shared_pool.shutdown(wait=True)
                 self.running = False
                 self.logger.info(f"Distributed database node {self.node_id} stopped")
                 
@@ -161,6 +191,22 @@ class DistributedDatabase:
         # 开始监控
         query_metrics = self.monitor.record_query(query_id, sql)
         
+        cacheable = invalidate = False
+        if self._query_cache_size > 0:
+            cacheable = _CACHEABLE_QUERY_RE.match(sql) is not None
+            if cacheable:
+                # 只读查询优先命中结果缓存，跳过查询计划和分片执行
+                cache_key = (sql, table_name, self.shard_manager.epoch)
+                generation = self._write_generation
+                cached = self._get_cached_result(cache_key)
+                if cached is not None:
+                    self.monitor.complete_query(query_id, rows_returned=len(cached[0]), rows_examined=0)
+                    return cached
+            else:
+                # 写操作会使已缓存的结果过期，执行完成后再清空一次，丢弃执行期间写入的旧结果
+                invalidate = True
+                self.clear_query_cache()
+        
         try:
             # 如果指定了表名，使用分布式查询处理
             if table_name:
@@ -186,6 +232,8 @@ class DistributedDatabase:
                         rows_examined=len(all_data)
                     )
                     
+                    if cacheable:
+                        self._cache_result(cache_key, all_data, columns, generation)
                     return all_data, columns
             
             # 单节点查询
@@ -197,11 +245,61 @@ class DistributedDatabase:
                 rows_examined=len(data)
             )
             
+            if cacheable:
+                self._cache_result(cache_key, data, columns, generation)
             return data, columns
             
         except Exception as e:
             self.monitor.complete_query(query_id, error_message=str(e))
             raise
+        finally:
+            if invalidate:
+                self.clear_query_cache()
+    
+    def _get_cached_result(self, cache_key) -> Optional[Tuple[List[Dict[str, Any]], List[str]]]:
+        """读取查询结果缓存，过期条目视为未命中"""
+        with self._query_cache_lock:
+            entry = self._query_cache.get(cache_key)
+            if entry is None:
+                return None
+            
+            expires_at, data, columns = entry
+            if expires_at < time.monotonic():
+                del self._query_cache[cache_key]
+                return None
+            
+            self._query_cache.move_to_end(cache_key)
+        
+        # 返回行的副本，避免调用方修改缓存内容
+        return [dict(row) for row in data], list(columns)
+    
+    def _cache_result(self, cache_key, data: List[Dict[str, Any]], columns: List[str], generation: int):
+        """写入查询结果缓存，超出容量时淘汰最久未使用的条目"""
+        if self._query_cache_size <= 0:
+            return
+        
+        rows = [dict(row) for row in data]
+        with self._query_cache_lock:
+            if generation != self._write_generation:
+                # 查询开始后发生过写操作，结果可能已过期
+                return
+            self._query_cache[cache_key] = (
+                time.monotonic() + self._query_cache_ttl, rows, list(columns)
+            )
+            self._query_cache.move_to_end(cache_key)
+            while len(self._query_cache) > self._query_cache_size:
+                self._query_cache.popitem(last=False)
+    
+    def clear_query_cache(self):
+        """清空查询结果缓存"""
+        with self._query_cache_lock:
+            self._write_generation += 1
+            self._query_cache.clear()
+    
+    async def aexecute_query(self, sql: str, table_name: str = None) -> Tuple[List[Dict[str, Any]], List[str]]:
+        """异步执行分布式查询（供asyncio调用方使用，不阻塞事件循环）"""
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, self.execute_query, sql, table_name)
     
     def _execute_fragment(self, sql: str, shard_id: str, node_id: str) -> Tuple[List[Dict[str, Any]], List[str], int]:
         """执行查询片段（供分布式查询处理器调用）"""
@@ -341,7 +439,7 @@ class DistributedDatabase:
     # 回调处理方法
     def _on_member_change(self, change_type: str, member_id: str):
         """处理集群成员变化"""
-        self.logger.info(f"Cluster member {change_type}: {member_id}")
+        self._log_info(f"Cluster member {change_type}: {member_id}")
         
         if change_type == "join":
             # 新节点加入，可能需要重新平衡分片
@@ -352,15 +450,15 @@ class DistributedDatabase:
     
     def _on_leader_change(self, new_leader_id: str):
         """处理领导者变化"""
-        self.logger.info(f"New cluster leader: {new_leader_id}")
+        self._log_info(f"New cluster leader: {new_leader_id}")
         
         # 如果自己成为领导者，可能需要承担额外职责
         if new_leader_id == self.node_id:
-            self.logger.info("This node is now the cluster leader")
+            self._log_info("This node is now the cluster leader")
     
     def _on_config_change(self, change_type: str, key: str, value: Any):
         """处理配置变化"""
-        self.logger.info(f"Config {change_type}: {key} = {value}")
+        self._log_info(f"Config {change_type}: {key} = {value}")
         
         # 根据配置变化调整系统行为
         if key == "replication_mode":
@@ -370,28 +468,30 @@ class DistributedDatabase:
     
     def _on_node_failure(self, node_id: str, failure_type):
         """处理节点故障"""
-        self.logger.warning(f"Node {node_id} failed: {failure_type}")
+        self._log_warning(f"Node {node_id} failed: {failure_type}")
         
         # 记录故障事件
-        self.fault_tolerance.record_failure_event(
+        self._ft_record(
             node_id, failure_type, f"Node {node_id} failed with {failure_type}"
         )
         
         # 可能需要触发故障转移
-        if self.coordinator:
-            self.coordinator.leave_cluster(node_id)
+        coordinator = self.coordinator
+        if coordinator:
+            coordinator.leave_cluster(node_id)
     
     def _on_node_recovery(self, node_id: str):
         """处理节点恢复"""
-        self.logger.info(f"Node {node_id} recovered")
+        self._log_info(f"Node {node_id} recovered")
         
         # 节点恢复后可能需要重新加入集群
-        if self.coordinator:
-            self.coordinator.join_cluster(node_id, f"node_{node_id}")
+        coordinator = self.coordinator
+        if coordinator:
+            coordinator.join_cluster(node_id, f"node_{node_id}")
     
     def _on_alert(self, alert):
         """处理监控告警"""
-        self.logger.warning(f"Alert: {alert.message} (Level: {alert.level.value})")
+        self._log_warning(f"Alert: {alert.message} (Level: {alert.level.value})")
         
         # 根据告警级别采取行动
         if alert.level.value == "critical":
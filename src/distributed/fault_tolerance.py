@@ -7,13 +7,20 @@
 import threading
 import time
 import random
-from typing import Dict, List, Any, Optional, Set, Callable
+from typing import Dict, List, Any, Optional, Set, Callable, Tuple, Deque
 from dataclasses import dataclass, field
 from enum import Enum
 import json
 import logging
-from concurrent.futures import ThreadPoolExecutor
+from concurrent.futures import Future, wait, FIRST_COMPLETED
 import queue
+import heapq
+import bisect
+import itertools
+from collections import deque
+from operator import attrgetter
+
+from .rwlock import RWLock
 
 class NodeStatus(Enum):
     """节点状态"""
@@ -37,6 +44,10 @@ class RecoveryStrategy(Enum):
     DELAYED = "delayed"
     MANUAL = "manual"
 
+# 枚举值字符串的预计算映射，导出状态时直接查表
+_STATUS_STR = {status: status.value for status in NodeStatus}
+_FAILURE_TYPE_STR = {failure_type: failure_type.value for failure_type in FailureType}
+
 @dataclass
 class NodeInfo:
     """节点信息"""
@@ -51,6 +62,11 @@ class NodeInfo:
     disk_usage: float = 0.0
     network_latency: float = 0.0
     priority: int = 1
+    # 缓存的健康分数，指标或状态变化时通过refresh_health_score更新
+    health_score: float = field(default=0.0, init=False, repr=False, compare=False)
+    
+    def __post_init__(self):
+        self.refresh_health_score()
     
     @property
     def is_healthy(self) -> bool:
@@ -58,10 +74,10 @@ class NodeInfo:
         return (self.status == NodeStatus.HEALTHY and 
                 time.time() - self.last_heartbeat < 30.0)
     
-    @property
-    def health_score(self) -> float:
-        """计算节点健康分数"""
+    def refresh_health_score(self) -> float:
+        """重新计算节点健康分数"""
         if self.status != NodeStatus.HEALTHY:
+            self.health_score = 0.0
             return 0.0
         
         # 基于负载、延迟等计算健康分数
@@ -70,7 +86,8 @@ class NodeInfo:
         memory_score = max(0, 1.0 - self.memory_usage / 100.0)
         latency_score = max(0, 1.0 - self.network_latency / 1000.0)
         
-        return (load_score + cpu_score + memory_score + latency_score) / 4.0
+        self.health_score = (load_score + cpu_score + memory_score + latency_score) / 4.0
+        return self.health_score
 
 @dataclass
 class FailureEvent:
@@ -87,16 +104,33 @@ class FailureEvent:
 class FailureDetector:
     """故障检测器"""
     
+    # 心跳接收线程单次加锁最多处理的心跳数
+    HEARTBEAT_BATCH_SIZE = 1000
+    # 超过该时间没有心跳的节点不视为健康（与NodeInfo.is_healthy一致）
+    HEALTHY_HEARTBEAT_TIMEOUT = 30.0
+    # 健康检查每次持有写锁处理的节点数
+    HEALTH_CHECK_SLICE_SIZE = 512
+    
     def __init__(self, heartbeat_interval: float = 5.0, failure_threshold: int = 3):
         self.heartbeat_interval = heartbeat_interval
         self.failure_threshold = failure_threshold
         self.nodes: Dict[str, NodeInfo] = {}
-        self.failure_callbacks: List[Callable] = []
-        self.recovery_callbacks: List[Callable] = []
+        # 健康节点快照，只在节点状态变化时重建，读取时无需加锁
+        self._healthy_nodes: Tuple[NodeInfo, ...] = ()
+        # 回调以不可变元组发布：注册时整体替换，触发时读取一次即可遍历，无需加锁
+        self.failure_callbacks: Tuple[Callable, ...] = ()
+        self.recovery_callbacks: Tuple[Callable, ...] = ()
         
         self.running = False
         self.detector_thread = None
+        self._stop_event = threading.Event()
+        
+        # 心跳由独立的接收线程处理，update_heartbeat只做无锁入队
+        self._heartbeat_queue = queue.SimpleQueue()
+        self.heartbeat_thread = None
+        # lock保护启停与回调列表，rwlock保护节点状态（读多写少）
         self.lock = threading.RLock()
+        self.rwlock = RWLock()
         self.logger = logging.getLogger(__name__)
     
     def start(self):
@@ -106,8 +140,11 @@ class FailureDetector:
                 return
             
             self.running = True
+            self._stop_event.clear()
             self.detector_thread = threading.Thread(target=self._detection_worker, daemon=True)
+            self.heartbeat_thread = threading.Thread(target=self._heartbeat_worker, daemon=True)
             self.detector_thread.start()
+            self.heartbeat_thread.start()
             
             self.logger.info("Failure detector started")
     
@@ -118,88 +155,202 @@ class FailureDetector:
                 return
             
             self.running = False
+            self._stop_event.set()  # 立即唤醒检测线程
+            self._heartbeat_queue.put(None)  # 唤醒心跳接收线程
             if self.detector_thread:
                 self.detector_thread.join(timeout=5.0)
+            if self.heartbeat_thread:
+                self.heartbeat_thread.join(timeout=5.0)
             
             self.logger.info("Failure detector stopped")
     
     def register_node(self, node: NodeInfo):
         """注册节点"""
-        with self.lock:
+        with self.rwlock.write_lock:
             self.nodes[node.node_id] = node
-            self.logger.info(f"Node {node.node_id} registered")
+            self._rebuild_healthy_snapshot(time.time())
+        self.logger.info(f"Node {node.node_id} registered")
     
     def unregister_node(self, node_id: str):
         """注销节点"""
-        with self.lock:
-            if node_id in self.nodes:
-                del self.nodes[node_id]
-                self.logger.info(f"Node {node_id} unregistered")
+        with self.rwlock.write_lock:
+            removed = self.nodes.pop(node_id, None) is not None
+            if removed:
+                self._rebuild_healthy_snapshot(time.time())
+        if removed:
+            self.logger.info(f"Node {node_id} unregistered")
     
     def update_heartbeat(self, node_id: str, metrics: Dict[str, Any] = None):
         """更新心跳"""
-        with self.lock:
-            if node_id not in self.nodes:
-                return
-            
-            node = self.nodes[node_id]
-            node.last_heartbeat = time.time()
-            
-            # 更新节点指标
-            if metrics:
-                node.load_average = metrics.get('load_average', node.load_average)
-                node.cpu_usage = metrics.get('cpu_usage', node.cpu_usage)
-                node.memory_usage = metrics.get('memory_usage', node.memory_usage)
-                node.disk_usage = metrics.get('disk_usage', node.disk_usage)
-                node.network_latency = metrics.get('network_latency', node.network_latency)
-            
-            # 如果节点之前是失败状态，现在恢复了
-            if node.status == NodeStatus.FAILED:
-                node.status = NodeStatus.RECOVERING
-                node.failure_count = 0
-                self._trigger_recovery_callbacks(node_id)
+        if self.running:
+            # 入队后立即返回，由心跳接收线程更新节点状态，避免与检测扫描争锁
+            self._heartbeat_queue.put((node_id, time.time(), metrics))
+        else:
+            self._apply_heartbeats([(node_id, time.time(), metrics)])
+    
+    def _heartbeat_worker(self):
+        """心跳接收线程"""
+        heartbeat_queue = self._heartbeat_queue
+        max_batch = self.HEARTBEAT_BATCH_SIZE
+        stopping = False
+        
+        while not stopping:
+            try:
+                # 阻塞等待第一条心跳，然后一次性取走已积压的心跳，整批只加一次锁
+                batch = []
+                item = heartbeat_queue.get()
+                while True:
+                    if item is None:
+                        stopping = True  # stop()放入的哨兵，之前入队的心跳均已取出
+                        break
+                    batch.append(item)
+                    if len(batch) >= max_batch:
+                        break
+                    try:
+                        item = heartbeat_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                
+                if batch:
+                    self._apply_heartbeats(batch)
+            except Exception as e:
+                self.logger.error(f"Heartbeat worker error: {e}")
+    
+    def _apply_heartbeats(self, batch: List[Tuple[str, float, Optional[Dict[str, Any]]]]):
+        """将一批心跳应用到节点状态"""
+        # 恢复回调在释放写锁后触发，回调耗时不会阻塞其他心跳
+        pending_recovery = []
+        
+        with self.rwlock.write_lock:
+            for node_id, heartbeat_time, metrics in batch:
+                node = self.nodes.get(node_id)
+                if node is None:
+                    continue
+                
+                node.last_heartbeat = heartbeat_time
+                
+                # 更新节点指标
+                if metrics:
+                    node.load_average = metrics.get('load_average', node.load_average)
+                    node.cpu_usage = metrics.get('cpu_usage', node.cpu_usage)
+                    node.memory_usage = metrics.get('memory_usage', node.memory_usage)
+                    node.disk_usage = metrics.get('disk_usage', node.disk_usage)
+                    node.network_latency = metrics.get('network_latency', node.network_latency)
+                
+                # 如果节点之前是失败状态，现在恢复了
+                if node.status == NodeStatus.FAILED:
+                    node.status = NodeStatus.RECOVERING
+                    node.failure_count = 0
+                    pending_recovery.append(node_id)
+                
+                if metrics:
+                    node.refresh_health_score()
+        
+        for node_id in pending_recovery:
+            self._trigger_recovery_callbacks(node_id)
     
     def _detection_worker(self):
         """检测工作线程"""
+        # 按单调时钟的固定节拍调度，检测耗时不会累积成周期漂移
+        next_tick = time.monotonic()
         while self.running:
             try:
                 self._check_node_health()
-                time.sleep(self.heartbeat_interval)
             except Exception as e:
                 self.logger.error(f"Detection worker error: {e}")
+            
+            next_tick += self.heartbeat_interval
+            now = time.monotonic()
+            if next_tick < now:
+                # 落后超过一个周期时不补跑错过的节拍
+                next_tick = now
+            if self._stop_event.wait(next_tick - now):
+                break
     
     def _check_node_health(self):
         """检查节点健康状态"""
         current_time = time.time()
         
-        with self.lock:
-            for node_id, node in self.nodes.items():
-                time_since_heartbeat = current_time - node.last_heartbeat
-                
-                if node.status == NodeStatus.HEALTHY:
-                    if time_since_heartbeat > self.heartbeat_interval * 2:
-                        node.status = NodeStatus.SUSPECT
-                        self.logger.warning(f"Node {node_id} is suspect (no heartbeat for {time_since_heartbeat:.1f}s)")
-                
-                elif node.status == NodeStatus.SUSPECT:
-                    if time_since_heartbeat > self.heartbeat_interval * self.failure_threshold:
-                        node.status = NodeStatus.FAILED
-                        node.failure_count += 1
-                        self.logger.error(f"Node {node_id} failed (no heartbeat for {time_since_heartbeat:.1f}s)")
-                        self._trigger_failure_callbacks(node_id, FailureType.TIMEOUT)
-                    elif time_since_heartbeat <= self.heartbeat_interval * 2:
-                        node.status = NodeStatus.HEALTHY
-                        self.logger.info(f"Node {node_id} recovered from suspect state")
-                
-                elif node.status == NodeStatus.RECOVERING:
-                    if time_since_heartbeat <= self.heartbeat_interval * 2:
-                        node.status = NodeStatus.HEALTHY
-                        self.logger.info(f"Node {node_id} fully recovered")
-                    elif time_since_heartbeat > self.heartbeat_interval * self.failure_threshold:
-                        node.status = NodeStatus.FAILED
-                        node.failure_count += 1
-                        self.logger.error(f"Node {node_id} failed again during recovery")
-                        self._trigger_failure_callbacks(node_id, FailureType.TIMEOUT)
+        # 阈值在整次扫描中不变，先换算成心跳时间戳的截止点，
+        # 每个节点只需一次浮点比较即可判断是否超时
+        suspect_cutoff = current_time - self.heartbeat_interval * 2
+        failed_cutoff = current_time - self.heartbeat_interval * self.failure_threshold
+        healthy, suspect, recovering, failed = (
+            NodeStatus.HEALTHY, NodeStatus.SUSPECT, NodeStatus.RECOVERING, NodeStatus.FAILED
+        )
+        
+        # 日志与故障回调在释放写锁后再执行，避免阻塞心跳更新
+        pending_logs = []
+        pending_failures = []
+        
+        with self.rwlock.read_lock:
+            items = list(self.nodes.items())
+        
+        # 大集群分片扫描，每片之间释放写锁并让出CPU，避免长时间阻塞读者和心跳线程
+        slice_size = self.HEALTH_CHECK_SLICE_SIZE
+        nodes = self.nodes
+        for begin in range(0, len(items), slice_size):
+            if begin:
+                time.sleep(0)
+            
+            with self.rwlock.write_lock:
+                for node_id, node in items[begin:begin + slice_size]:
+                    if nodes.get(node_id) is not node:
+                        continue  # 扫描期间已被注销
+                    
+                    status = node.status
+                    last_heartbeat = node.last_heartbeat
+                    
+                    if status is healthy:
+                        # 绝大多数节点处于健康状态且心跳新鲜，直接跳过
+                        if last_heartbeat >= suspect_cutoff:
+                            continue
+                        node.status = suspect
+                        node.refresh_health_score()
+                        pending_logs.append((logging.WARNING, f"Node {node_id} is suspect (no heartbeat for {current_time - last_heartbeat:.1f}s)"))
+                    
+                    elif status is suspect:
+                        if last_heartbeat < failed_cutoff:
+                            node.status = failed
+                            node.refresh_health_score()
+                            node.failure_count += 1
+                            pending_logs.append((logging.ERROR, f"Node {node_id} failed (no heartbeat for {current_time - last_heartbeat:.1f}s)"))
+                            pending_failures.append(node_id)
+                        elif last_heartbeat >= suspect_cutoff:
+                            node.status = healthy
+                            node.refresh_health_score()
+                            pending_logs.append((logging.INFO, f"Node {node_id} recovered from suspect state"))
+                    
+                    elif status is recovering:
+                        if last_heartbeat >= suspect_cutoff:
+                            node.status = healthy
+                            node.refresh_health_score()
+                            pending_logs.append((logging.INFO, f"Node {node_id} fully recovered"))
+                        elif last_heartbeat < failed_cutoff:
+                            node.status = failed
+                            node.refresh_health_score()
+                            node.failure_count += 1
+                            pending_logs.append((logging.ERROR, f"Node {node_id} failed again during recovery"))
+                            pending_failures.append(node_id)
+        
+        with self.rwlock.write_lock:
+            self._rebuild_healthy_snapshot(current_time)
+        
+        log = self.logger.log
+        for level, message in pending_logs:
+            log(level, message)
+        
+        for node_id in pending_failures:
+            self._trigger_failure_callbacks(node_id, FailureType.TIMEOUT)
+    
+    def _rebuild_healthy_snapshot(self, current_time: float):
+        """重建健康节点快照（调用方需持有写锁）"""
+        cutoff = current_time - self.HEALTHY_HEARTBEAT_TIMEOUT
+        healthy = NodeStatus.HEALTHY
+        self._healthy_nodes = tuple(
+            node for node in self.nodes.values()
+            if node.status is healthy and node.last_heartbeat > cutoff
+        )
     
     def _trigger_failure_callbacks(self, node_id: str, failure_type: FailureType):
         """触发故障回调"""
@@ -219,39 +370,50 @@ class FailureDetector:
     
     def add_failure_callback(self, callback: Callable):
         """添加故障回调"""
-        self.failure_callbacks.append(callback)
+        with self.lock:
+            self.failure_callbacks = self.failure_callbacks + (callback,)
     
     def add_recovery_callback(self, callback: Callable):
         """添加恢复回调"""
-        self.recovery_callbacks.append(callback)
+        with self.lock:
+            self.recovery_callbacks = self.recovery_callbacks + (callback,)
     
     def get_healthy_nodes(self) -> List[NodeInfo]:
         """获取健康节点列表"""
-        with self.lock:
+        if self.running:
+            # 检测线程每个心跳周期都会刷新快照，直接返回即可
+            return list(self._healthy_nodes)
+        
+        with self.rwlock.read_lock:
             return [node for node in self.nodes.values() if node.is_healthy]
     
     def get_failed_nodes(self) -> List[NodeInfo]:
         """获取失败节点列表"""
-        with self.lock:
+        with self.rwlock.read_lock:
             return [node for node in self.nodes.values() if node.status == NodeStatus.FAILED]
     
     def get_node_status(self, node_id: str) -> Optional[NodeStatus]:
         """获取节点状态"""
-        with self.lock:
+        with self.rwlock.read_lock:
             if node_id in self.nodes:
                 return self.nodes[node_id].status
             return None
 
+_health_score_of = attrgetter('health_score')
+_node_id_of = attrgetter('node_id')
+
 class LoadBalancer:
     """负载均衡器"""
     
     def __init__(self, strategy: str = "round_robin"):
         self.strategy = strategy
-        self.node_counters: Dict[str, int] = {}
+        self.node_counters: Dict[Tuple[str, ...], int] = {}
+        self.current_weights: Dict[str, int] = {}  # 平滑加权轮询的当前权重
         self.lock = threading.RLock()
     
-    def select_node(self, nodes: List[NodeInfo], exclude: Set[str] = None) -> Optional[NodeInfo]:
-        """选择节点"""
+    def select_node(self, nodes: List[NodeInfo], exclude: Set[str] = None,
+                    prefiltered: bool = False) -> Optional[NodeInfo]:
+        """选择节点，prefiltered表示调用方给出的已经是健康节点快照"""
         if not nodes:
             return None
         
@@ -261,7 +423,7 @@ class LoadBalancer:
         if not nodes:
             return None
         
-        healthy_nodes = [node for node in nodes if node.is_healthy]
+        healthy_nodes = nodes if prefiltered else [node for node in nodes if node.is_healthy]
         if not healthy_nodes:
             return None
         
@@ -278,25 +440,44 @@ class LoadBalancer:
     
     def _round_robin_select(self, nodes: List[NodeInfo]) -> NodeInfo:
         """轮询选择"""
+        # 节点ID元组作为计数器键：字符串哈希已缓存，无需每次排序和拼接。
+        # 调用方（健康节点快照）给出的节点顺序是稳定的。
+        nodes_key = tuple(map(_node_id_of, nodes))
+        
         with self.lock:
-            nodes_key = "|".join(sorted(node.node_id for node in nodes))
-            
-            if nodes_key not in self.node_counters:
-                self.node_counters[nodes_key] = 0
-            
-            selected_index = self.node_counters[nodes_key] % len(nodes)
-            self.node_counters[nodes_key] = (self.node_counters[nodes_key] + 1) % len(nodes)
-            
-            return nodes[selected_index]
+            selected_index = self.node_counters.get(nodes_key, 0) % len(nodes)
+            self.node_counters[nodes_key] = (selected_index + 1) % len(nodes)
+        
+        return nodes[selected_index]
     
     def _weighted_round_robin_select(self, nodes: List[NodeInfo]) -> NodeInfo:
         """加权轮询选择"""
-        # 基于优先级的加权选择
-        weighted_nodes = []
-        for node in nodes:
-            weighted_nodes.extend([node] * node.priority)
+        # 平滑加权轮询（nginx SWRR）：每轮给各节点当前权重加上其优先级，
+        # 选出当前权重最大的节点后减去总权重。分布与按优先级展开列表轮询一致，
+        # 但不需要每次分配展开后的列表
+        with self.lock:
+            current_weights = self.current_weights
+            total_weight = 0
+            selected = None
+            selected_weight = 0
+            
+            for node in nodes:
+                priority = node.priority
+                if priority <= 0:
+                    continue
+                weight = current_weights.get(node.node_id, 0) + priority
+                current_weights[node.node_id] = weight
+                total_weight += priority
+                if selected is None or weight > selected_weight:
+                    selected = node
+                    selected_weight = weight
+            
+            if selected is not None:
+                current_weights[selected.node_id] = selected_weight - total_weight
+                return selected
         
-        return self._round_robin_select(weighted_nodes)
+        # 所有节点优先级都不大于0时退化为普通轮询
+        return self._round_robin_select(nodes)
     
     def _least_connections_select(self, nodes: List[NodeInfo]) -> NodeInfo:
         """最少连接选择"""
@@ -305,16 +486,97 @@ class LoadBalancer:
     
     def _health_based_select(self, nodes: List[NodeInfo]) -> NodeInfo:
         """基于健康分数选择"""
-        return max(nodes, key=lambda n: n.health_score)
+        return max(nodes, key=_health_score_of)
+
+class _DaemonThreadPool:
+    """有界守护线程池（ThreadPoolExecutor接口的子集），工作线程不阻塞解释器退出"""
+    
+    def __init__(self, max_workers: int, thread_name_prefix: str = ""):
+        self._max_workers = max_workers
+        self._thread_name_prefix = thread_name_prefix
+        self._work_queue = queue.SimpleQueue()
+        # 空闲工作线程数，有空闲线程时不再创建新线程
+        self._idle = threading.Semaphore(0)
+        self._threads: List[threading.Thread] = []
+        self._shutdown = False
+        self._lock = threading.Lock()
+    
+    def submit(self, fn: Callable, *args) -> Future:
+        """提交任务"""
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError("cannot schedule new futures after shutdown")
+            
+            future = Future()
+            self._work_queue.put((future, fn, args))
+            if not self._idle.acquire(blocking=False) and len(self._threads) < self._max_workers:
+                thread = threading.Thread(
+                    target=self._worker, daemon=True,
+                    name=f"{self._thread_name_prefix}_{len(self._threads)}"
+                )
+                thread.start()
+                self._threads.append(thread)
+            return future
+    
+    def _worker(self):
+        """工作线程：依次执行队列中的任务，收到None时退出"""
+        while True:
+            item = self._work_queue.get()
+            if item is None:
+                return
+            
+            future, fn, args = item
+            if future.set_running_or_notify_cancel():
+                try:
+                    future.set_result(fn(*args))
+                except Exception as e:
+                    future.set_exception(e)
+            self._idle.release()
+    
+    def shutdown(self, cancel_futures: bool = False):
+        """停止接受新任务，cancel_futures为True时取消尚未开始的任务"""
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                while True:
+                    try:
+                        item = self._work_queue.get_nowait()
+                    except queue.Empty:
+                        break
+                    if item is not None:
+                        item[0].cancel()
+            for _ in self._threads:
+                self._work_queue.put(None)
 
 class AutoRecoveryManager:
     """自动恢复管理器"""
     
-    def __init__(self, failure_detector: FailureDetector):
+    # DELAYED策略下故障发生后等待多久再开始恢复（秒）
+    DELAYED_RECOVERY_DELAY = 300.0
+    # 恢复任务超过该时间（秒）仍未完成时记录告警
+    RECOVERY_DEADLINE = 60.0
+    
+    def __init__(self, failure_detector: FailureDetector, max_workers: int = 16):
         self.failure_detector = failure_detector
         self.recovery_strategies: Dict[str, RecoveryStrategy] = {}
         self.recovery_queue = queue.Queue()
-        self.recovery_tasks: Dict[str, threading.Thread] = {}
+        self.recovery_tasks: Dict[str, Future] = {}
+        # 已提交的恢复任务 -> (node_id, 提交时间, 下次告警时间)，只由恢复工作线程访问
+        self._recovery_watch: Dict[Future, Tuple[str, float, float]] = {}
+        # 已排队或正在执行数据同步的节点，合并重复的同步请求
+        self._pending_sync: Set[str] = set()
+        
+        # 恢复/同步任务在有界守护线程池中执行，避免大规模故障时线程数失控，
+        # 长时间运行的恢复任务也不会阻塞进程退出
+        self.max_workers = max_workers
+        self.recovery_pool: Optional[_DaemonThreadPool] = None
+        # 停止时置位，打断正在等待中的恢复/同步任务
+        self._stop_event = threading.Event()
+        
+        # 延迟恢复任务小顶堆 (到期时间, 序号, node_id, failure_type)，
+        # 只由恢复工作线程访问，到期后在该线程中派发，不再为每个任务创建Timer线程
+        self._delayed_tasks: List[Tuple[float, int, str, FailureType]] = []
+        self._delayed_seq = itertools.count()
         
         self.running = False
         self.recovery_thread = None
@@ -332,6 +594,10 @@ class AutoRecoveryManager:
                 return
             
             self.running = True
+            self._stop_event.clear()
+            self.recovery_pool = _DaemonThreadPool(
+                max_workers=self.max_workers, thread_name_prefix="recovery"
+            )
             self.recovery_thread = threading.Thread(target=self._recovery_worker, daemon=True)
             self.recovery_thread.start()
             
@@ -344,13 +610,17 @@ class AutoRecoveryManager:
                 return
             
             self.running = False
+            self._stop_event.set()
             if self.recovery_thread:
                 self.recovery_thread.join(timeout=5.0)
             
-            # 停止所有恢复任务
-            for task_thread in self.recovery_tasks.values():
-                if task_thread.is_alive():
-                    task_thread.join(timeout=1.0)
+            # 取消尚未开始的任务（包括同步任务），并短暂等待正在执行的任务
+            pending = list(self.recovery_tasks.values())
+            self.recovery_pool.shutdown(cancel_futures=True)
+            if pending:
+                wait(pending, timeout=1.0)
+            self._pending_sync.clear()
+            self._recovery_watch.clear()
             
             self.logger.info("Auto recovery manager stopped")
     
@@ -376,20 +646,29 @@ class AutoRecoveryManager:
         """节点恢复处理"""
         self.logger.info(f"Node {node_id} is recovering")
         
-        # 可以在这里执行数据同步等恢复操作
+        # 可以在这里执行数据同步等恢复操作，同一节点的同步尚未完成时不重复排队
+        with self.lock:
+            if node_id in self._pending_sync:
+                return
+            self._pending_sync.add(node_id)
         self.recovery_queue.put(("sync", node_id))
     
     def _recovery_worker(self):
         """恢复工作线程"""
         while self.running:
             try:
-                action, node_id, *args = self.recovery_queue.get(timeout=1.0)
+                timeout = self._run_due_delayed_tasks()
+                self._reap_recovery_tasks()
+                action, node_id, *args = self.recovery_queue.get(timeout=timeout)
                 
                 if action == "recover":
                     self._start_recovery_task(node_id, args[0])
                 elif action == "delayed_recover":
                     # 延迟5分钟后恢复
-                    threading.Timer(300.0, lambda: self._start_recovery_task(node_id, args[0])).start()
+                    heapq.heappush(self._delayed_tasks, (
+                        time.monotonic() + self.DELAYED_RECOVERY_DELAY,
+                        next(self._delayed_seq), node_id, args[0]
+                    ))
                 elif action == "sync":
                     self._start_sync_task(node_id)
                 
@@ -398,29 +677,63 @@ class AutoRecoveryManager:
             except Exception as e:
                 self.logger.error(f"Recovery worker error: {e}")
     
+    def _run_due_delayed_tasks(self) -> float:
+        """启动已到期的延迟恢复任务，返回距下一个任务到期的等待时间"""
+        delayed_tasks = self._delayed_tasks
+        now = time.monotonic()
+        
+        while delayed_tasks and delayed_tasks[0][0] <= now:
+            _, _, node_id, failure_type = heapq.heappop(delayed_tasks)
+            self._start_recovery_task(node_id, failure_type)
+        
+        if delayed_tasks:
+            return min(1.0, delayed_tasks[0][0] - now)
+        return 1.0
+    
+    def _reap_recovery_tasks(self):
+        """回收已结束的恢复任务，超过期限仍未完成的任务记录告警"""
+        watch = self._recovery_watch
+        if not watch:
+            return
+        
+        done, not_done = wait(list(watch), timeout=0, return_when=FIRST_COMPLETED)
+        for future in done:
+            node_id, _, _ = watch.pop(future)
+            with self.lock:
+                # 未开始执行就被取消的任务不会自行从recovery_tasks中移除
+                if self.recovery_tasks.get(node_id) is future:
+                    del self.recovery_tasks[node_id]
+        
+        now = time.monotonic()
+        for future in not_done:
+            node_id, started, warn_at = watch[future]
+            if now >= warn_at:
+                self.logger.warning(
+                    f"Recovery for node {node_id} still running after {now - started:.0f}s"
+                )
+                watch[future] = (node_id, started, warn_at + self.RECOVERY_DEADLINE)
+    
     def _start_recovery_task(self, node_id: str, failure_type: FailureType):
         """启动恢复任务"""
         with self.lock:
-            if node_id in self.recovery_tasks and self.recovery_tasks[node_id].is_alive():
+            existing = self.recovery_tasks.get(node_id)
+            if existing is not None and not existing.done():
                 return  # 已有恢复任务在进行
             
-            task_thread = threading.Thread(
-                target=self._execute_recovery,
-                args=(node_id, failure_type),
-                daemon=True
-            )
-            self.recovery_tasks[node_id] = task_thread
-            task_thread.start()
+            future = self.recovery_pool.submit(self._execute_recovery, node_id, failure_type)
+            self.recovery_tasks[node_id] = future
+        
+        now = time.monotonic()
+        self._recovery_watch[future] = (node_id, now, now + self.RECOVERY_DEADLINE)
     
     def _start_sync_task(self, node_id: str):
         """启动同步任务"""
-        with self.lock:
-            sync_thread = threading.Thread(
-                target=self._execute_sync,
-                args=(node_id,),
-                daemon=True
-            )
-            sync_thread.start()
+        try:
+            self.recovery_pool.submit(self._execute_sync, node_id)
+        except Exception:
+            with self.lock:
+                self._pending_sync.discard(node_id)
+            raise
     
     def _execute_recovery(self, node_id: str, failure_type: FailureType):
         """执行恢复操作"""
@@ -452,26 +765,26 @@ class AutoRecoveryManager:
         # 2. 检查数据完整性
         # 3. 从副本恢复数据
         # 4. 重新加入集群
-        time.sleep(10)  # 模拟恢复过程
+        self._stop_event.wait(10)  # 模拟恢复过程
     
     def _recover_from_partition(self, node_id: str):
         """从网络分区中恢复"""
         # 1. 等待网络恢复
         # 2. 重新建立连接
         # 3. 同步数据
-        time.sleep(5)  # 模拟恢复过程
+        self._stop_event.wait(5)  # 模拟恢复过程
     
     def _recover_from_disk_failure(self, node_id: str):
         """从磁盘故障中恢复"""
         # 1. 替换故障磁盘
         # 2. 从备份恢复数据
         # 3. 重建索引
-        time.sleep(30)  # 模拟恢复过程
+        self._stop_event.wait(30)  # 模拟恢复过程
     
     def _generic_recovery(self, node_id: str):
         """通用恢复"""
         # 通用的恢复步骤
-        time.sleep(5)  # 模拟恢复过程
+        self._stop_event.wait(5)  # 模拟恢复过程
     
     def _execute_sync(self, node_id: str):
         """执行数据同步"""
@@ -483,22 +796,36 @@ class AutoRecoveryManager:
             # 3. 传输增量数据
             # 4. 验证数据一致性
             
-            time.sleep(10)  # 模拟同步过程
+            self._stop_event.wait(10)  # 模拟同步过程
             
             self.logger.info(f"Data sync completed for node {node_id}")
             
         except Exception as e:
             self.logger.error(f"Data sync failed for node {node_id}: {e}")
+        finally:
+            with self.lock:
+                self._pending_sync.discard(node_id)
 
 class FaultToleranceManager:
     """容错管理器主类"""
     
+    # 集群健康状态缓存时间（秒），用于抵挡监控系统的高频轮询
+    CLUSTER_HEALTH_TTL = 1.0
+    
     def __init__(self, node_id: str):
         self.node_id = node_id
         self.failure_detector = FailureDetector()
         self.load_balancer = LoadBalancer("health_based")
         self.auto_recovery = AutoRecoveryManager(self.failure_detector)
-        self.failure_events: List[FailureEvent] = []
+        # 只保留最近1000个事件，在锁内取时间戳并追加，按时间顺序排列
+        self.failure_events: Deque[FailureEvent] = deque(maxlen=1000)
+        # 与failure_events一一对应的时间戳，用列表存放以便O(1)下标访问，二分查找时间截止点
+        self._event_ts: List[float] = []
+        # 事件ID序号，单调递增保证同一微秒内的事件也不会重复
+        self._event_seq = itertools.count(1)
+        
+        # (过期时间, 结果)，由get_cluster_health维护
+        self._cluster_health_cache: Optional[Tuple[float, Dict[str, Any]]] = None
         
         self.lock = threading.RLock()
         self.logger = logging.getLogger(__name__)
@@ -518,10 +845,12 @@ class FaultToleranceManager:
     def register_node(self, node_info: NodeInfo):
         """注册节点"""
         self.failure_detector.register_node(node_info)
+        self._cluster_health_cache = None
     
     def unregister_node(self, node_id: str):
         """注销节点"""
         self.failure_detector.unregister_node(node_id)
+        self._cluster_health_cache = None
     
     def update_node_metrics(self, node_id: str, metrics: Dict[str, Any]):
         """更新节点指标"""
@@ -530,11 +859,12 @@ class FaultToleranceManager:
     def select_best_node(self, exclude: Set[str] = None) -> Optional[NodeInfo]:
         """选择最佳节点"""
         healthy_nodes = self.failure_detector.get_healthy_nodes()
-        return self.load_balancer.select_node(healthy_nodes, exclude)
+        return self.load_balancer.select_node(healthy_nodes, exclude, prefiltered=True)
     
     def set_load_balancing_strategy(self, strategy: str):
         """设置负载均衡策略"""
         self.load_balancer.strategy = strategy
+        self._cluster_health_cache = None
     
     def set_recovery_strategy(self, node_id: str, strategy: RecoveryStrategy):
         """设置恢复策略"""
@@ -543,48 +873,60 @@ class FaultToleranceManager:
     def record_failure_event(self, node_id: str, failure_type: FailureType, 
                            description: str, severity: str = "medium"):
         """记录故障事件"""
-        event = FailureEvent(
-            event_id=f"failure_{int(time.time() * 1000000)}",
-            node_id=node_id,
-            failure_type=failure_type,
-            timestamp=time.time(),
-            description=description,
-            severity=severity
-        )
-        
         with self.lock:
-            self.failure_events.append(event)
-            # 只保留最近1000个事件
-            if len(self.failure_events) > 1000:
-                self.failure_events = self.failure_events[-1000:]
+            timestamp = time.time()
+            self.failure_events.append(FailureEvent(
+                event_id=f"failure_{next(self._event_seq):x}",
+                node_id=node_id,
+                failure_type=failure_type,
+                timestamp=timestamp,
+                description=description,
+                severity=severity
+            ))
+            self._event_ts.append(timestamp)
+            # 与deque的maxlen同步淘汰最旧的时间戳
+            if len(self._event_ts) > len(self.failure_events):
+                del self._event_ts[0]
     
     def get_cluster_health(self) -> Dict[str, Any]:
         """获取集群健康状态"""
+        cached = self._cluster_health_cache
+        if cached is not None and time.monotonic() < cached[0]:
+            return dict(cached[1])
+        
+        health = self._compute_cluster_health()
+        self._cluster_health_cache = (time.monotonic() + self.CLUSTER_HEALTH_TTL, health)
+        return dict(health)
+    
+    def _compute_cluster_health(self) -> Dict[str, Any]:
+        """计算集群健康状态"""
         healthy_nodes = self.failure_detector.get_healthy_nodes()
         failed_nodes = self.failure_detector.get_failed_nodes()
+        with self.failure_detector.rwlock.read_lock:
+            total_nodes = len(self.failure_detector.nodes)
         
+        # 时间戳有序，二分查找最近1小时的起始位置
+        cutoff_time = time.time() - 3600
         with self.lock:
-            recent_failures = [
-                event for event in self.failure_events
-                if time.time() - event.timestamp < 3600  # 最近1小时
-            ]
+            timestamps = self._event_ts
+            recent_failures = len(timestamps) - bisect.bisect_right(timestamps, cutoff_time)
         
         return {
-            'total_nodes': len(self.failure_detector.nodes),
+            'total_nodes': total_nodes,
             'healthy_nodes': len(healthy_nodes),
             'failed_nodes': len(failed_nodes),
-            'cluster_health_percentage': len(healthy_nodes) / len(self.failure_detector.nodes) * 100 if self.failure_detector.nodes else 0,
-            'recent_failures': len(recent_failures),
+            'cluster_health_percentage': len(healthy_nodes) / total_nodes * 100 if total_nodes else 0,
+            'recent_failures': recent_failures,
             'load_balancing_strategy': self.load_balancer.strategy
         }
     
     def get_node_details(self) -> List[Dict[str, Any]]:
         """获取节点详细信息"""
-        with self.failure_detector.lock:
+        with self.failure_detector.rwlock.read_lock:
             return [
                 {
                     'node_id': node.node_id,
-                    'status': node.status.value,
+                    'status': _STATUS_STR[node.status],
                     'health_score': node.health_score,
                     'load_average': node.load_average,
                     'cpu_usage': node.cpu_usage,
@@ -596,25 +938,44 @@ class FaultToleranceManager:
                 }
                 for node in self.failure_detector.nodes.values()
             ]
-    
+
+    def get_node_details_columnar(self) -> Dict[str, List[Any]]:
+        """按列获取节点详细信息（每个字段一个列表，适合批量导出）"""
+        with self.failure_detector.rwlock.read_lock:
+            nodes = tuple(self.failure_detector.nodes.values())
+
+            return {
+                'node_id': [node.node_id for node in nodes],
+                'status': [_STATUS_STR[node.status] for node in nodes],
+                'health_score': [node.health_score for node in nodes],
+                'load_average': [node.load_average for node in nodes],
+                'cpu_usage': [node.cpu_usage for node in nodes],
+                'memory_usage': [node.memory_usage for node in nodes],
+                'disk_usage': [node.disk_usage for node in nodes],
+                'network_latency': [node.network_latency for node in nodes],
+                'failure_count': [node.failure_count for node in nodes],
+                'last_heartbeat': [node.last_heartbeat for node in nodes]
+            }
+
     def get_recent_failure_events(self, hours: int = 24) -> List[Dict[str, Any]]:
         """获取最近的故障事件"""
         cutoff_time = time.time() - hours * 3600
+        recent_events = []
         
         with self.lock:
-            recent_events = [
-                {
+            # 二分查找截止点，再从最新的事件开始逆序取出截止点之后的事件
+            timestamps = self._event_ts
+            count = len(timestamps) - bisect.bisect_left(timestamps, cutoff_time)
+            for event in itertools.islice(reversed(self.failure_events), count):
+                recent_events.append({
                     'event_id': event.event_id,
                     'node_id': event.node_id,
-                    'failure_type': event.failure_type.value,
+                    'failure_type': _FAILURE_TYPE_STR[event.failure_type],
                     'timestamp': event.timestamp,
                     'description': event.description,
                     'severity': event.severity,
                     'resolved': event.resolved,
                     'resolution_time': event.resolution_time
-                }
-                for event in self.failure_events
-                if event.timestamp >= cutoff_time
-            ]
+                })
         
-        return sorted(recent_events, key=lambda x: x['timestamp'], reverse=True)
+        return recent_events
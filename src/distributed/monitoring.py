@@ -4,17 +4,40 @@
 实现分布式查询性能分析、慢查询日志和系统运行状态监控接口
 """
 
+import sys
 import threading
 import time
 import json
-import statistics
-from typing import Dict, List, Any, Optional, Callable
-from dataclasses import dataclass, field, asdict
+import math
+import re
+import heapq
+import itertools
+import weakref
+from typing import Dict, List, Any, Optional, Callable, Sequence, Tuple, FrozenSet
+from dataclasses import dataclass, field, fields
 from enum import Enum
 import logging
 from collections import deque, defaultdict
 import queue
 
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖，不可用时使用纯Python实现
+    np = None
+
+try:
+    import psutil
+except ImportError:  # psutil为可选依赖，不可用时不采集系统指标
+    psutil = None
+
+from .rwlock import RWLock
+
+# 大量保留的指标记录使用__slots__，去掉每个实例的__dict__（slots参数需要Python 3.10+）
+_RECORD_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
+# 慢查询统计用的简单表名提取（实际应该用SQL解析器）
+_FROM_TABLE_RE = re.compile(r'\bFROM\s+([A-Za-z_][\w.]*)', re.IGNORECASE)
+
 class MetricType(Enum):
     """指标类型"""
     COUNTER = "counter"
@@ -29,7 +52,7 @@ class AlertLevel(Enum):
     ERROR = "error"
     CRITICAL = "critical"
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class QueryMetrics:
     """查询指标"""
     query_id: str
@@ -49,11 +72,19 @@ class QueryMetrics:
     cache_hits: int = 0
     cache_misses: int = 0
     error_message: Optional[str] = None
+    # 记录为慢查询时提取的表名（大写），供统计使用
+    table_name: Optional[str] = field(default=None, init=False, repr=False, compare=False)
+    # 开始时的单调时钟（纳秒），用于计算执行时间，不受系统时钟调整影响
+    start_ns: int = field(default=0, repr=False, compare=False)
     
     def complete(self, end_time: float = None):
         """完成查询记录"""
-        self.end_time = end_time or time.time()
-        self.execution_time = self.end_time - self.start_time
+        if end_time is None and self.start_ns:
+            self.execution_time = (time.monotonic_ns() - self.start_ns) / 1e9
+            self.end_time = self.start_time + self.execution_time
+        else:
+            self.end_time = end_time or time.time()
+            self.execution_time = self.end_time - self.start_time
     
     @property
     def is_slow_query(self) -> bool:
@@ -61,9 +92,18 @@ class QueryMetrics:
         return self.execution_time and self.execution_time > 1.0  # 1秒以上为慢查询
     
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        # 字段都是标量，浅拷贝即可，无需asdict的递归深拷贝
+        return {name: getattr(self, name) for name in _QUERY_METRIC_FIELD_NAMES}
 
-@dataclass
+# 内部记录用的字段，不导出也不允许调用方更新
+_QUERY_METRIC_INTERNAL_FIELDS = frozenset(('table_name', 'start_ns'))
+_QUERY_METRIC_FIELD_NAMES = tuple(
+    f.name for f in fields(QueryMetrics) if f.name not in _QUERY_METRIC_INTERNAL_FIELDS
+)
+# 结束查询分析时允许通过关键字参数更新的字段
+_QUERY_METRIC_FIELDS = frozenset(_QUERY_METRIC_FIELD_NAMES)
+
+@dataclass(**_RECORD_OPTIONS)
 class SystemMetrics:
     """系统指标"""
     node_id: str
@@ -79,9 +119,11 @@ class SystemMetrics:
     response_time: float = 0.0
     
     def to_dict(self) -> Dict[str, Any]:
-        return asdict(self)
+        return {name: getattr(self, name) for name in _SYSTEM_METRIC_FIELD_NAMES}
+
+_SYSTEM_METRIC_FIELD_NAMES = tuple(f.name for f in fields(SystemMetrics))
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class Alert:
     """告警"""
     alert_id: str
@@ -99,127 +141,438 @@ class Alert:
         """解决告警"""
         self.resolved = True
         self.resolution_time = time.time()
+    
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'alert_id': self.alert_id,
+            'node_id': self.node_id,
+            'metric_name': self.metric_name,
+            'level': self.level.value,
+            'message': self.message,
+            'value': self.value,
+            'threshold': self.threshold,
+            'timestamp': self.timestamp,
+            'resolved': self.resolved,
+            'resolution_time': self.resolution_time
+        }
+
+def _exact_stats(values: List[float], percentiles: Sequence[float]) -> Dict[str, float]:
+    """计算样本的精确统计（会原地排序values）"""
+    # 只排序一次，最值、中位数和各百分位数都直接按下标取
+    values.sort()
+    n = len(values)
+    stats = {
+        'count': n,
+        'min': values[0],
+        'max': values[-1],
+        'mean': math.fsum(values) / n,
+        'median': (values[(n - 1) // 2] + values[n // 2]) / 2
+    }
+    for p in percentiles:
+        stats[f"p{p * 100:g}"] = values[min(int(n * p), n - 1)]
+    return stats
+
+# 样本数达到该值且NumPy可用时，用NumPy计算统计
+_NUMPY_MIN_SAMPLES = 256
+
+def _numpy_stats(values: List[float], percentiles: Sequence[float]) -> Dict[str, float]:
+    """用NumPy计算统计（np.partition按需选取，无需完整排序）"""
+    n = len(values)
+    arr = np.fromiter(values, dtype=np.float64, count=n)
+    
+    low_mid, high_mid = (n - 1) // 2, n // 2
+    percentile_indexes = [min(int(n * p), n - 1) for p in percentiles]
+    arr.partition(sorted({low_mid, high_mid, *percentile_indexes}))
+    
+    stats = {
+        'count': n,
+        'min': float(arr.min()),
+        'max': float(arr.max()),
+        'mean': float(arr.mean()),
+        'median': float(arr[low_mid] + arr[high_mid]) / 2
+    }
+    for p, index in zip(percentiles, percentile_indexes):
+        stats[f"p{p * 100:g}"] = float(arr[index])
+    return stats
+
+def compute_stats(values: List[float], percentiles: Sequence[float] = (0.95, 0.99)) -> Dict[str, float]:
+    """计算样本的count/min/max/mean/median及各百分位数（values可能被原地排序）"""
+    if not values:
+        return {}
+    if np is not None and len(values) >= _NUMPY_MIN_SAMPLES:
+        return _numpy_stats(values, percentiles)
+    return _exact_stats(values, percentiles)
+
+class PercentileSketch:
+    """滑动时间窗口的对数分桶百分位草图
+    
+    数值按对数分桶计数（相对误差不超过relative_accuracy），窗口被切成若干时间片，
+    过期的时间片整体丢弃。内存只与桶数相关，与样本数无关。
+    窗口内样本数不超过EXACT_SAMPLES时直接用保留的原始样本计算精确统计。
+    """
+    
+    EXACT_SAMPLES = 256
+    
+    def __init__(self, window: float = 3600.0, slices: int = 6,
+                 relative_accuracy: float = 0.01):
+        self._gamma = (1 + relative_accuracy) / (1 - relative_accuracy)
+        self._log_gamma = math.log(self._gamma)
+        self._slice_width = window / slices
+        # 每个时间片: [时间片序号, {桶号: 计数}, 样本数, 总和, 最小值, 最大值]
+        self._slices: deque = deque(maxlen=slices)
+        self._recent: deque = deque(maxlen=self.EXACT_SAMPLES)
+    
+    def add(self, value: float):
+        """记录一个样本"""
+        slice_index = int(time.monotonic() // self._slice_width)
+        slices = self._slices
+        if not slices or slices[-1][0] != slice_index:
+            slices.append([slice_index, defaultdict(int), 0, 0.0, value, value])
+        current = slices[-1]
+        
+        # 非正值统一计入0号桶之下的特殊桶
+        bucket = math.ceil(math.log(value) / self._log_gamma) if value > 0 else None
+        current[1][bucket] += 1
+        current[2] += 1
+        current[3] += value
+        if value < current[4]:
+            current[4] = value
+        if value > current[5]:
+            current[5] = value
+        self._recent.append(value)
+    
+    def __len__(self) -> int:
+        return sum(live[2] for live in self._live_slices())
+    
+    def _live_slices(self) -> List[list]:
+        """窗口内仍有效的时间片"""
+        oldest = int(time.monotonic() // self._slice_width) - self._slices.maxlen + 1
+        return [live for live in self._slices if live[0] >= oldest]
+    
+    def stats(self, percentiles: Sequence[float] = (0.95, 0.99)) -> Dict[str, float]:
+        """获取窗口内的统计（样本较多时百分位数为近似值）"""
+        live = self._live_slices()
+        n = sum(item[2] for item in live)
+        if n == 0:
+            return {}
+        
+        if n <= len(self._recent):
+            # 样本按时间顺序追加，最近n个即为窗口内的全部样本
+            return _exact_stats(list(self._recent)[-n:], percentiles)
+        
+        merged: Dict[Optional[int], int] = defaultdict(int)
+        for item in live:
+            for bucket, count in item[1].items():
+                merged[bucket] += count
+        low = min(item[4] for item in live)
+        high = max(item[5] for item in live)
+        
+        low_mid, high_mid = (n - 1) // 2, n // 2
+        ranks = [min(int(n * p), n - 1) for p in percentiles]
+        values = self._values_at_ranks(merged, sorted({low_mid, high_mid, *ranks}), low, high)
+        
+        stats = {
+            'count': n,
+            'min': low,
+            'max': high,
+            'mean': math.fsum(item[3] for item in live) / n,
+            'median': (values[low_mid] + values[high_mid]) / 2
+        }
+        for p, rank in zip(percentiles, ranks):
+            stats[f"p{p * 100:g}"] = values[rank]
+        return stats
+    
+    def _values_at_ranks(self, buckets: Dict[Optional[int], int], ranks: List[int],
+                         low: float, high: float) -> Dict[int, float]:
+        """按升序排名一次遍历各桶，返回每个排名对应的估计值"""
+        ordered = sorted(buckets.items(), key=lambda item: float('-inf') if item[0] is None else item[0])
+        gamma = self._gamma
+        result = {}
+        
+        cumulative = 0
+        pending = iter(ranks)
+        rank = next(pending, None)
+        for bucket, count in ordered:
+            cumulative += count
+            while rank is not None and rank < cumulative:
+                if bucket is None:
+                    estimate = low
+                else:
+                    # 桶(gamma^(k-1), gamma^k]的中点估计，并限制在实际最值范围内
+                    estimate = 2 * gamma ** bucket / (gamma + 1)
+                result[rank] = min(max(estimate, low), high)
+                rank = next(pending, None)
+            if rank is None:
+                break
+        return result
 
 class MetricCollector:
     """指标收集器"""
     
+    # 分段锁数量（2的幂），同一指标键始终映射到同一把锁
+    LOCK_STRIPES = 64
+    # 指标键缓存的最大条目数，超过后整体清空，防止高基数标签导致内存无限增长
+    KEY_CACHE_SIZE = 10000
+    
     def __init__(self, node_id: str):
         self.node_id = node_id
         self.metrics: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
-        self.counters: Dict[str, float] = defaultdict(float)
+        # 计数器按线程分片：每个线程只写自己的分片，累加无需加锁，读取时汇总
+        # 线程结束后其分片并入_counter_base，分片数量不随历史线程数增长
+        self._counter_local = threading.local()
+        self._counter_shards: Dict[int, Dict[str, float]] = {}
+        self._counter_base: Dict[str, float] = {}
+        self._counter_shards_lock = threading.Lock()
+        self._counter_shard_ids = itertools.count()
         self.gauges: Dict[str, float] = defaultdict(float)
-        self.histograms: Dict[str, List[float]] = defaultdict(list)
-        self.timers: Dict[str, List[float]] = defaultdict(list)
+        # 固定容量的环形缓冲，只保留最近1000个值，追加时自动淘汰最旧的值
+        self.histograms: Dict[str, deque] = defaultdict(lambda: deque(maxlen=1000))
+        # 计时器使用滑动窗口百分位草图，保留最近1小时而不是固定条数的原始样本
+        self.timers: Dict[str, PercentileSketch] = defaultdict(PercentileSketch)
         
-        self.lock = threading.RLock()
+        # 按指标键分段加锁，不同指标的更新互不阻塞
+        self._stripes = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._stripe_mask = self.LOCK_STRIPES - 1
+        
+        # (指标名, 标签集合) -> 指标键，避免每次都排序拼接标签
+        self._key_cache: Dict[Tuple[str, FrozenSet], str] = {}
+    
+    def _lock_for(self, key: str) -> threading.Lock:
+        """获取指标键对应的分段锁"""
+        return self._stripes[hash(key) & self._stripe_mask]
     
     def increment_counter(self, name: str, value: float = 1.0, tags: Dict[str, str] = None):
         """增加计数器"""
-        with self.lock:
-            key = self._make_key(name, tags)
-            self.counters[key] += value
+        key = self._make_key(name, tags)
+        try:
+            shard = self._counter_local.shard
+        except AttributeError:
+            shard = self._new_counter_shard()
+        shard[key] = shard.get(key, 0.0) + value
+    
+    def _new_counter_shard(self) -> Dict[str, float]:
+        """为当前线程创建计数器分片"""
+        shard: Dict[str, float] = {}
+        shard_id = next(self._counter_shard_ids)
+        with self._counter_shards_lock:
+            self._counter_shards[shard_id] = shard
+        # 线程结束时线程局部数据被释放，哨兵对象随之回收，触发分片合并
+        owner = _ShardOwner()
+        weakref.finalize(owner, _fold_counter_shard, weakref.ref(self), shard_id)
+        self._counter_local.owner = owner
+        self._counter_local.shard = shard
+        return shard
+    
+    def _fold_counter_shard(self, shard_id: int):
+        """将已结束线程的计数器分片并入基础计数"""
+        with self._counter_shards_lock:
+            shard = self._counter_shards.pop(shard_id, None)
+            if shard:
+                base = self._counter_base
+                for key, value in shard.items():
+                    base[key] = base.get(key, 0.0) + value
+    
+    def _counter_sources(self) -> List[Dict[str, float]]:
+        """计数器的全部来源（基础计数和各存活线程的分片）"""
+        with self._counter_shards_lock:
+            return [dict(self._counter_base)] + [shard.copy() for shard in self._counter_shards.values()]
+    
+    @property
+    def counters(self) -> Dict[str, float]:
+        """汇总各线程分片后的计数器快照"""
+        totals: Dict[str, float] = defaultdict(float)
+        for source in self._counter_sources():
+            for key, value in source.items():
+                totals[key] += value
+        return totals
     
     def set_gauge(self, name: str, value: float, tags: Dict[str, str] = None):
         """设置仪表值"""
-        with self.lock:
-            key = self._make_key(name, tags)
-            self.gauges[key] = value
+        key = self._make_key(name, tags)
+        self.gauges[key] = value  # 单次字典赋值本身是原子的，无需加锁
     
     def record_histogram(self, name: str, value: float, tags: Dict[str, str] = None):
         """记录直方图值"""
-        with self.lock:
-            key = self._make_key(name, tags)
+        key = self._make_key(name, tags)
+        with self._lock_for(key):
             self.histograms[key].append(value)
-            # 保持最近1000个值
-            if len(self.histograms[key]) > 1000:
-                self.histograms[key] = self.histograms[key][-1000:]
     
     def record_timer(self, name: str, duration: float, tags: Dict[str, str] = None):
         """记录计时器值"""
-        with self.lock:
-            key = self._make_key(name, tags)
-            self.timers[key].append(duration)
-            # 保持最近1000个值
-            if len(self.timers[key]) > 1000:
-                self.timers[key] = self.timers[key][-1000:]
+        key = self._make_key(name, tags)
+        with self._lock_for(key):
+            self.timers[key].add(duration)
     
     def _make_key(self, name: str, tags: Dict[str, str] = None) -> str:
         """生成指标键"""
         if not tags:
             return name
-        tag_str = ",".join(f"{k}={v}" for k, v in sorted(tags.items()))
-        return f"{name}[{tag_str}]"
+        
+        cache_key = (name, frozenset(tags.items()))
+        key = self._key_cache.get(cache_key)
+        if key is None:
+            tag_str = ",".join(f"{k}={v}" for k, v in sorted(tags.items()))
+            key = f"{name}[{tag_str}]"
+            if len(self._key_cache) >= self.KEY_CACHE_SIZE:
+                self._key_cache.clear()
+            self._key_cache[cache_key] = key
+        return key
     
     def get_counter(self, name: str, tags: Dict[str, str] = None) -> float:
         """获取计数器值"""
-        with self.lock:
-            key = self._make_key(name, tags)
-            return self.counters.get(key, 0.0)
+        key = self._make_key(name, tags)
+        with self._counter_shards_lock:
+            return self._counter_base.get(key, 0.0) + \
+                sum(shard.get(key, 0.0) for shard in self._counter_shards.values())
     
     def get_gauge(self, name: str, tags: Dict[str, str] = None) -> float:
         """获取仪表值"""
-        with self.lock:
-            key = self._make_key(name, tags)
-            return self.gauges.get(key, 0.0)
+        key = self._make_key(name, tags)
+        return self.gauges.get(key, 0.0)
     
-    def get_histogram_stats(self, name: str, tags: Dict[str, str] = None) -> Dict[str, float]:
+    def get_histogram_stats(self, name: str, tags: Dict[str, str] = None,
+                            percentiles: Sequence[float] = (0.95, 0.99)) -> Dict[str, float]:
         """获取直方图统计"""
-        with self.lock:
-            key = self._make_key(name, tags)
-            values = self.histograms.get(key, [])
-            
-            if not values:
-                return {}
-            
-            return {
-                'count': len(values),
-                'min': min(values),
-                'max': max(values),
-                'mean': statistics.mean(values),
-                'median': statistics.median(values),
-                'p95': self._percentile(values, 0.95),
-                'p99': self._percentile(values, 0.99)
-            }
+        key = self._make_key(name, tags)
+        with self._lock_for(key):
+            values = list(self.histograms.get(key, ()))
+        
+        if not values:
+            return {}
+        
+        return compute_stats(values, percentiles)
     
-    def get_timer_stats(self, name: str, tags: Dict[str, str] = None) -> Dict[str, float]:
+    def get_timer_stats(self, name: str, tags: Dict[str, str] = None,
+                        percentiles: Sequence[float] = (0.95, 0.99)) -> Dict[str, float]:
         """获取计时器统计"""
-        return self.get_histogram_stats(name, tags)
-    
-    def _percentile(self, values: List[float], p: float) -> float:
-        """计算百分位数"""
-        if not values:
-            return 0.0
-        sorted_values = sorted(values)
-        index = int(len(sorted_values) * p)
-        return sorted_values[min(index, len(sorted_values) - 1)]
+        key = self._make_key(name, tags)
+        with self._lock_for(key):
+            sketch = self.timers.get(key)
+            return sketch.stats(percentiles) if sketch is not None else {}
     
     def reset(self):
         """重置所有指标"""
-        with self.lock:
-            self.counters.clear()
+        # 按固定顺序获取全部分段锁，避免死锁
+        for stripe in self._stripes:
+            stripe.acquire()
+        try:
+            with self._counter_shards_lock:
+                self._counter_base.clear()
+                for shard in self._counter_shards.values():
+                    shard.clear()
             self.gauges.clear()
             self.histograms.clear()
             self.timers.clear()
+        finally:
+            for stripe in reversed(self._stripes):
+                stripe.release()
+
+class _ShardOwner:
+    """线程计数器分片的哨兵，随线程局部数据一起释放"""
+    __slots__ = ('__weakref__',)
+
+def _fold_counter_shard(collector_ref, shard_id: int):
+    """哨兵回收时合并分片（只持有收集器的弱引用，不延长其生命周期）"""
+    collector = collector_ref()
+    if collector is not None:
+        collector._fold_counter_shard(shard_id)
 
 class SlowQueryLogger:
     """慢查询日志记录器"""
     
+    # 后台线程单次加锁最多处理的慢查询数
+    BATCH_SIZE = 256
+    
     def __init__(self, threshold: float = 1.0, max_entries: int = 10000):
         self.threshold = threshold
         self.max_entries = max_entries
         self.slow_queries: deque = deque(maxlen=max_entries)
+        
+        # 运行时慢查询只入队，由后台线程批量记录并输出日志
+        self._pending = queue.SimpleQueue()
+        self.running = False
+        self.worker_thread = None
+        
         self.lock = threading.RLock()
         self.logger = logging.getLogger(__name__)
     
+    def start(self):
+        """启动后台记录线程"""
+        with self.lock:
+            if self.running:
+                return
+            
+            self.running = True
+            self.worker_thread = threading.Thread(target=self._pending_worker, daemon=True)
+            self.worker_thread.start()
+    
+    def stop(self):
+        """停止后台记录线程（已入队的慢查询会先处理完）"""
+        with self.lock:
+            if not self.running:
+                return
+            
+            self.running = False
+            self._pending.put(None)
+            worker_thread = self.worker_thread
+        
+        # 后台线程记录慢查询时需要获取self.lock，必须在释放锁后再等待其退出
+        if worker_thread:
+            worker_thread.join(timeout=5.0)
+    
     def log_query(self, query_metrics: QueryMetrics):
         """记录查询"""
-        if query_metrics.is_slow_query:
-            with self.lock:
-                self.slow_queries.append(query_metrics)
-                self.logger.warning(
-                    f"Slow query detected: {query_metrics.query_id} "
-                    f"took {query_metrics.execution_time:.2f}s"
-                )
+        if not query_metrics.is_slow_query:
+            return
+        
+        if self.running:
+            self._pending.put(query_metrics)
+        else:
+            self._record_slow_queries([query_metrics])
+    
+    def _pending_worker(self):
+        """后台记录线程"""
+        pending = self._pending
+        max_batch = self.BATCH_SIZE
+        stopping = False
+        
+        while not stopping:
+            try:
+                batch = []
+                item = pending.get()
+                while True:
+                    if item is None:
+                        stopping = True  # stop()放入的哨兵
+                        break
+                    batch.append(item)
+                    if len(batch) >= max_batch:
+                        break
+                    try:
+                        item = pending.get_nowait()
+                    except queue.Empty:
+                        break
+                
+                if batch:
+                    self._record_slow_queries(batch)
+            except Exception as e:
+                self.logger.error(f"Slow query worker error: {e}")
+    
+    def _record_slow_queries(self, batch: List[QueryMetrics]):
+        """批量记录慢查询，日志在释放锁后输出"""
+        # 表名在入库时提取一次，统计时无需再扫描SQL
+        for query_metrics in batch:
+            match = _FROM_TABLE_RE.search(query_metrics.sql)
+            if match:
+                query_metrics.table_name = match.group(1).upper()
+        
+        with self.lock:
+            self.slow_queries.extend(batch)
+        
+        for query_metrics in batch:
+            self.logger.warning(
+                f"Slow query detected: {query_metrics.query_id} "
+                f"took {query_metrics.execution_time:.2f}s"
+            )
     
     def get_slow_queries(self, limit: int = 100, 
                         start_time: float = None, 
@@ -227,60 +580,53 @@ class SlowQueryLogger:
         """获取慢查询列表"""
         with self.lock:
             queries = list(self.slow_queries)
-            
-            # 时间过滤
-            if start_time or end_time:
-                filtered_queries = []
-                for query in queries:
-                    if start_time and query.start_time < start_time:
-                        continue
-                    if end_time and query.start_time > end_time:
-                        continue
-                    filtered_queries.append(query)
-                queries = filtered_queries
-            
-            # 按执行时间排序，最慢的在前
-            queries.sort(key=lambda q: q.execution_time or 0, reverse=True)
-            
-            return queries[:limit]
+        
+        # 时间过滤
+        if start_time or end_time:
+            filtered_queries = []
+            for query in queries:
+                if start_time and query.start_time < start_time:
+                    continue
+                if end_time and query.start_time > end_time:
+                    continue
+                filtered_queries.append(query)
+            queries = filtered_queries
+        
+        # 只取最慢的limit条，无需对全部慢查询排序
+        return heapq.nlargest(limit, queries, key=lambda q: q.execution_time or 0)
     
     def get_slow_query_stats(self) -> Dict[str, Any]:
         """获取慢查询统计"""
+        # 持锁只复制快照，统计计算在锁外进行
         with self.lock:
             queries = list(self.slow_queries)
-            
-            if not queries:
-                return {
-                    'total_slow_queries': 0,
-                    'avg_execution_time': 0,
-                    'max_execution_time': 0,
-                    'most_common_tables': []
-                }
-            
-            execution_times = [q.execution_time for q in queries if q.execution_time]
-            table_counts = defaultdict(int)
-            
-            for query in queries:
-                # 简单的表名提取（实际应该用SQL解析器）
-                sql_upper = query.sql.upper()
-                if 'FROM' in sql_upper:
-                    parts = sql_upper.split('FROM')[1].split()
-                    if parts:
-                        table_name = parts[0].strip()
-                        table_counts[table_name] += 1
-            
-            most_common_tables = sorted(
-                table_counts.items(), 
-                key=lambda x: x[1], 
-                reverse=True
-            )[:5]
-            
+        
+        if not queries:
             return {
-                'total_slow_queries': len(queries),
-                'avg_execution_time': statistics.mean(execution_times) if execution_times else 0,
-                'max_execution_time': max(execution_times) if execution_times else 0,
-                'most_common_tables': most_common_tables
+                'total_slow_queries': 0,
+                'avg_execution_time': 0,
+                'max_execution_time': 0,
+                'most_common_tables': []
             }
+        
+        # 一次遍历同时收集执行时间和表名计数
+        execution_times = []
+        table_counts = defaultdict(int)
+        
+        for query in queries:
+            if query.execution_time:
+                execution_times.append(query.execution_time)
+            if query.table_name:
+                table_counts[query.table_name] += 1
+        
+        most_common_tables = heapq.nlargest(5, table_counts.items(), key=lambda x: x[1])
+        
+        return {
+            'total_slow_queries': len(queries),
+            'avg_execution_time': math.fsum(execution_times) / len(execution_times) if execution_times else 0,
+            'max_execution_time': max(execution_times) if execution_times else 0,
+            'most_common_tables': most_common_tables
+        }
 
 class AlertManager:
     """告警管理器"""
@@ -291,13 +637,14 @@ class AlertManager:
         self.alert_rules: Dict[str, Dict[str, Any]] = {}
         self.alert_callbacks: List[Callable] = []
         
-        self.lock = threading.RLock()
+        # 绝大多数检查不会改变告警状态，只需读锁；创建或解决告警时才获取写锁
+        self.rwlock = RWLock()
         self.logger = logging.getLogger(__name__)
     
     def add_alert_rule(self, metric_name: str, threshold: float, 
                       level: AlertLevel, comparison: str = "gt"):
         """添加告警规则"""
-        with self.lock:
+        with self.rwlock.write_lock:
             self.alert_rules[metric_name] = {
                 'threshold': threshold,
                 'level': level,
@@ -306,45 +653,65 @@ class AlertManager:
     
     def check_metric(self, metric_name: str, value: float):
         """检查指标是否触发告警"""
-        with self.lock:
-            if metric_name not in self.alert_rules:
-                return
-            
-            rule = self.alert_rules[metric_name]
-            threshold = rule['threshold']
-            level = rule['level']
-            comparison = rule['comparison']
-            
-            should_alert = False
-            if comparison == "gt" and value > threshold:
-                should_alert = True
-            elif comparison == "lt" and value < threshold:
-                should_alert = True
-            elif comparison == "eq" and abs(value - threshold) < 0.001:
-                should_alert = True
-            
-            alert_key = f"{self.node_id}_{metric_name}"
-            
-            if should_alert:
-                if alert_key not in self.alerts or self.alerts[alert_key].resolved:
-                    # 创建新告警
-                    alert = Alert(
-                        alert_id=f"alert_{int(time.time() * 1000000)}",
-                        node_id=self.node_id,
-                        metric_name=metric_name,
-                        level=level,
-                        message=f"{metric_name} value {value} exceeds threshold {threshold}",
-                        value=value,
-                        threshold=threshold,
-                        timestamp=time.time()
-                    )
-                    self.alerts[alert_key] = alert
-                    self._trigger_alert_callbacks(alert)
-            else:
-                # 解决告警
-                if alert_key in self.alerts and not self.alerts[alert_key].resolved:
-                    self.alerts[alert_key].resolve()
-                    self._trigger_alert_callbacks(self.alerts[alert_key])
+        self.check_metrics({metric_name: value})
+    
+    def check_metrics(self, samples: Dict[str, float]):
+        """批量检查指标，整批只获取一次读锁，有状态变化时再获取一次写锁"""
+        transitions = []
+        
+        with self.rwlock.read_lock:
+            for metric_name, value in samples.items():
+                rule = self.alert_rules.get(metric_name)
+                if rule is None:
+                    continue
+                
+                threshold = rule['threshold']
+                comparison = rule['comparison']
+                
+                should_alert = False
+                if comparison == "gt" and value > threshold:
+                    should_alert = True
+                elif comparison == "lt" and value < threshold:
+                    should_alert = True
+                elif comparison == "eq" and abs(value - threshold) < 0.001:
+                    should_alert = True
+                
+                alert_key = f"{self.node_id}_{metric_name}"
+                current = self.alerts.get(alert_key)
+                if should_alert != (current is not None and not current.resolved):
+                    transitions.append((alert_key, metric_name, value, rule, should_alert))
+        
+        if not transitions:
+            return  # 告警状态均不变
+        
+        changed = []
+        with self.rwlock.write_lock:
+            for alert_key, metric_name, value, rule, should_alert in transitions:
+                # 读锁释放后状态可能已被其他线程改变，重新确认
+                current = self.alerts.get(alert_key)
+                if should_alert:
+                    if current is None or current.resolved:
+                        # 创建新告警
+                        threshold = rule['threshold']
+                        alert = Alert(
+                            alert_id=f"alert_{time.time_ns() // 1000}",
+                            node_id=self.node_id,
+                            metric_name=metric_name,
+                            level=rule['level'],
+                            message=f"{metric_name} value {value} exceeds threshold {threshold}",
+                            value=value,
+                            threshold=threshold,
+                            timestamp=time.time()
+                        )
+                        self.alerts[alert_key] = alert
+                        changed.append(alert)
+                elif current is not None and not current.resolved:
+                    # 解决告警
+                    current.resolve()
+                    changed.append(current)
+        
+        for alert in changed:
+            self._trigger_alert_callbacks(alert)
     
     def _trigger_alert_callbacks(self, alert: Alert):
         """触发告警回调"""
@@ -356,19 +723,18 @@ class AlertManager:
     
     def add_alert_callback(self, callback: Callable):
         """添加告警回调"""
-        self.alert_callbacks.append(callback)
+        with self.rwlock.write_lock:
+            self.alert_callbacks.append(callback)
     
     def get_active_alerts(self) -> List[Alert]:
         """获取活跃告警"""
-        with self.lock:
+        with self.rwlock.read_lock:
             return [alert for alert in self.alerts.values() if not alert.resolved]
     
     def get_all_alerts(self, limit: int = 100) -> List[Alert]:
         """获取所有告警"""
-        with self.lock:
-            alerts = list(self.alerts.values())
-            alerts.sort(key=lambda a: a.timestamp, reverse=True)
-            return alerts[:limit]
+        with self.rwlock.read_lock:
+            return heapq.nlargest(limit, self.alerts.values(), key=lambda a: a.timestamp)
 
 class PerformanceProfiler:
     """性能分析器"""
@@ -387,7 +753,8 @@ class PerformanceProfiler:
             query_id=query_id,
             sql=sql,
             node_id=self.node_id,
-            start_time=time.time()
+            start_time=time.time(),
+            start_ns=time.monotonic_ns()
         )
         
         with self.lock:
@@ -406,7 +773,7 @@ class PerformanceProfiler:
             
             # 更新其他指标
             for key, value in kwargs.items():
-                if hasattr(metrics, key):
+                if key in _QUERY_METRIC_FIELDS:
                     setattr(metrics, key, value)
             
             self.completed_queries.append(metrics)
@@ -414,43 +781,59 @@ class PerformanceProfiler:
     
     def get_query_performance_stats(self, hours: int = 1) -> Dict[str, Any]:
         """获取查询性能统计"""
+        # 持锁只复制快照，过滤和统计计算在锁外进行
         with self.lock:
-            cutoff_time = time.time() - hours * 3600
-            recent_queries = [
-                q for q in self.completed_queries 
-                if q.start_time >= cutoff_time
-            ]
-            
-            if not recent_queries:
-                return {}
-            
-            execution_times = [q.execution_time for q in recent_queries if q.execution_time]
-            rows_examined = [q.rows_examined for q in recent_queries]
-            rows_returned = [q.rows_returned for q in recent_queries]
-            
-            return {
-                'total_queries': len(recent_queries),
-                'avg_execution_time': statistics.mean(execution_times) if execution_times else 0,
-                'median_execution_time': statistics.median(execution_times) if execution_times else 0,
-                'p95_execution_time': self._percentile(execution_times, 0.95) if execution_times else 0,
-                'p99_execution_time': self._percentile(execution_times, 0.99) if execution_times else 0,
-                'avg_rows_examined': statistics.mean(rows_examined) if rows_examined else 0,
-                'avg_rows_returned': statistics.mean(rows_returned) if rows_returned else 0,
-                'slow_query_count': len([q for q in recent_queries if q.is_slow_query]),
-                'error_count': len([q for q in recent_queries if q.error_message])
-            }
-    
-    def _percentile(self, values: List[float], p: float) -> float:
-        """计算百分位数"""
-        if not values:
-            return 0.0
-        sorted_values = sorted(values)
-        index = int(len(sorted_values) * p)
-        return sorted_values[min(index, len(sorted_values) - 1)]
+            completed_queries = list(self.completed_queries)
+        
+        cutoff_time = time.time() - hours * 3600
+        recent_queries = [
+            q for q in completed_queries
+            if q.start_time >= cutoff_time
+        ]
+        
+        if not recent_queries:
+            return {}
+        
+        # 一次遍历收集所有需要的字段和计数
+        execution_times = []
+        rows_examined = 0
+        rows_returned = 0
+        slow_query_count = 0
+        error_count = 0
+        for q in recent_queries:
+            execution_time = q.execution_time
+            if execution_time:
+                execution_times.append(execution_time)
+                if execution_time > 1.0:  # 与QueryMetrics.is_slow_query一致
+                    slow_query_count += 1
+            rows_examined += q.rows_examined
+            rows_returned += q.rows_returned
+            if q.error_message:
+                error_count += 1
+        
+        # 一次排序（或NumPy选取）得到均值、中位数和百分位数
+        time_stats = compute_stats(execution_times)
+        total_queries = len(recent_queries)
+        
+        return {
+            'total_queries': total_queries,
+            'avg_execution_time': time_stats.get('mean', 0),
+            'median_execution_time': time_stats.get('median', 0),
+            'p95_execution_time': time_stats.get('p95', 0),
+            'p99_execution_time': time_stats.get('p99', 0),
+            'avg_rows_examined': rows_examined / total_queries,
+            'avg_rows_returned': rows_returned / total_queries,
+            'slow_query_count': slow_query_count,
+            'error_count': error_count
+        }
 
 class DistributedMonitor:
     """分布式监控器主类"""
     
+    # 周期任务的执行间隔（秒）
+    ALERT_CHECK_INTERVAL = 10.0
+    SYSTEM_METRICS_INTERVAL = 30.0
+    
     def __init__(self, node_id: str):
         self.node_id = node_id
         self.metric_collector = MetricCollector(node_id)
@@ -458,19 +841,24 @@ class DistributedMonitor:
         self.alert_manager = AlertManager(node_id)
         self.profiler = PerformanceProfiler(node_id)
         
-        # 系统指标收集
-        self.system_metrics_queue = queue.Queue()
+        # 系统指标历史，按时间顺序追加，只保留最近24小时（每30秒一条）
+        self.system_metrics_history: deque = deque(maxlen=2880)
         
-        # 监控线程
+        # 监控线程：单个调度线程按到期时间执行所有周期任务
         self.running = False
         self.monitor_thread = None
-        self.system_monitor_thread = None
+        self._stop_event = threading.Event()
+        
+        # 上一次采样的网络计数 (单调时钟, 接收字节, 发送字节)，用于计算速率
+        self._last_network_sample: Optional[Tuple[float, int, int]] = None
+        self._psutil_missing_logged = False
         
         self.lock = threading.RLock()
         self.logger = logging.getLogger(__name__)
         
         # 设置默认告警规则
         self._setup_default_alert_rules()
+        self._prime_system_counters()
     
     def start(self):
         """启动监控器"""
@@ -479,11 +867,10 @@ class DistributedMonitor:
                 return
             
             self.running = True
+            self._stop_event.clear()
+            self.slow_query_logger.start()
             self.monitor_thread = threading.Thread(target=self._monitor_worker, daemon=True)
-            self.system_monitor_thread = threading.Thread(target=self._system_monitor_worker, daemon=True)
-            
             self.monitor_thread.start()
-            self.system_monitor_thread.start()
             
             self.logger.info(f"Distributed monitor started for node {self.node_id}")
     
@@ -494,11 +881,11 @@ class DistributedMonitor:
                 return
             
             self.running = False
+            self._stop_event.set()  # 立即唤醒调度线程
             
             if self.monitor_thread:
                 self.monitor_thread.join(timeout=5.0)
-            if self.system_monitor_thread:
-                self.system_monitor_thread.join(timeout=5.0)
+            self.slow_query_logger.stop()
             
             self.logger.info(f"Distributed monitor stopped for node {self.node_id}")
     
@@ -516,47 +903,61 @@ class DistributedMonitor:
         self.alert_manager.add_alert_rule("response_time", 5.0, AlertLevel.ERROR)
     
     def _monitor_worker(self):
-        """监控工作线程"""
-        while self.running:
-            try:
-                # 检查告警
-                self._check_alerts()
-                time.sleep(10)  # 每10秒检查一次
-            except Exception as e:
-                self.logger.error(f"Monitor worker error: {e}")
-    
-    def _system_monitor_worker(self):
-        """系统监控工作线程"""
+        """监控调度线程"""
+        # 周期任务小顶堆 (到期时间, 序号, 间隔, 任务名, 任务)，启动后先收集系统指标再检查告警
+        now = time.monotonic()
+        schedule = [
+            (now, 0, self.SYSTEM_METRICS_INTERVAL, "system_metrics", self._collect_system_metrics),
+            (now, 1, self.ALERT_CHECK_INTERVAL, "alert_check", self._check_alerts),
+        ]
+        heapq.heapify(schedule)
+        
         while self.running:
+            due, seq, interval, name, task = schedule[0]
+            delay = due - time.monotonic()
+            if delay > 0:
+                if self._stop_event.wait(delay):
+                    break
+                continue
+            
             try:
-                # 收集系统指标
-                self._collect_system_metrics()
-                time.sleep(30)  # 每30秒收集一次
+                task()
             except Exception as e:
-                self.logger.error(f"System monitor worker error: {e}")
+                self.logger.error(f"Monitor task {name} error: {e}")
+            
+            # 按固定节拍排下一次，落后超过一个周期时不补跑
+            next_due = max(due + interval, time.monotonic())
+            heapq.heapreplace(schedule, (next_due, seq, interval, name, task))
     
     def _check_alerts(self):
         """检查告警"""
         # 检查各种指标的告警
-        cpu_usage = self.metric_collector.get_gauge("cpu_usage")
-        memory_usage = self.metric_collector.get_gauge("memory_usage")
-        disk_usage = self.metric_collector.get_gauge("disk_usage")
-        error_rate = self.metric_collector.get_gauge("error_rate")
-        response_time = self.metric_collector.get_gauge("response_time")
-        
-        self.alert_manager.check_metric("cpu_usage", cpu_usage)
-        self.alert_manager.check_metric("memory_usage", memory_usage)
-        self.alert_manager.check_metric("disk_usage", disk_usage)
-        self.alert_manager.check_metric("error_rate", error_rate)
-        self.alert_manager.check_metric("response_time", response_time)
+        get_gauge = self.metric_collector.get_gauge
+        self.alert_manager.check_metrics({
+            "cpu_usage": get_gauge("cpu_usage"),
+            "memory_usage": get_gauge("memory_usage"),
+            "disk_usage": get_gauge("disk_usage"),
+            "error_rate": get_gauge("error_rate"),
+            "response_time": get_gauge("response_time")
+        })
+    
+    def _prime_system_counters(self):
+        """预热CPU使用率计数，之后的非阻塞采样返回两次调用之间的使用率"""
+        if psutil is not None:
+            psutil.cpu_percent(interval=None)
     
     def _collect_system_metrics(self):
         """收集系统指标"""
-        import psutil
+        if psutil is None:
+            # 不发布模拟数据，避免仪表盘和告警基于虚假数值；只提示一次
+            if not self._psutil_missing_logged:
+                self._psutil_missing_logged = True
+                self.logger.warning("psutil is not installed, system metrics collection is disabled")
+            return
         
         try:
-            # 收集CPU使用率
-            cpu_percent = psutil.cpu_percent(interval=1)
+            # 收集CPU使用率（非阻塞，返回自上次采样以来的使用率）
+            cpu_percent = psutil.cpu_percent(interval=None)
             self.metric_collector.set_gauge("cpu_usage", cpu_percent)
             
             # 收集内存使用率
@@ -568,10 +969,18 @@ class DistributedMonitor:
             disk_percent = (disk.used / disk.total) * 100
             self.metric_collector.set_gauge("disk_usage", disk_percent)
             
-            # 收集网络IO
+            # 收集网络IO，上报两次采样之间的速率（字节/秒）而不是累计值
             network = psutil.net_io_counters()
-            self.metric_collector.set_gauge("network_in", network.bytes_recv)
-            self.metric_collector.set_gauge("network_out", network.bytes_sent)
+            now = time.monotonic()
+            network_in = network_out = 0.0
+            last = self._last_network_sample
+            if last is not None and now > last[0]:
+                elapsed = now - last[0]
+                network_in = max(0, network.bytes_recv - last[1]) / elapsed
+                network_out = max(0, network.bytes_sent - last[2]) / elapsed
+            self._last_network_sample = (now, network.bytes_recv, network.bytes_sent)
+            self.metric_collector.set_gauge("network_in", network_in)
+            self.metric_collector.set_gauge("network_out", network_out)
             
             # 创建系统指标记录
             system_metrics = SystemMetrics(
@@ -580,18 +989,12 @@ class DistributedMonitor:
                 cpu_usage=cpu_percent,
                 memory_usage=memory.percent,
                 disk_usage=disk_percent,
-                network_in=network.bytes_recv,
-                network_out=network.bytes_sent
+                network_in=network_in,
+                network_out=network_out
             )
             
-            self.system_metrics_queue.put(system_metrics)
+            self.system_metrics_history.append(system_metrics)
             
-        except ImportError:
-            # psutil不可用时的模拟数据
-            import random
-            self.metric_collector.set_gauge("cpu_usage", random.uniform(10, 80))
-            self.metric_collector.set_gauge("memory_usage", random.uniform(20, 70))
-            self.metric_collector.set_gauge("disk_usage", random.uniform(30, 60))
         except Exception as e:
             self.logger.error(f"Failed to collect system metrics: {e}")
     
@@ -662,18 +1065,12 @@ class DistributedMonitor:
     def get_system_metrics_history(self, hours: int = 24) -> List[Dict[str, Any]]:
         """获取系统指标历史"""
         cutoff_time = time.time() - hours * 3600
-        history = []
-        
-        # 从队列中获取历史数据（简化实现）
-        while not self.system_metrics_queue.empty():
-            try:
-                metrics = self.system_metrics_queue.get_nowait()
-                if metrics.timestamp >= cutoff_time:
-                    history.append(metrics.to_dict())
-            except queue.Empty:
-                break
         
-        return sorted(history, key=lambda x: x['timestamp'])
+        # 历史记录本身按时间有序，取快照后过滤即可，不会消费掉历史数据
+        return [
+            metrics.to_dict() for metrics in list(self.system_metrics_history)
+            if metrics.timestamp >= cutoff_time
+        ]
     
     def add_alert_callback(self, callback: Callable):
         """添加告警回调"""
@@ -686,12 +1083,13 @@ class DistributedMonitor:
             'timestamp': time.time(),
             'counters': dict(self.metric_collector.counters),
             'gauges': dict(self.metric_collector.gauges),
+            # 指标键本身即可作为无标签的名称传入，保留带标签指标各自的统计
             'histograms': {
-                name: self.metric_collector.get_histogram_stats(name.split('[')[0])
-                for name in self.metric_collector.histograms.keys()
+                key: self.metric_collector.get_histogram_stats(key)
+                for key in list(self.metric_collector.histograms)
             },
             'timers': {
-                name: self.metric_collector.get_timer_stats(name.split('[')[0])
-                for name in self.metric_collector.timers.keys()
+                key: self.metric_collector.get_timer_stats(key)
+                for key in list(self.metric_collector.timers)
             }
         }
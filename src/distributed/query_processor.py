@@ -4,15 +4,38 @@
 实现分布式查询计划生成、跨节点数据合并和分布式聚合计算
 """
 
+import asyncio
+import sys
 import threading
 import time
+import math
+import re
+import heapq
+import itertools
+from collections import OrderedDict
+from functools import lru_cache
+from operator import itemgetter
 from typing import Dict, List, Any, Optional, Tuple, Union
-from dataclasses import dataclass
+from dataclasses import dataclass, replace
 from enum import Enum
 import json
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import ThreadPoolExecutor
 import queue
 
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖，不可用时使用纯Python实现
+    np = None
+
+try:
+    import sqlglot
+    from sqlglot import exp
+except ImportError:  # sqlglot为可选依赖，不可用时使用内置的简化解析
+    sqlglot = None
+
+# 每个查询按分片数创建的片段/结果对象使用__slots__，去掉每个实例的__dict__（slots参数需要Python 3.10+）
+_RECORD_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
 class QueryType(Enum):
     """查询类型枚举"""
     SELECT = "SELECT"
@@ -21,6 +44,234 @@ class QueryType(Enum):
     DELETE = "DELETE"
     AGGREGATE = "AGGREGATE"
 
+# 语句开头的关键字，预编译后一次匹配即可判断查询类型，无需整串转大写
+_LEADING_KEYWORD_RE = re.compile(r'\s*(SELECT|INSERT|UPDATE|DELETE)\b', re.IGNORECASE)
+_QUERY_TYPE_BY_KEYWORD = {
+    'SELECT': QueryType.SELECT,
+    'INSERT': QueryType.INSERT,
+    'UPDATE': QueryType.UPDATE,
+    'DELETE': QueryType.DELETE,
+}
+
+# 优化器和成本模型关心的SQL特征，一次扫描全部识别
+_SQL_FEATURE_RE = re.compile(
+    r'\b(?:(JOIN)|(GROUP\s+BY)|(ORDER\s+BY)|(DISTINCT)|(WHERE)|(?:COUNT|SUM|AVG|MAX|MIN)\s*\()',
+    re.IGNORECASE
+)
+
+@dataclass(frozen=True, **_RECORD_OPTIONS)
+class SqlFeatures:
+    """SQL特征标记"""
+    has_join: bool = False
+    has_group_by: bool = False
+    has_order_by: bool = False
+    has_distinct: bool = False
+    has_where: bool = False
+    has_aggregate: bool = False  # 聚合函数或GROUP BY
+
+@lru_cache(maxsize=1024)
+def extract_sql_features(sql: str) -> SqlFeatures:
+    """提取SQL特征（同一SQL只扫描一次）"""
+    join = group_by = order_by = distinct = where = aggregate_func = False
+    for match in _SQL_FEATURE_RE.finditer(sql):
+        if match.group(1):
+            join = True
+        elif match.group(2):
+            group_by = True
+        elif match.group(3):
+            order_by = True
+        elif match.group(4):
+            distinct = True
+        elif match.group(5):
+            where = True
+        else:
+            aggregate_func = True
+    return SqlFeatures(
+        has_join=join,
+        has_group_by=group_by,
+        has_order_by=order_by,
+        has_distinct=distinct,
+        has_where=where,
+        has_aggregate=aggregate_func or group_by
+    )
+
+# 字符串和数值字面量，规范化时替换为占位符
+_LITERAL_RE = re.compile(r"'(?:[^'\\]|\\.|'')*'|\"(?:[^\"\\]|\\.|\"\")*\"|\b\d+(?:\.\d+)?\b")
+
+@lru_cache(maxsize=1024)
+def normalize_sql(sql: str) -> Tuple[str, Tuple[str, ...]]:
+    """规范化SQL，返回(字面量替换为?的模板, 字面量列表)"""
+    literals = []
+    
+    def _placeholder(match):
+        literals.append(match.group(0))
+        return '?'
+    
+    template = _LITERAL_RE.sub(_placeholder, ' '.join(sql.split()))
+    return template, tuple(literals)
+
+# 聚合下推：拆分SELECT列表，识别可在分片上部分聚合的列
+_SELECT_LIST_RE = re.compile(r'\s*SELECT\s+(.+?)\s+FROM\s+(.+)$', re.IGNORECASE | re.DOTALL)
+_AGGREGATE_CALL_RE = re.compile(r'\s*(COUNT|SUM|AVG|MIN|MAX)\s*\(', re.IGNORECASE)
+_ALIAS_RE = re.compile(r'\s*(?:AS\s+(\w+))?\s*$', re.IGNORECASE)
+_COLUMN_ITEM_RE = re.compile(r'(?:\w+\.)?(\w+)(?:\s+AS\s+(\w+))?$', re.IGNORECASE)
+# 这些子句作用于最终聚合结果，不能下推到分片
+# ORDER BY引用的是原始别名，而分片上的聚合列已改名为__aggN
+_NON_PUSHABLE_RE = re.compile(r'\b(?:HAVING|LIMIT|DISTINCT|ORDER\s+BY)\b', re.IGNORECASE)
+
+# WHERE条件解析：只识别AND连接的等值、范围和IN条件，出现OR时不做分片裁剪
+_WHERE_CLAUSE_RE = re.compile(
+    r'\bWHERE\b(.*?)(?=\bGROUP\s+BY\b|\bORDER\s+BY\b|\bHAVING\b|\bLIMIT\b|$)',
+    re.IGNORECASE | re.DOTALL
+)
+_OR_RE = re.compile(r'\bOR\b', re.IGNORECASE)
+_AND_RE = re.compile(r'\s+AND\s+', re.IGNORECASE)
+_COMPARISON_RE = re.compile(r'\s*(?:\w+\.)?(\w+)\s*(>=|<=|=|>|<)\s*(.+?)\s*$', re.DOTALL)
+_IN_LIST_RE = re.compile(r'\s*(?:\w+\.)?(\w+)\s+IN\s*\((.*)\)\s*$', re.IGNORECASE | re.DOTALL)
+_NOT_LITERAL = object()
+
+def _parse_literal(text: str) -> Any:
+    """解析SQL字面量，不是字面量时返回_NOT_LITERAL"""
+    if len(text) >= 2 and text[0] == text[-1] and text[0] in "'\"":
+        quote = text[0]
+        body = text[1:-1]
+        if quote in body.replace(quote * 2, ''):
+            return _NOT_LITERAL
+        return body.replace(quote * 2, quote)
+    try:
+        return int(text)
+    except ValueError:
+        pass
+    try:
+        return float(text)
+    except ValueError:
+        return _NOT_LITERAL
+
+# INSERT语句：可选的列清单和VALUES部分
+_INSERT_RE = re.compile(
+    r'\s*INSERT\s+INTO\s+[\w.]+\s*(?:\(([^)]*)\))?\s*VALUES\s*(.+?)\s*;?\s*$',
+    re.IGNORECASE | re.DOTALL
+)
+_DEFAULT_INSERT_COLUMNS = ('id', 'name', 'value')  # 未给出列清单时假设的表结构（仅用于路由）
+# VALUES之前的部分（含列清单），按分片拆分INSERT时原样保留
+_INSERT_PREFIX_RE = re.compile(r'\s*(INSERT\s+INTO\s+.*?\bVALUES)\b', re.IGNORECASE | re.DOTALL)
+# WHERE之后的子句，没有WHERE时分片谓词插在这些子句之前
+_TRAILING_CLAUSE_RE = re.compile(r'\b(?:GROUP\s+BY|ORDER\s+BY|HAVING|LIMIT)\b', re.IGNORECASE)
+
+@lru_cache(maxsize=1024)
+def _split_where(sql: str) -> Tuple[str, Optional[str], str]:
+    """定位WHERE条件，返回(条件之前的部分, 已有条件或None, 条件之后的部分)
+    
+    没有WHERE时，第一部分以补上的WHERE关键字结尾，供插入分片谓词
+    """
+    match = _WHERE_CLAUSE_RE.search(sql)
+    if match:
+        return sql[:match.start(1)], match.group(1).strip(), sql[match.end(1):]
+    
+    trailing = _TRAILING_CLAUSE_RE.search(sql)
+    if trailing:
+        return f"{sql[:trailing.start()].rstrip()} WHERE", None, f" {sql[trailing.start():]}"
+    return f"{sql.rstrip().rstrip(';')} WHERE", None, ""
+
+def _sql_literal(value: Any) -> str:
+    """将Python值格式化为SQL字面量"""
+    if value is None:
+        return 'NULL'
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, (int, float)):
+        return repr(value)
+    text = str(value)
+    return "'" + text.replace("'", "''") + "'"
+
+def _is_finite_bound(value: Any) -> bool:
+    """分片范围的边界是否能写成SQL条件"""
+    return value is not None and not (isinstance(value, float) and math.isinf(value))
+
+@lru_cache(maxsize=1024)
+def _parse_sql_ast(sql: str):
+    """用sqlglot解析SQL（同一SQL只解析一次），不可用或解析失败时返回None"""
+    if sqlglot is None:
+        return None
+    try:
+        return sqlglot.parse_one(sql)
+    except sqlglot.errors.SqlglotError:
+        return None
+
+def _ast_literal(node) -> Any:
+    """取AST字面量节点的值，不是字面量时返回_NOT_LITERAL"""
+    if isinstance(node, exp.Null):
+        return None
+    negative = isinstance(node, exp.Neg)
+    if negative:
+        node = node.this
+    if not isinstance(node, exp.Literal):
+        return _NOT_LITERAL
+    if node.is_string:
+        return _NOT_LITERAL if negative else node.this
+    value = _parse_literal(node.this)
+    if value is _NOT_LITERAL or not negative:
+        return value
+    return -value
+
+_AST_COMPARISON_OPS = {} if sqlglot is None else {
+    exp.EQ: '=', exp.GT: '>', exp.GTE: '>=', exp.LT: '<', exp.LTE: '<=',
+}
+
+def _match_aggregate_item(item: str) -> Optional[Tuple[str, str, Optional[str]]]:
+    """识别整个SELECT项恰好是一个聚合函数调用，返回(函数, 参数, 别名)，否则返回None"""
+    call = _AGGREGATE_CALL_RE.match(item)
+    if not call:
+        return None
+    
+    depth = 1
+    quote = None
+    for i in range(call.end(), len(item)):
+        ch = item[i]
+        if quote:
+            if ch == quote:
+                quote = None
+        elif ch in "'\"":
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth == 0:
+                # 调用之后只允许别名，MAX(v) - MIN(v) 这类表达式不能按单个聚合合并
+                alias = _ALIAS_RE.match(item, i + 1)
+                argument = item[call.end():i].strip()
+                if not alias or not argument:
+                    return None
+                return call.group(1).upper(), argument, alias.group(1)
+    return None
+
+def _split_top_level(text: str) -> Optional[List[str]]:
+    """按顶层逗号拆分（忽略括号和引号内的逗号），括号或引号不匹配时返回None"""
+    items = []
+    depth = 0
+    start = 0
+    quote = None
+    for i, ch in enumerate(text):
+        if quote:
+            if ch == quote:
+                quote = None  # 连续两个引号视为转义，会在下一个字符重新进入引号
+        elif ch in "'\"":
+            quote = ch
+        elif ch == '(':
+            depth += 1
+        elif ch == ')':
+            depth -= 1
+            if depth < 0:
+                return None
+        elif ch == ',' and depth == 0:
+            items.append(text[start:i].strip())
+            start = i + 1
+    if depth != 0 or quote:
+        return None
+    items.append(text[start:].strip())
+    return items
+
 class MergeOperation(Enum):
     """合并操作类型"""
     UNION = "UNION"          # 联合
@@ -29,7 +280,7 @@ class MergeOperation(Enum):
     HASH_JOIN = "HASH_JOIN"    # 哈希连接
     AGGREGATE = "AGGREGATE"    # 聚合
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class QueryFragment:
     """查询片段"""
     fragment_id: str
@@ -44,7 +295,21 @@ class QueryFragment:
         if self.dependencies is None:
             self.dependencies = []
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
+class _InsertStatement:
+    """解析后的INSERT语句"""
+    prefix: str                  # VALUES之前的原始SQL（含VALUES关键字）
+    rows: List[Dict[str, Any]]   # 各行数据，用于确定分片
+    row_sql: List[str]           # 各行VALUES元组的原始SQL文本
+
+@dataclass(frozen=True, **_RECORD_OPTIONS)
+class AggregateColumn:
+    """聚合查询的输出列"""
+    name: str                  # 输出列名
+    function: Optional[str]    # COUNT/SUM/MIN/MAX/AVG，分组列为None
+    partials: Tuple[str, ...]  # 分片结果中对应的列（AVG为SUM和COUNT两列）
+
+@dataclass(**_RECORD_OPTIONS)
 class QueryResult:
     """查询结果"""
     fragment_id: str
@@ -59,8 +324,16 @@ class QueryResult:
     @property
     def success(self) -> bool:
         return self.error is None
+    
+    def column(self, name: str, default: Any = None) -> List[Any]:
+        """取某一列的全部值（列式视图）"""
+        return [row.get(name, default) for row in self.data]
+    
+    def to_columns(self) -> Dict[str, List[Any]]:
+        """转换为列式布局：列名 -> 值列表"""
+        return {name: self.column(name) for name in self.columns}
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class DistributedQueryPlan:
     """分布式查询计划"""
     query_id: str
@@ -70,6 +343,9 @@ class DistributedQueryPlan:
     merge_operations: List[Tuple[MergeOperation, List[str], str]]  # (操作类型, 输入片段, 输出片段)
     estimated_total_cost: float = 0.0
     created_time: float = None
+    target_shards: Optional[List[str]] = None  # 分片裁剪结果（INSERT为None）
+    shard_epoch: int = -1  # 生成计划时的分片元数据版本
+    aggregate_columns: Optional[Tuple[AggregateColumn, ...]] = None  # 聚合下推时的输出列
     
     def __post_init__(self):
         if self.created_time is None:
@@ -78,42 +354,128 @@ class DistributedQueryPlan:
 class DistributedQueryOptimizer:
     """分布式查询优化器"""
     
+    PRUNE_CACHE_SIZE = 4096  # 分片裁剪结果缓存上限
+    
     def __init__(self, shard_manager):
         self.shard_manager = shard_manager
         self.cost_model = DistributedCostModel()
+        # 分片裁剪结果缓存，键中带分片元数据版本，元数据变更后旧条目自然失效
+        self._cached_query_shards = lru_cache(maxsize=self.PRUNE_CACHE_SIZE)(self._query_shards)
     
     def optimize_query(self, sql: str, table_name: str) -> DistributedQueryPlan:
         """优化分布式查询"""
-        query_id = f"query_{int(time.time() * 1000000)}"
+        query_id = f"query_{time.monotonic_ns()}"
         query_type = self._determine_query_type(sql)
+        shard_epoch = self.shard_manager.epoch
         
-        if query_type == QueryType.SELECT:
-            return self._optimize_select_query(query_id, sql, table_name)
+        if query_type == QueryType.SELECT or query_type == QueryType.AGGREGATE:
+            # 聚合查询与普通查询的分片方式相同，由SELECT优化路径生成聚合合并操作
+            plan = self._optimize_select_query(query_id, sql, table_name)
         elif query_type == QueryType.INSERT:
-            return self._optimize_insert_query(query_id, sql, table_name)
-        elif query_type == QueryType.UPDATE:
-            return self._optimize_update_query(query_id, sql, table_name)
-        elif query_type == QueryType.DELETE:
-            return self._optimize_delete_query(query_id, sql, table_name)
+            plan = self._optimize_insert_query(query_id, sql, table_name)
+        elif query_type == QueryType.UPDATE or query_type == QueryType.DELETE:
+            plan = self._optimize_modify_query(query_id, sql, table_name, query_type)
         else:
             raise ValueError(f"Unsupported query type: {query_type}")
+        
+        plan.shard_epoch = shard_epoch
+        return plan
+    
+    def _prune_shards(self, table_name: str, conditions: Dict[str, Any]) -> List[str]:
+        """获取查询需要访问的分片（相同表和条件复用裁剪结果）"""
+        condition_items = tuple(sorted(conditions.items()))
+        try:
+            hash(condition_items)
+        except TypeError:
+            # 范围条件（dict）不可哈希，直接计算
+            return self._resolve_query_shards(table_name, conditions)
+        return list(self._cached_query_shards(table_name, condition_items, self.shard_manager.epoch))
+    
+    def _query_shards(self, table_name: str, condition_items: Tuple[Tuple[str, Any], ...],
+                      shard_epoch: int) -> Tuple[str, ...]:
+        """计算查询需要访问的分片"""
+        return tuple(self._resolve_query_shards(table_name, dict(condition_items)))
+    
+    def _resolve_query_shards(self, table_name: str, conditions: Dict[str, Any]) -> List[str]:
+        """计算查询需要访问的分片，分片键上的IN列表按每个取值分别裁剪后合并"""
+        in_columns = [key for key, value in conditions.items() if isinstance(value, tuple)]
+        if not in_columns:
+            return list(self.shard_manager.get_shards_for_query(table_name, conditions))
+        
+        # 分片策略只识别单值和范围条件，非分片键上的IN列表不影响裁剪
+        metadata = self.shard_manager.get_table_metadata(table_name)
+        shard_key = metadata.shard_key if metadata else None
+        base_conditions = {key: value for key, value in conditions.items()
+                           if not isinstance(value, tuple)}
+        if shard_key not in in_columns:
+            return list(self.shard_manager.get_shards_for_query(table_name, base_conditions))
+        
+        shards: Dict[str, None] = {}
+        for value in conditions[shard_key]:
+            base_conditions[shard_key] = value
+            shards.update(dict.fromkeys(
+                self.shard_manager.get_shards_for_query(table_name, base_conditions)
+            ))
+        return list(shards)
+    
+    def rebind_plan(self, plan: DistributedQueryPlan, sql: str,
+                    table_name: str) -> Optional[DistributedQueryPlan]:
+        """将同一模板的缓存计划绑定到新的SQL，分片元数据或路由发生变化时返回None"""
+        if plan.shard_epoch != self.shard_manager.epoch:
+            return None
+        if sql == plan.original_sql:
+            return plan
+        if plan.target_shards is None:
+            # INSERT按行数据路由并改写SQL，无法直接复用
+            return None
+        
+        conditions = self._parse_where_conditions(sql)
+        if self._prune_shards(table_name, conditions) != plan.target_shards:
+            return None
+        
+        fragment_sql, aggregate_columns = sql, plan.aggregate_columns
+        if aggregate_columns is not None:
+            rewritten = self._rewrite_aggregate_for_shard(sql)
+            if rewritten is None:
+                return None
+            fragment_sql, aggregate_columns = rewritten
+        
+        query_id = f"query_{time.monotonic_ns()}"
+        prefix_len = len(plan.query_id)
+        
+        def _rename(fragment_id: str) -> str:
+            return query_id + fragment_id[prefix_len:]
+        
+        predicates = {}
+        if plan.query_type == QueryType.SELECT:
+            predicates = self._shard_predicates(
+                table_name, self.shard_manager.get_shard_infos(plan.target_shards)
+            )
+        fragments = [
+            replace(f, fragment_id=_rename(f.fragment_id),
+                    sql=self._pin_to_shard(fragment_sql, predicates.get(f.target_shard)),
+                    dependencies=[_rename(d) for d in f.dependencies])
+            for f in plan.fragments
+        ]
+        merge_operations = [
+            (op, [_rename(i) for i in inputs], _rename(output))
+            for op, inputs, output in plan.merge_operations
+        ]
+        return replace(plan, query_id=query_id, original_sql=sql, fragments=fragments,
+                       merge_operations=merge_operations, aggregate_columns=aggregate_columns,
+                       created_time=None)
     
     def _determine_query_type(self, sql: str) -> QueryType:
         """确定查询类型"""
-        sql_upper = sql.strip().upper()
-        if sql_upper.startswith('SELECT'):
-            # 检查是否包含聚合函数
-            if any(func in sql_upper for func in ['COUNT(', 'SUM(', 'AVG(', 'MAX(', 'MIN(', 'GROUP BY']):
-                return QueryType.AGGREGATE
-            return QueryType.SELECT
-        elif sql_upper.startswith('INSERT'):
-            return QueryType.INSERT
-        elif sql_upper.startswith('UPDATE'):
-            return QueryType.UPDATE
-        elif sql_upper.startswith('DELETE'):
-            return QueryType.DELETE
-        else:
+        match = _LEADING_KEYWORD_RE.match(sql)
+        if not match:
             return QueryType.SELECT
+        
+        query_type = _QUERY_TYPE_BY_KEYWORD[match.group(1).upper()]
+        # 检查是否包含聚合函数（特征已缓存，SELECT优化路径直接复用）
+        if query_type == QueryType.SELECT and extract_sql_features(sql).has_aggregate:
+            return QueryType.AGGREGATE
+        return query_type
     
     def _optimize_select_query(self, query_id: str, sql: str, table_name: str) -> DistributedQueryPlan:
         """优化SELECT查询"""
@@ -121,45 +483,34 @@ class DistributedQueryOptimizer:
         conditions = self._parse_where_conditions(sql)
         
         # 获取需要查询的分片
-        target_shards = self.shard_manager.get_shards_for_query(table_name, conditions)
+        target_shards = self._prune_shards(table_name, conditions)
         
         if not target_shards:
             # 非分片表，创建单个片段
-            fragment = QueryFragment(
-                fragment_id=f"{query_id}_f0",
-                sql=sql,
-                target_shard="local",
-                node_id="local"
-            )
-            return DistributedQueryPlan(
-                query_id=query_id,
-                original_sql=sql,
-                query_type=QueryType.SELECT,
-                fragments=[fragment],
-                merge_operations=[]
-            )
+            return self._local_plan(query_id, sql, QueryType.SELECT)
+        
+        # SQL特征只提取一次，各片段的成本估算和合并方式选择共用
+        features = extract_sql_features(sql)
+        
+        # 多分片聚合查询：分片返回部分聚合结果，由协调节点合并
+        fragment_sql = sql
+        aggregate_columns = None
+        if features.has_aggregate and len(target_shards) > 1:
+            rewritten = self._rewrite_aggregate_for_shard(sql)
+            if rewritten is not None:
+                fragment_sql, aggregate_columns = rewritten
         
         # 创建查询片段
-        fragments = []
-        for i, shard_id in enumerate(target_shards):
-            shard_info = self.shard_manager.get_shard_info(shard_id)
-            fragment = QueryFragment(
-                fragment_id=f"{query_id}_f{i}",
-                sql=sql,  # 在实际实现中，这里应该修改SQL以适应分片
-                target_shard=shard_id,
-                node_id=shard_info.node_id if shard_info else "unknown",
-                estimated_cost=self.cost_model.estimate_fragment_cost(sql, shard_id),
-                estimated_rows=self.cost_model.estimate_result_rows(sql, shard_id)
-            )
-            fragments.append(fragment)
+        fragments = self._build_fragments(query_id, fragment_sql, table_name, target_shards,
+                                          features=features, pin=True)
         
         # 创建合并操作
         merge_operations = []
         if len(fragments) > 1:
             # 需要合并多个分片的结果
-            if 'GROUP BY' in sql.upper() or any(func in sql.upper() for func in ['COUNT(', 'SUM(', 'AVG(', 'MAX(', 'MIN(']):
+            if features.has_aggregate:
                 merge_operations.append((MergeOperation.AGGREGATE, [f.fragment_id for f in fragments], f"{query_id}_merge"))
-            elif 'ORDER BY' in sql.upper():
+            elif features.has_order_by:
                 merge_operations.append((MergeOperation.SORT_MERGE, [f.fragment_id for f in fragments], f"{query_id}_merge"))
             else:
                 merge_operations.append((MergeOperation.UNION, [f.fragment_id for f in fragments], f"{query_id}_merge"))
@@ -168,26 +519,36 @@ class DistributedQueryOptimizer:
             query_id=query_id,
             original_sql=sql,
             query_type=QueryType.SELECT,
+            target_shards=target_shards,
             fragments=fragments,
             merge_operations=merge_operations,
-            estimated_total_cost=sum(f.estimated_cost for f in fragments)
+            estimated_total_cost=sum(f.estimated_cost for f in fragments),
+            aggregate_columns=aggregate_columns
         )
     
     def _optimize_insert_query(self, query_id: str, sql: str, table_name: str) -> DistributedQueryPlan:
         """优化INSERT查询"""
         # 解析INSERT语句中的数据
-        data = self._parse_insert_data(sql)
+        statement = self._parse_insert(sql)
         
-        if not data:
+        if statement is None:
             raise ValueError("Could not parse INSERT data")
+        data = statement.rows
         
         # 为每条记录确定目标分片
         fragments = []
         shard_fragments = {}  # shard_id -> fragment
+        shard_rows: Dict[str, List[str]] = {}  # shard_id -> 路由到该分片的VALUES元组
         
-        for i, row_data in enumerate(data):
-            try:
-                shard_id = self.shard_manager.get_shard_for_insert(table_name, row_data)
+        # 一次加锁批量路由所有记录，None表示该记录找不到分片
+        try:
+            row_shard_ids = self.shard_manager.get_shards_for_insert_batch(table_name, data)
+        except ValueError:
+            row_shard_ids = [None] * len(data)
+        
+        for row_sql, shard_id in zip(statement.row_sql, row_shard_ids):
+            if shard_id is not None:
+                shard_rows.setdefault(shard_id, []).append(row_sql)
                 
                 if shard_id not in shard_fragments:
                     shard_info = self.shard_manager.get_shard_info(shard_id)
@@ -199,8 +560,9 @@ class DistributedQueryOptimizer:
                     )
                     shard_fragments[shard_id] = fragment
                     fragments.append(fragment)
-            except ValueError:
+            else:
                 # 非分片表或找不到分片，使用本地
+                shard_rows.setdefault("local", []).append(row_sql)
                 if "local" not in shard_fragments:
                     fragment = QueryFragment(
                         fragment_id=f"{query_id}_f{len(shard_fragments)}",
@@ -211,13 +573,13 @@ class DistributedQueryOptimizer:
                     shard_fragments["local"] = fragment
                     fragments.append(fragment)
         
-        # 为每个分片构建INSERT SQL
+        # 为每个分片构建只包含其记录的INSERT SQL
         for fragment in fragments:
-            if fragment.target_shard == "local":
+            rows = shard_rows[fragment.target_shard]
+            if len(rows) == len(data):
                 fragment.sql = sql
             else:
-                # 构建该分片的INSERT语句
-                fragment.sql = self._build_shard_insert_sql(sql, fragment.target_shard, data)
+                fragment.sql = self._build_shard_insert_sql(statement, rows)
         
         return DistributedQueryPlan(
             query_id=query_id,
@@ -227,147 +589,296 @@ class DistributedQueryOptimizer:
             merge_operations=[]  # INSERT通常不需要合并
         )
     
-    def _optimize_update_query(self, query_id: str, sql: str, table_name: str) -> DistributedQueryPlan:
-        """优化UPDATE查询"""
+    def _optimize_modify_query(self, query_id: str, sql: str, table_name: str,
+                               query_type: QueryType) -> DistributedQueryPlan:
+        """优化UPDATE/DELETE查询"""
         conditions = self._parse_where_conditions(sql)
-        target_shards = self.shard_manager.get_shards_for_query(table_name, conditions)
+        target_shards = self._prune_shards(table_name, conditions)
         
         if not target_shards:
-            fragment = QueryFragment(
-                fragment_id=f"{query_id}_f0",
-                sql=sql,
-                target_shard="local",
-                node_id="local"
-            )
-            return DistributedQueryPlan(
-                query_id=query_id,
-                original_sql=sql,
-                query_type=QueryType.UPDATE,
-                fragments=[fragment],
-                merge_operations=[]
-            )
-        
-        fragments = []
-        for i, shard_id in enumerate(target_shards):
-            shard_info = self.shard_manager.get_shard_info(shard_id)
-            fragment = QueryFragment(
-                fragment_id=f"{query_id}_f{i}",
-                sql=sql,
-                target_shard=shard_id,
-                node_id=shard_info.node_id if shard_info else "unknown"
-            )
-            fragments.append(fragment)
+            return self._local_plan(query_id, sql, query_type)
         
         return DistributedQueryPlan(
             query_id=query_id,
             original_sql=sql,
-            query_type=QueryType.UPDATE,
-            fragments=fragments,
+            query_type=query_type,
+            target_shards=target_shards,
+            fragments=self._build_fragments(query_id, sql, table_name, target_shards),
             merge_operations=[]
         )
     
-    def _optimize_delete_query(self, query_id: str, sql: str, table_name: str) -> DistributedQueryPlan:
-        """优化DELETE查询"""
-        conditions = self._parse_where_conditions(sql)
-        target_shards = self.shard_manager.get_shards_for_query(table_name, conditions)
-        
-        if not target_shards:
-            fragment = QueryFragment(
-                fragment_id=f"{query_id}_f0",
-                sql=sql,
-                target_shard="local",
-                node_id="local"
-            )
-            return DistributedQueryPlan(
-                query_id=query_id,
-                original_sql=sql,
-                query_type=QueryType.DELETE,
-                fragments=[fragment],
-                merge_operations=[]
-            )
+    def _local_plan(self, query_id: str, sql: str, query_type: QueryType) -> DistributedQueryPlan:
+        """非分片表的查询计划：单个本地片段"""
+        fragment = QueryFragment(
+            fragment_id=f"{query_id}_f0",
+            sql=sql,
+            target_shard="local",
+            node_id="local"
+        )
+        return DistributedQueryPlan(
+            query_id=query_id,
+            original_sql=sql,
+            query_type=query_type,
+            target_shards=[],
+            fragments=[fragment],
+            merge_operations=[]
+        )
+    
+    def _build_fragments(self, query_id: str, sql: str, table_name: str, target_shards: List[str],
+                         features: Optional[SqlFeatures] = None, pin: bool = False) -> List[QueryFragment]:
+        """为每个目标分片创建查询片段，给出features时估算成本，pin为True时加入分片键范围"""
+        shard_infos = self.shard_manager.get_shard_infos(target_shards)
+        predicates = self._shard_predicates(table_name, shard_infos) if pin else {}
         
         fragments = []
         for i, shard_id in enumerate(target_shards):
-            shard_info = self.shard_manager.get_shard_info(shard_id)
+            shard_info = shard_infos.get(shard_id)
             fragment = QueryFragment(
                 fragment_id=f"{query_id}_f{i}",
-                sql=sql,
+                sql=self._pin_to_shard(sql, predicates.get(shard_id)),
                 target_shard=shard_id,
                 node_id=shard_info.node_id if shard_info else "unknown"
             )
+            if features is not None:
+                fragment.estimated_cost = self.cost_model.estimate_fragment_cost(features, shard_id)
+                fragment.estimated_rows = self.cost_model.estimate_result_rows(features, shard_id)
             fragments.append(fragment)
-        
-        return DistributedQueryPlan(
-            query_id=query_id,
-            original_sql=sql,
-            query_type=QueryType.DELETE,
-            fragments=fragments,
-            merge_operations=[]
-        )
+        return fragments
     
     def _parse_where_conditions(self, sql: str) -> Dict[str, Any]:
-        """解析WHERE条件（简化实现）"""
+        """解析WHERE条件（简化实现）
+        
+        返回 列名 -> 等值字面量 / IN列表(tuple) / 范围条件(dict，如 {'>': 1, '<': 10})，
+        无法识别的条件被忽略（不参与分片裁剪）
+        """
+        ast = _parse_sql_ast(sql)
+        if ast is not None:
+            return self._where_conditions_from_ast(ast)
+        
         # 这里是一个简化的实现，实际应该使用SQL解析器
         conditions = {}
-        sql_upper = sql.upper()
-        
-        if 'WHERE' in sql_upper:
-            where_part = sql[sql_upper.find('WHERE') + 5:].strip()
-            # 简单的等值条件解析
-            if '=' in where_part:
-                parts = where_part.split('=')
-                if len(parts) == 2:
-                    key = parts[0].strip()
-                    value = parts[1].strip().strip("'\"")
-                    try:
-                        value = int(value)
-                    except ValueError:
-                        try:
-                            value = float(value)
-                        except ValueError:
-                            pass
-                    conditions[key] = value
+        where_part = _split_where(sql)[1]
+        if not where_part:
+            return conditions
+        
+        if _OR_RE.search(where_part):
+            # OR条件可能命中任意分片，不做裁剪
+            return conditions
+        
+        for predicate in _AND_RE.split(where_part):
+            in_match = _IN_LIST_RE.match(predicate)
+            if in_match:
+                items = _split_top_level(in_match.group(2))
+                values = [_parse_literal(item) for item in items or ()]
+                if values and _NOT_LITERAL not in values:
+                    conditions[in_match.group(1)] = tuple(dict.fromkeys(values))
+                continue
+            
+            cmp_match = _COMPARISON_RE.match(predicate)
+            if not cmp_match:
+                continue
+            key, op, value = cmp_match.groups()
+            value = _parse_literal(value)
+            if value is _NOT_LITERAL:
+                continue
+            
+            if op == '=':
+                conditions[key] = value
+            else:
+                existing = conditions.setdefault(key, {})
+                if isinstance(existing, dict):
+                    existing[op] = value
         
         return conditions
     
-    def _parse_insert_data(self, sql: str) -> List[Dict[str, Any]]:
-        """解析INSERT语句中的数据（简化实现）"""
-        # 这是一个非常简化的实现
-        # 实际应该使用完整的SQL解析器
-        data = []
+    def _where_conditions_from_ast(self, ast) -> Dict[str, Any]:
+        """从sqlglot AST提取WHERE条件，规则同简化解析"""
+        conditions = {}
+        where = ast.args.get('where')
+        if where is None or where.find(exp.Or):
+            return conditions
         
-        try:
-            sql_upper = sql.upper()
-            if 'VALUES' in sql_upper:
-                values_part = sql[sql_upper.find('VALUES') + 6:].strip()
-                # 简单解析单行数据
-                if values_part.startswith('(') and values_part.endswith(')'):
-                    values_str = values_part[1:-1]
-                    values = [v.strip().strip("'\"") for v in values_str.split(',')]
-                    
-                    # 假设有一个简单的表结构
-                    columns = ['id', 'name', 'value']  # 这应该从表schema获取
-                    if len(values) == len(columns):
-                        row_data = {}
-                        for i, col in enumerate(columns):
-                            try:
-                                row_data[col] = int(values[i])
-                            except ValueError:
-                                try:
-                                    row_data[col] = float(values[i])
-                                except ValueError:
-                                    row_data[col] = values[i]
-                        data.append(row_data)
-        except Exception:
-            pass
-        
-        return data
-    
-    def _build_shard_insert_sql(self, original_sql: str, shard_id: str, data: List[Dict[str, Any]]) -> str:
-        """为特定分片构建INSERT SQL"""
-        # 这里应该根据分片ID和数据构建适合该分片的INSERT语句
-        # 简化实现，直接返回原SQL
-        return original_sql
+        predicates = where.this.flatten() if isinstance(where.this, exp.And) else [where.this]
+        for predicate in predicates:
+            if not isinstance(predicate.this, exp.Column):
+                continue
+            key = predicate.this.name
+            
+            if isinstance(predicate, exp.In):
+                values = [_ast_literal(e) for e in predicate.expressions]
+                if values and _NOT_LITERAL not in values:
+                    conditions[key] = tuple(dict.fromkeys(values))
+                continue
+            
+            op = _AST_COMPARISON_OPS.get(type(predicate))
+            if op is None:
+                continue
+            value = _ast_literal(predicate.expression)
+            if value is _NOT_LITERAL or value is None:
+                continue
+            
+            if op == '=':
+                conditions[key] = value
+            else:
+                existing = conditions.setdefault(key, {})
+                if isinstance(existing, dict):
+                    existing[op] = value
+        
+        return conditions
+    
+    def _rewrite_aggregate_for_shard(self, sql: str) -> Optional[Tuple[str, Tuple[AggregateColumn, ...]]]:
+        """将聚合查询改写为分片上的部分聚合，无法安全下推时返回None"""
+        match = _SELECT_LIST_RE.match(sql)
+        if not match or _NON_PUSHABLE_RE.search(sql):
+            return None
+        
+        items = _split_top_level(match.group(1))
+        if not items:
+            return None
+        
+        shard_items = []
+        columns = []
+        for i, item in enumerate(items):
+            agg = _match_aggregate_item(item)
+            if agg:
+                function, argument, alias = agg
+                name = alias or item
+                if function == 'AVG':
+                    # AVG拆成SUM和COUNT，合并后再相除
+                    partials = (f"__agg{i}_sum", f"__agg{i}_cnt")
+                    shard_items.append(f"SUM({argument}) AS {partials[0]}")
+                    shard_items.append(f"COUNT({argument}) AS {partials[1]}")
+                else:
+                    partials = (f"__agg{i}",)
+                    shard_items.append(f"{function}({argument}) AS {partials[0]}")
+                columns.append(AggregateColumn(name, function, partials))
+                continue
+            
+            col = _COLUMN_ITEM_RE.match(item)
+            if not col:
+                # 表达式列无法确定结果列名
+                return None
+            name = col.group(2) or col.group(1)
+            shard_items.append(item)
+            columns.append(AggregateColumn(name, None, (name,)))
+        
+        shard_sql = f"SELECT {', '.join(shard_items)} FROM {match.group(2)}"
+        return shard_sql, tuple(columns)
+    
+    def _parse_insert(self, sql: str) -> Optional[_InsertStatement]:
+        """解析INSERT语句（支持列清单和多行VALUES），任一行无法解析时返回None"""
+        prefix = _INSERT_PREFIX_RE.match(sql)
+        if not prefix:
+            return None
+        # 各行的原始文本，拆分到分片时原样使用，保留函数调用等非字面量的值
+        row_sql = _split_top_level(sql[prefix.end():].strip().rstrip(';').rstrip())
+        
+        ast = _parse_sql_ast(sql)
+        if ast is not None and isinstance(ast, exp.Insert):
+            rows = self._insert_rows_from_ast(ast)
+        else:
+            rows = self._insert_rows_from_text(sql)
+        if rows is None or not row_sql:
+            return None
+        
+        columns, value_rows = rows
+        # 未给出列清单时假设一个简单的表结构用于路由，这应该从表schema获取
+        columns = columns or _DEFAULT_INSERT_COLUMNS
+        if len(row_sql) != len(value_rows) or any(len(values) != len(columns) for values in value_rows):
+            return None
+        return _InsertStatement(
+            prefix=prefix.group(1),
+            rows=[dict(zip(columns, values)) for values in value_rows],
+            row_sql=row_sql
+        )
+    
+    def _insert_rows_from_ast(self, ast) -> Optional[Tuple[List[str], List[List[Any]]]]:
+        """从sqlglot AST提取INSERT的列清单和各行的值"""
+        values = ast.expression
+        if not isinstance(values, exp.Values):
+            return None
+        
+        columns = []
+        if isinstance(ast.this, exp.Schema):
+            columns = [column.name for column in ast.this.expressions]
+        
+        value_rows = []
+        for row in values.expressions:
+            row_values = []
+            for node in row.expressions:
+                value = _ast_literal(node)
+                row_values.append(node.sql() if value is _NOT_LITERAL else value)
+            value_rows.append(row_values)
+        return columns, value_rows
+    
+    def _insert_rows_from_text(self, sql: str) -> Optional[Tuple[List[str], List[List[Any]]]]:
+        """按文本解析INSERT的列清单和各行的值（简化实现）"""
+        match = _INSERT_RE.match(sql)
+        if not match:
+            return None
+        
+        columns = []
+        if match.group(1):
+            columns = [c.strip().strip('`"') for c in match.group(1).split(',')]
+        
+        tuples = _split_top_level(match.group(2))
+        if not tuples:
+            return None
+        
+        value_rows = []
+        for row_text in tuples:
+            if not (row_text.startswith('(') and row_text.endswith(')')):
+                return None
+            items = _split_top_level(row_text[1:-1])
+            if items is None:
+                return None
+            row_values = []
+            for item in items:
+                value = _parse_literal(item)
+                if value is _NOT_LITERAL:
+                    value = None if item.upper() == 'NULL' else item
+                row_values.append(value)
+            value_rows.append(row_values)
+        return columns, value_rows
+    
+    def _build_shard_insert_sql(self, statement: _InsertStatement, row_sql: List[str]) -> str:
+        """为特定分片构建INSERT SQL，row_sql为路由到该分片的VALUES元组"""
+        # 保留原语句的列清单（没有列清单时也不补上）和每行的原始值
+        return f"{statement.prefix} {', '.join(row_sql)}"
+    
+    def _shard_predicates(self, table_name: str, shard_infos: Dict[str, Any]) -> Dict[str, str]:
+        """范围分片的分片键谓词：shard_id -> SQL条件"""
+        metadata = self.shard_manager.get_table_metadata(table_name)
+        if metadata is None:
+            return {}
+        
+        key = metadata.shard_key
+        predicates = {}
+        for shard_id, shard_info in shard_infos.items():
+            # 只有范围分片能用谓词表达
+            if shard_info.key_range:
+                min_val, max_val = shard_info.key_range
+                # 开放区间（None或无穷大）的一端不加条件
+                bounds = []
+                if _is_finite_bound(min_val):
+                    bounds.append(f"{key} >= {_sql_literal(min_val)}")
+                if _is_finite_bound(max_val):
+                    bounds.append(f"{key} < {_sql_literal(max_val)}")
+                if bounds:
+                    predicates[shard_id] = ' AND '.join(bounds)
+        return predicates
+    
+    def _pin_to_shard(self, sql: str, predicate: Optional[str]) -> str:
+        """在片段SQL的WHERE中加入分片键范围，让分片只扫描自己负责的数据"""
+        if not predicate or extract_sql_features(sql).has_join:
+            # 多表查询中分片键列名可能有歧义
+            return sql
+        
+        # 同一SQL的各个片段共用一次WHERE定位结果
+        head, condition, tail = _split_where(sql)
+        if condition:
+            return f"{head} {predicate} AND ({condition}) {tail}".rstrip()
+        return f"{head} {predicate}{tail}"
 
 class DistributedCostModel:
     """分布式查询成本模型"""
@@ -378,20 +889,20 @@ class DistributedCostModel:
         self.cpu_cost_factor = 0.05
         self.io_cost_factor = 0.2
     
-    def estimate_fragment_cost(self, sql: str, shard_id: str) -> float:
+    def estimate_fragment_cost(self, features: Union[SqlFeatures, str], shard_id: str) -> float:
         """估算查询片段的执行成本"""
+        if isinstance(features, str):
+            features = extract_sql_features(features)
         cost = self.base_cost
         
         # 基于SQL复杂度的成本估算
-        sql_upper = sql.upper()
-        
-        if 'JOIN' in sql_upper:
+        if features.has_join:
             cost += 5.0
-        if 'GROUP BY' in sql_upper:
+        if features.has_group_by:
             cost += 3.0
-        if 'ORDER BY' in sql_upper:
+        if features.has_order_by:
             cost += 2.0
-        if 'DISTINCT' in sql_upper:
+        if features.has_distinct:
             cost += 1.5
         
         # 网络成本（如果是远程分片）
@@ -400,15 +911,16 @@ class DistributedCostModel:
         
         return cost
     
-    def estimate_result_rows(self, sql: str, shard_id: str) -> int:
+    def estimate_result_rows(self, features: Union[SqlFeatures, str], shard_id: str) -> int:
         """估算查询结果行数"""
+        if isinstance(features, str):
+            features = extract_sql_features(features)
         # 简化的行数估算
         base_rows = 1000
         
-        sql_upper = sql.upper()
-        if 'WHERE' in sql_upper:
+        if features.has_where:
             base_rows = int(base_rows * 0.1)  # WHERE条件减少结果
-        if 'GROUP BY' in sql_upper:
+        if features.has_group_by:
             base_rows = int(base_rows * 0.05)  # GROUP BY进一步减少
         
         return max(1, base_rows)
@@ -426,14 +938,114 @@ class DistributedCostModel:
         else:
             return base_cost
 
+def _add_partial(a, b):
+    """SUM/COUNT部分结果相加（忽略NULL）"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return a + b
+
+def _min_partial(a, b):
+    """MIN部分结果合并（忽略NULL）"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return b if b < a else a
+
+def _max_partial(a, b):
+    """MAX部分结果合并（忽略NULL）"""
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return b if b > a else a
+
+_PARTIAL_COMBINERS = {
+    'COUNT': _add_partial,
+    'SUM': _add_partial,
+    'AVG': _add_partial,
+    'MIN': _min_partial,
+    'MAX': _max_partial,
+}
+
+def _combine_partial_aggregates(results: List[QueryResult],
+                                aggregate_columns: Tuple[AggregateColumn, ...]) -> List[Dict[str, Any]]:
+    """按分组列合并部分聚合结果，并计算最终聚合值"""
+    key_columns = [c.name for c in aggregate_columns if c.function is None]
+    partial_columns = []
+    combiners = []
+    for column in aggregate_columns:
+        if column.function is not None:
+            partial_columns.extend(column.partials)
+            combiners.extend([_PARTIAL_COMBINERS[column.function]] * len(column.partials))
+    
+    # 分组键 -> 部分聚合值列表（保持首次出现的顺序）
+    groups: Dict[Tuple[Any, ...], List[Any]] = {}
+    for result in results:
+        # 按列取值，每列只遍历一次结果行
+        row_count = len(result.data)
+        keys = (zip(*[result.column(c) for c in key_columns]) if key_columns
+                else itertools.repeat((), row_count))
+        partials = (zip(*[result.column(c) for c in partial_columns]) if partial_columns
+                    else itertools.repeat((), row_count))
+        for key, values in zip(keys, partials):
+            acc = groups.get(key)
+            if acc is None:
+                groups[key] = list(values)
+            else:
+                for i, combine in enumerate(combiners):
+                    acc[i] = combine(acc[i], values[i])
+    
+    data = []
+    for key, acc in groups.items():
+        row = {}
+        key_pos = 0
+        acc_pos = 0
+        for column in aggregate_columns:
+            if column.function is None:
+                row[column.name] = key[key_pos]
+                key_pos += 1
+            elif column.function == 'AVG':
+                total, count = acc[acc_pos], acc[acc_pos + 1]
+                row[column.name] = total / count if count else None
+                acc_pos += 2
+            else:
+                row[column.name] = acc[acc_pos]
+                acc_pos += 1
+        data.append(row)
+    return data
+
+_NUMPY_MIN_SORT_ROWS = 256  # 数据量较小时NumPy的转换开销大于收益
+
+def _sort_order(keys: List[Any]) -> List[int]:
+    """返回按排序键稳定排序后的下标，数值键较多时使用NumPy"""
+    if np is not None and len(keys) >= _NUMPY_MIN_SORT_ROWS:
+        array = np.asarray(keys)
+        if array.dtype.kind in 'biuf':
+            return np.argsort(array, kind='stable').tolist()
+    return sorted(range(len(keys)), key=keys.__getitem__)
+
 class DistributedQueryExecutor:
     """分布式查询执行器"""
     
-    def __init__(self, max_workers: int = 10):
+    PARALLEL_MERGE_THRESHOLD = 4  # 输入结果数超过该值时分组并行合并
+    # 可结合的合并操作，分组合并后再合并结果不变
+    PARALLEL_MERGE_OPERATIONS = frozenset({MergeOperation.UNION, MergeOperation.SORT_MERGE})
+    
+    def __init__(self, max_workers: int = 10, executor: Optional[ThreadPoolExecutor] = None):
         self.max_workers = max_workers
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 允许外部注入共享线程池，未注入时使用自有线程池
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+        # 限制同时在线程池中执行的合并任务数，避免挤占查询片段的执行
+        self._merge_slots = threading.BoundedSemaphore(max(1, max_workers // 2))
+        # 协程片段执行函数使用的事件循环（首次使用时在专用线程中启动）
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
         self.active_queries: Dict[str, DistributedQueryPlan] = {}
-        self.lock = threading.RLock()
+        self.lock = threading.Lock()
     
     def execute_query(self, plan: DistributedQueryPlan, 
                      fragment_executor_func) -> List[QueryResult]:
@@ -452,7 +1064,8 @@ class DistributedQueryExecutor:
                 )
                 return merged_results
             else:
-                return fragment_results
+                # 按计划中的片段顺序返回
+                return [fragment_results[f.fragment_id] for f in plan.fragments]
         
         finally:
             with self.lock:
@@ -462,40 +1075,77 @@ class DistributedQueryExecutor:
     def _execute_fragments(self, plan: DistributedQueryPlan, 
                           fragment_executor_func) -> Dict[str, QueryResult]:
         """执行查询片段"""
-        future_to_fragment = {}
-        
-        for fragment in plan.fragments:
-            future = self.executor.submit(
-                self._execute_single_fragment, 
-                fragment, 
-                fragment_executor_func
+        if asyncio.iscoroutinefunction(fragment_executor_func):
+            # 异步执行函数：所有片段在事件循环中并发执行，不占用线程池
+            future = asyncio.run_coroutine_threadsafe(
+                self._execute_fragments_async(plan, fragment_executor_func),
+                self._get_event_loop()
             )
-            future_to_fragment[future] = fragment
+            return future.result()
         
-        results = {}
-        for future in as_completed(future_to_fragment):
-            fragment = future_to_fragment[future]
-            try:
-                result = future.result()
-                results[fragment.fragment_id] = result
-            except Exception as e:
-                error_result = QueryResult(
-                    fragment_id=fragment.fragment_id,
-                    shard_id=fragment.target_shard,
-                    node_id=fragment.node_id,
-                    data=[],
-                    columns=[],
-                    execution_time=0.0,
-                    error=str(e)
+        fragments = plan.fragments
+        if len(fragments) == 1:
+            # 单片段查询（如裁剪到单个分片的点查询）直接在当前线程执行，省去线程切换
+            result = self._execute_single_fragment(fragments[0], fragment_executor_func)
+            return {result.fragment_id: result}
+        
+        # _execute_single_fragment自行捕获异常并返回错误结果，可直接按序map
+        results = self.executor.map(
+            self._execute_single_fragment, fragments, itertools.repeat(fragment_executor_func)
+        )
+        return {result.fragment_id: result for result in results}
+    
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        """获取执行协程片段的事件循环"""
+        with self.lock:
+            if self._loop is None:
+                self._loop = asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="query-fragment-loop", daemon=True
                 )
-                results[fragment.fragment_id] = error_result
+                self._loop_thread.start()
+            return self._loop
+    
+    async def _execute_fragments_async(self, plan: DistributedQueryPlan,
+                                       fragment_executor_func) -> Dict[str, QueryResult]:
+        """并发执行所有查询片段（协程版本）"""
+        results = await asyncio.gather(*(
+            self._execute_single_fragment_async(fragment, fragment_executor_func)
+            for fragment in plan.fragments
+        ))
+        return {result.fragment_id: result for result in results}
+    
+    async def _execute_single_fragment_async(self, fragment: QueryFragment,
+                                             fragment_executor_func) -> QueryResult:
+        """执行单个查询片段（协程版本）"""
+        start_ns = time.perf_counter_ns()
+        error = None
+        
+        try:
+            data, columns, rows_affected = await fragment_executor_func(
+                fragment.sql,
+                fragment.target_shard,
+                fragment.node_id
+            )
+        except Exception as e:
+            data, columns, rows_affected, error = [], [], 0, str(e)
         
-        return results
+        return QueryResult(
+            fragment_id=fragment.fragment_id,
+            shard_id=fragment.target_shard,
+            node_id=fragment.node_id,
+            data=data,
+            columns=columns,
+            execution_time=(time.perf_counter_ns() - start_ns) / 1e9,
+            rows_affected=rows_affected,
+            error=error
+        )
     
     def _execute_single_fragment(self, fragment: QueryFragment, 
                                 fragment_executor_func) -> QueryResult:
         """执行单个查询片段"""
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
+        error = None
         
         try:
             # 调用外部提供的片段执行函数
@@ -504,60 +1154,88 @@ class DistributedQueryExecutor:
                 fragment.target_shard, 
                 fragment.node_id
             )
-            
-            execution_time = time.time() - start_time
-            
-            return QueryResult(
-                fragment_id=fragment.fragment_id,
-                shard_id=fragment.target_shard,
-                node_id=fragment.node_id,
-                data=data,
-                columns=columns,
-                execution_time=execution_time,
-                rows_affected=rows_affected
-            )
-        
         except Exception as e:
-            execution_time = time.time() - start_time
-            return QueryResult(
-                fragment_id=fragment.fragment_id,
-                shard_id=fragment.target_shard,
-                node_id=fragment.node_id,
-                data=[],
-                columns=[],
-                execution_time=execution_time,
-                error=str(e)
-            )
+            data, columns, rows_affected, error = [], [], 0, str(e)
+        
+        return QueryResult(
+            fragment_id=fragment.fragment_id,
+            shard_id=fragment.target_shard,
+            node_id=fragment.node_id,
+            data=data,
+            columns=columns,
+            execution_time=(time.perf_counter_ns() - start_ns) / 1e9,
+            rows_affected=rows_affected,
+            error=error
+        )
     
     def _execute_merge_operations(self, plan: DistributedQueryPlan, 
                                  fragment_results: Dict[str, QueryResult],
                                  fragment_executor_func) -> List[QueryResult]:
         """执行合并操作"""
-        current_results = fragment_results.copy()
+        # 只记录合并产生的结果，输入依次在片段结果和前序合并结果中查找
+        outputs: Dict[str, QueryResult] = {}
         
         for operation, input_fragments, output_id in plan.merge_operations:
-            input_results = [current_results[fid] for fid in input_fragments 
-                           if fid in current_results and current_results[fid].success]
+            input_results = []
+            for fid in input_fragments:
+                result = fragment_results.get(fid) or outputs.get(fid)
+                if result is not None and result.success:
+                    input_results.append(result)
             
             if not input_results:
                 continue
             
-            merged_result = self._merge_results(operation, input_results, output_id)
-            current_results[output_id] = merged_result
+            if operation == MergeOperation.AGGREGATE and plan.aggregate_columns is not None:
+                merged_result = self._merge_partial_aggregates(
+                    input_results, output_id, plan.aggregate_columns
+                )
+            else:
+                merged_result = self._parallel_merge(operation, input_results, output_id)
+            outputs[output_id] = merged_result
         
         # 返回最终结果
-        final_results = []
-        for operation, input_fragments, output_id in plan.merge_operations:
-            if output_id in current_results:
-                final_results.append(current_results[output_id])
+        return list(outputs.values()) or list(fragment_results.values())
+    
+    def _parallel_merge(self, operation: MergeOperation,
+                        results: List[QueryResult],
+                        output_id: str) -> QueryResult:
+        """分组并行合并：各组在线程池中合并，再在当前线程合并各组结果"""
+        if (len(results) <= self.PARALLEL_MERGE_THRESHOLD
+                or operation not in self.PARALLEL_MERGE_OPERATIONS):
+            return self._merge_results(operation, results, output_id)
         
-        return final_results if final_results else list(current_results.values())
+        group_count = min(self.max_workers, -(-len(results) // self.PARALLEL_MERGE_THRESHOLD))
+        group_size = -(-len(results) // group_count)
+        futures = []
+        for start in range(0, len(results), group_size):
+            self._merge_slots.acquire()
+            try:
+                futures.append(self.executor.submit(
+                    self._merge_group, operation, results[start:start + group_size], output_id
+                ))
+            except Exception:
+                self._merge_slots.release()
+                raise
+        
+        partial_results = [future.result() for future in futures]
+        for partial in partial_results:
+            if not partial.success:
+                return partial
+        return self._merge_results(operation, partial_results, output_id)
+    
+    def _merge_group(self, operation: MergeOperation,
+                     results: List[QueryResult], output_id: str) -> QueryResult:
+        """在线程池中合并一组结果"""
+        try:
+            return self._merge_results(operation, results, output_id)
+        finally:
+            self._merge_slots.release()
     
     def _merge_results(self, operation: MergeOperation, 
                       results: List[QueryResult], 
                       output_id: str) -> QueryResult:
         """合并查询结果"""
-        start_time = time.time()
+        start_ns = time.perf_counter_ns()
         
         try:
             if operation == MergeOperation.UNION:
@@ -571,7 +1249,7 @@ class DistributedQueryExecutor:
                 return self._union_merge(results, output_id)
         
         except Exception as e:
-            execution_time = time.time() - start_time
+            execution_time = (time.perf_counter_ns() - start_ns) / 1e9
             return QueryResult(
                 fragment_id=output_id,
                 shard_id="merged",
@@ -594,39 +1272,58 @@ class DistributedQueryExecutor:
                 execution_time=0.0
             )
         
-        merged_data = []
-        columns = results[0].columns
+        # 一次C层迭代拼接所有分片数据
+        merged_data = list(itertools.chain.from_iterable(r.data for r in results))
+        return self._build_merged_result(results, output_id, merged_data)
+    
+    def _build_merged_result(self, results: List[QueryResult], output_id: str,
+                             merged_data: List[Dict[str, Any]]) -> QueryResult:
+        """用合并后的数据构建结果，汇总影响行数和执行时间"""
         total_rows = 0
-        
+        execution_time = 0.0
         for result in results:
-            merged_data.extend(result.data)
             total_rows += result.rows_affected
-        
-        execution_time = sum(r.execution_time for r in results)
+            execution_time += result.execution_time
         
         return QueryResult(
             fragment_id=output_id,
             shard_id="merged",
             node_id="local",
             data=merged_data,
-            columns=columns,
+            columns=results[0].columns,
             execution_time=execution_time,
             rows_affected=total_rows
         )
     
     def _sort_merge(self, results: List[QueryResult], output_id: str) -> QueryResult:
         """排序合并"""
-        union_result = self._union_merge(results, output_id)
+        if not results or not results[0].columns:
+            return self._union_merge(results, output_id)
         
-        # 简化的排序实现，假设按第一列排序
-        if union_result.data and union_result.columns:
-            first_col = union_result.columns[0]
-            try:
-                union_result.data.sort(key=lambda x: x.get(first_col, 0))
-            except (TypeError, KeyError):
-                pass  # 排序失败，保持原顺序
+        # 简化的排序实现，假设按第一列排序；排序键按列一次取出，之后只比较键
+        first_col = results[0].columns[0]
+        key_columns = [r.column(first_col, 0) for r in results]
+        try:
+            if all(self._is_sorted(keys) for keys in key_columns):
+                # 各分片已按相同ORDER BY排好序，k路归并即可
+                merged = heapq.merge(*(zip(keys, r.data) for keys, r in zip(key_columns, results)),
+                                     key=itemgetter(0))
+                merged_data = [row for _, row in merged]
+            else:
+                all_keys = list(itertools.chain.from_iterable(key_columns))
+                all_rows = list(itertools.chain.from_iterable(r.data for r in results))
+                order = _sort_order(all_keys)
+                merged_data = [all_rows[i] for i in order]
+        except TypeError:
+            # 排序失败，保持原顺序
+            merged_data = list(itertools.chain.from_iterable(r.data for r in results))
         
-        return union_result
+        return self._build_merged_result(results, output_id, merged_data)
+    
+    @staticmethod
+    def _is_sorted(keys: List[Any]) -> bool:
+        """检查排序键列是否有序"""
+        return all(a <= b for a, b in zip(keys, itertools.islice(keys, 1, None)))
     
     def _aggregate_merge(self, results: List[QueryResult], output_id: str) -> QueryResult:
         """聚合合并"""
@@ -663,6 +1360,33 @@ class DistributedQueryExecutor:
             rows_affected=len(aggregated_data)
         )
     
+    def _merge_partial_aggregates(self, results: List[QueryResult], output_id: str,
+                                  aggregate_columns: Tuple[AggregateColumn, ...]) -> QueryResult:
+        """合并各分片的部分聚合结果"""
+        start_ns = time.perf_counter_ns()
+        try:
+            data = _combine_partial_aggregates(results, aggregate_columns)
+        except Exception as e:
+            return QueryResult(
+                fragment_id=output_id,
+                shard_id="merged",
+                node_id="local",
+                data=[],
+                columns=[],
+                execution_time=(time.perf_counter_ns() - start_ns) / 1e9,
+                error=str(e)
+            )
+        
+        return QueryResult(
+            fragment_id=output_id,
+            shard_id="merged",
+            node_id="local",
+            data=data,
+            columns=[c.name for c in aggregate_columns],
+            execution_time=sum(r.execution_time for r in results),
+            rows_affected=len(data)
+        )
+    
     def get_active_queries(self) -> List[str]:
         """获取活跃查询列表"""
         with self.lock:
@@ -679,30 +1403,63 @@ class DistributedQueryExecutor:
     
     def shutdown(self):
         """关闭执行器"""
-        self.executor.shutdown(wait=True)
+        if self._owns_executor:
+            self.executor.shutdown(wait=True)
+        
+        with self.lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is not None:
+            loop.call_soon_threadsafe(loop.stop)
+            thread.join()
+            loop.close()
 
 class DistributedQueryProcessor:
     """分布式查询处理器主类"""
     
-    def __init__(self, shard_manager, max_workers: int = 10):
+    PLAN_CACHE_SIZE = 1024  # 查询计划缓存上限（LRU淘汰）
+    
+    def __init__(self, shard_manager, max_workers: int = 10,
+                 executor: Optional[ThreadPoolExecutor] = None):
         self.shard_manager = shard_manager
         self.optimizer = DistributedQueryOptimizer(shard_manager)
-        self.executor = DistributedQueryExecutor(max_workers)
-        self.query_cache: Dict[str, DistributedQueryPlan] = {}
-        self.cache_lock = threading.RLock()
+        self.executor = DistributedQueryExecutor(max_workers, executor)
+        # (表名, 规范化SQL模板) -> 查询计划，仅字面量不同的查询共用同一条目
+        # query_cache维护LRU顺序，只在cache_lock下修改
+        self.query_cache: "OrderedDict[Tuple[str, str], DistributedQueryPlan]" = OrderedDict()
+        # 供无锁读取的索引，与query_cache内容一致，在cache_lock下逐条增删
+        # （读取方只做单次get，CPython下与单条写入互不干扰，无需整体复制）
+        self._plan_snapshot: Dict[Tuple[str, str], DistributedQueryPlan] = {}
+        self.cache_lock = threading.Lock()
     
     def process_query(self, sql: str, table_name: str, 
                      fragment_executor_func) -> List[QueryResult]:
         """处理分布式查询"""
         # 查询计划缓存
-        cache_key = f"{table_name}:{hash(sql)}"
+        cache_key = (table_name, normalize_sql(sql)[0])
         
-        with self.cache_lock:
-            if cache_key in self.query_cache:
-                plan = self.query_cache[cache_key]
-            else:
-                plan = self.optimizer.optimize_query(sql, table_name)
-                self.query_cache[cache_key] = plan
+        plan = self._plan_snapshot.get(cache_key)
+        if plan is not None:
+            # 更新LRU顺序只是尽力而为，锁被占用时跳过，命中路径不等待
+            if self.cache_lock.acquire(blocking=False):
+                try:
+                    if cache_key in self.query_cache:
+                        self.query_cache.move_to_end(cache_key)
+                finally:
+                    self.cache_lock.release()
+            plan = self.optimizer.rebind_plan(plan, sql, table_name)
+        
+        if plan is None:
+            plan = self.optimizer.optimize_query(sql, table_name)
+            # INSERT计划按行数据改写，无法被其他语句复用，不进入缓存
+            if plan.query_type != QueryType.INSERT:
+                with self.cache_lock:
+                    self.query_cache[cache_key] = plan
+                    self.query_cache.move_to_end(cache_key)
+                    self._plan_snapshot[cache_key] = plan
+                    if len(self.query_cache) > self.PLAN_CACHE_SIZE:
+                        evicted_key, _ = self.query_cache.popitem(last=False)
+                        self._plan_snapshot.pop(evicted_key, None)
         
         # 执行查询
         return self.executor.execute_query(plan, fragment_executor_func)
@@ -715,11 +1472,12 @@ class DistributedQueryProcessor:
         """清空查询计划缓存"""
         with self.cache_lock:
             self.query_cache.clear()
+            self._plan_snapshot.clear()
     
     def get_statistics(self) -> Dict[str, Any]:
         """获取查询处理器统计信息"""
         return {
-            'cached_plans': len(self.query_cache),
+            'cached_plans': len(self._plan_snapshot),
             'active_queries': len(self.executor.get_active_queries()),
             'max_workers': self.executor.max_workers
         }
@@ -4,16 +4,146 @@
 实现主从复制机制、最终一致性模型和读写分离
 """
 
+import asyncio
+import sys
 import threading
 import time
-import queue
 import json
-from typing import Dict, List, Any, Optional, Set, Callable
-from dataclasses import dataclass, asdict
+import struct
+import hashlib
+import zlib
+import itertools
+import re
+from collections import deque
+from typing import Dict, List, Any, Optional, Set, Callable, Tuple, Hashable, Iterator
+from dataclasses import dataclass, field, asdict
 from enum import Enum
-from concurrent.futures import ThreadPoolExecutor, as_completed
+from concurrent.futures import Future, ThreadPoolExecutor, as_completed
+from concurrent.futures import TimeoutError as FuturesTimeoutError
 import logging
 
+from .rwlock import RWLock
+
+try:
+    import numpy as np
+except ImportError:  # NumPy为可选依赖，不可用时使用纯Python实现
+    np = None
+
+try:
+    import uvloop
+except ImportError:  # uvloop为可选依赖，不可用时使用默认事件循环
+    uvloop = None
+
+try:
+    import blake3
+except ImportError:  # blake3为可选依赖，不可用时使用hashlib.blake2b
+    blake3 = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard为可选依赖，不可用时尝试lz4
+    zstandard = None
+
+try:
+    import lz4.frame as lz4_frame
+except ImportError:  # lz4为可选依赖，都不可用时使用zlib
+    lz4_frame = None
+
+def _canonical_serialize(data: Dict[str, Any]) -> bytes:
+    """按键排序序列化日志数据"""
+    # 参与校验和，各节点必须得到相同的字节，因此固定使用标准库json（不随可选依赖变化）
+    return json.dumps(data, sort_keys=True, separators=(',', ':'),
+                      ensure_ascii=False).encode()
+
+# 帧头：帧体长度、帧类型
+_FRAME_HEADER = struct.Struct('<IB')
+_FRAME_LOG_ENTRY = 1
+_FRAME_HEARTBEAT = 2
+_FRAME_BATCH = 3
+# 批量帧的压缩编码（帧体首字节）
+_CODEC_NONE = 0
+_CODEC_ZLIB = 1
+_CODEC_ZSTD = 2
+_CODEC_LZ4 = 3
+# 小于该字节数的批次不压缩
+_COMPRESS_MIN_BYTES = 512
+# 每个线程缓存自己的压缩器
+_codec_local = threading.local()
+# 日志帧体头部：序列号、时间戳、校验和、操作类型/表名/log_id长度、SQL长度（-1表示无SQL）、数据长度
+_LOG_ENTRY_HEADER = struct.Struct('<QdIHHHiI')
+
+def _frame_heartbeat(node_id: str, now: float) -> bytes:
+    """编码心跳帧"""
+    body = _canonical_serialize({'heartbeat': now, 'node_id': node_id})
+    return _FRAME_HEADER.pack(len(body), _FRAME_HEARTBEAT) + body
+
+def _frame_log_entry(log_entry: 'ReplicationLog') -> bytes:
+    """将日志条目编码为帧，数据部分直接复用条目中已序列化的字节"""
+    operation_type = log_entry.operation_type.encode()
+    table_name = log_entry.table_name.encode()
+    log_id = log_entry.log_id.encode()
+    sql = log_entry.sql.encode() if log_entry.sql is not None else b''
+    packed = log_entry.packed_data
+    header = _LOG_ENTRY_HEADER.pack(
+        log_entry.sequence_number, log_entry.timestamp, log_entry.checksum,
+        len(operation_type), len(table_name), len(log_id),
+        len(sql) if log_entry.sql is not None else -1, len(packed)
+    )
+    body_size = len(header) + len(operation_type) + len(table_name) + len(log_id) + len(sql) + len(packed)
+    return b''.join((_FRAME_HEADER.pack(body_size, _FRAME_LOG_ENTRY), header,
+                     operation_type, table_name, log_id, sql, packed))
+
+def _compress(payload: bytes) -> Tuple[int, bytes]:
+    """使用可用的最快编解码器压缩数据"""
+    if zstandard is not None:
+        compressor = getattr(_codec_local, 'zstd', None)
+        if compressor is None:
+            compressor = _codec_local.zstd = zstandard.ZstdCompressor(level=1)
+        return _CODEC_ZSTD, compressor.compress(payload)
+    if lz4_frame is not None:
+        return _CODEC_LZ4, lz4_frame.compress(payload, compression_level=0)
+    return _CODEC_ZLIB, zlib.compress(payload, 1)
+
+def _frame_batch(payload: bytes) -> bytes:
+    """将一批帧封装为批量帧，较大的批次在压缩有效时压缩"""
+    codec, body = _CODEC_NONE, payload
+    if len(payload) >= _COMPRESS_MIN_BYTES:
+        compressed_codec, compressed = _compress(payload)
+        if len(compressed) < len(payload):
+            codec, body = compressed_codec, compressed
+    return b''.join((_FRAME_HEADER.pack(len(body) + 1, _FRAME_BATCH), bytes((codec,)), body))
+
+def _unpack_batch(body: bytes) -> bytes:
+    """解开批量帧的帧体，返回其中连续的日志帧"""
+    codec, data = body[0], body[1:]
+    if codec == _CODEC_NONE:
+        return data
+    if codec == _CODEC_ZLIB:
+        return zlib.decompress(data)
+    if codec == _CODEC_ZSTD and zstandard is not None:
+        return zstandard.ZstdDecompressor().decompress(data)
+    if codec == _CODEC_LZ4 and lz4_frame is not None:
+        return lz4_frame.decompress(data)
+    raise ValueError(f"Unsupported replication batch codec: {codec}")
+
+def _strong_digest(buf: bytes) -> str:
+    """计算128位摘要，优先使用BLAKE3"""
+    if blake3 is not None:
+        return blake3.blake3(buf).hexdigest(length=16)
+    return hashlib.blake2b(buf, digest_size=16).hexdigest()
+
+def _crc32(buf: bytes) -> int:
+    """计算CRC32校验值（固定使用IEEE多项式，集群内各节点结果一致）"""
+    return zlib.crc32(buf)
+
+# 超过该时间（秒）没有心跳的副本视为不健康
+_HEARTBEAT_TIMEOUT = 30.0
+# 副本数达到该值时，健康检查使用NumPy列式视图批量比较
+_NUMPY_MIN_HEALTH_CHECK_REPLICAS = 256
+
+# 复制日志和副本信息使用__slots__，去掉每个实例的__dict__（slots参数需要Python 3.10+）
+_RECORD_OPTIONS = {'slots': True} if sys.version_info >= (3, 10) else {}
+
 class ReplicaRole(Enum):
     """副本角色"""
     MASTER = "master"
@@ -31,10 +161,11 @@ class ReplicationMode(Enum):
     SYNC = "synchronous"     # 同步复制
     ASYNC = "asynchronous"   # 异步复制
     SEMI_SYNC = "semi_synchronous"  # 半同步复制
+    SNAPSHOT = "snapshot"    # 快照复制：按固定时间窗口批量发送，延迟有上界
 
-@dataclass
+@dataclass(frozen=True, **_RECORD_OPTIONS)
 class ReplicationLog:
-    """复制日志条目"""
+    """复制日志条目（创建后不可修改）"""
     log_id: str
     sequence_number: int
     timestamp: float
@@ -42,19 +173,34 @@ class ReplicationLog:
     table_name: str
     data: Dict[str, Any]
     sql: Optional[str] = None
-    checksum: Optional[str] = None
+    checksum: Optional[int] = None
+    # 序列化后的数据，校验和发送共用，只序列化一次
+    packed_data: bytes = field(default=b'', init=False, repr=False, compare=False)
     
     def __post_init__(self):
+        object.__setattr__(self, 'packed_data', _canonical_serialize(self.data))
         if self.checksum is None:
-            self.checksum = self._calculate_checksum()
+            object.__setattr__(self, 'checksum', self._calculate_checksum())
     
-    def _calculate_checksum(self) -> str:
+    def _checksum_content(self) -> bytes:
+        """构建参与校验的字节内容"""
+        operation_type = self.operation_type.encode()
+        return b''.join((
+            struct.pack('<QdI', self.sequence_number, self.timestamp, len(operation_type)),
+            operation_type,
+            self.table_name.encode(),
+            self.packed_data,
+        ))
+    
+    def _calculate_checksum(self) -> int:
         """计算日志条目的校验和"""
-        import hashlib
-        content = f"{self.sequence_number}{self.timestamp}{self.operation_type}{self.table_name}{json.dumps(self.data, sort_keys=True)}"
-        return hashlib.md5(content.encode()).hexdigest()
+        return _crc32(self._checksum_content())
+    
+    def digest(self) -> str:
+        """计算日志条目的128位抗碰撞摘要（用于审计，CRC32仅用于检测传输错误）"""
+        return _strong_digest(self._checksum_content())
 
-@dataclass
+@dataclass(**_RECORD_OPTIONS)
 class ReplicaInfo:
     """副本节点信息"""
     node_id: str
@@ -72,20 +218,165 @@ class ReplicaInfo:
     @property
     def is_healthy(self) -> bool:
         """检查节点是否健康"""
-        return (time.time() - self.last_heartbeat) < 30.0 and self.status == "active"
+        return self.is_healthy_at(time.time())
+    
+    def is_healthy_at(self, now: float) -> bool:
+        """以给定的当前时间检查节点是否健康（批量检查时复用同一时间）"""
+        return (now - self.last_heartbeat) < _HEARTBEAT_TIMEOUT and self.status == "active"
 
 class ReplicationGroup:
     """复制组"""
     
-    def __init__(self, group_id: str, consistency_level: ConsistencyLevel = ConsistencyLevel.EVENTUAL):
+    # 保留的复制日志条数，落后超过该范围的从节点需要全量同步
+    LOG_RING_CAPACITY = 10000
+    
+    def __init__(self, group_id: str, consistency_level: ConsistencyLevel = ConsistencyLevel.EVENTUAL,
+                 log_ring_capacity: int = LOG_RING_CAPACITY):
         self.group_id = group_id
         self.consistency_level = consistency_level
         self.replicas: Dict[str, ReplicaInfo] = {}
         self.master_id: Optional[str] = None
-        self.replication_logs: List[ReplicationLog] = []
+        # 定长环形缓冲保存最近的日志，并按序列号建立索引
+        self.replication_logs: deque = deque(maxlen=log_ring_capacity)
+        self._log_index: Dict[int, ReplicationLog] = {}
+        # 已被淘汰的最大序列号，之前的日志不再可用（序列号之间可能有空洞）
+        self._evicted_sequence = 0
         self.current_sequence = 0
+        # 成员变化通知（由复制管理器设置，用于唤醒心跳线程）
+        self.on_membership_change: Optional[Callable[[], None]] = None
+        # 副本和主节点的只读快照，在持锁修改成员后整体替换，读取方无需加锁
+        self._snapshot: Tuple[ReplicaInfo, ...] = ()
+        self._master_snapshot: Optional[ReplicaInfo] = None
+        # 健康从节点列表，在成员、角色或健康状态变化时重新计算
+        self._healthy_slaves: Tuple[ReplicaInfo, ...] = ()
+        # 健康检查的列式视图 (快照, 心跳时间, 是否active, 是否从节点, 节点位置)，副本较少时为None
+        self._health_view: Optional[tuple] = None
         self.lock = threading.RLock()
     
+    @property
+    def slave_count(self) -> int:
+        """非主节点的副本数量"""
+        return len(self.replicas) - (1 if self.master_id in self.replicas else 0)
+    
+    def _publish_snapshot(self):
+        """发布副本快照（调用方需持有锁）"""
+        self._snapshot = tuple(self.replicas.values())
+        self._master_snapshot = self.replicas.get(self.master_id) if self.master_id else None
+        self._build_health_view()
+        self._refresh_healthy_slaves(time.time())
+    
+    def _build_health_view(self):
+        """根据快照构建健康检查的列式视图（调用方需持有锁）"""
+        snapshot = self._snapshot
+        count = len(snapshot)
+        if np is None or count < _NUMPY_MIN_HEALTH_CHECK_REPLICAS:
+            self._health_view = None
+            return
+        
+        self._health_view = (
+            snapshot,
+            np.fromiter((replica.last_heartbeat for replica in snapshot), dtype=np.float64, count=count),
+            np.fromiter((replica.status == "active" for replica in snapshot), dtype=bool, count=count),
+            np.fromiter((replica.role == ReplicaRole.SLAVE for replica in snapshot), dtype=bool, count=count),
+            {replica.node_id: index for index, replica in enumerate(snapshot)},
+        )
+    
+    @staticmethod
+    def _healthy_mask(view: tuple, now: float):
+        """计算列式视图中健康副本的掩码"""
+        _, heartbeats, active, _, _ = view
+        return ((now - heartbeats) < _HEARTBEAT_TIMEOUT) & active
+    
+    def _refresh_healthy_slaves(self, now: float):
+        """重新计算健康从节点列表（调用方需持有锁）"""
+        view = self._health_view
+        if view is not None:
+            snapshot, _, _, slaves, _ = view
+            indices = np.flatnonzero(self._healthy_mask(view, now) & slaves)
+            self._healthy_slaves = tuple(snapshot[index] for index in indices)
+            return
+        
+        self._healthy_slaves = tuple(replica for replica in self._snapshot
+                                     if replica.role == ReplicaRole.SLAVE and replica.is_healthy_at(now))
+    
+    def get_unhealthy_replicas(self, now: float) -> List[ReplicaInfo]:
+        """获取不健康的副本"""
+        view = self._health_view
+        if view is not None:
+            snapshot = view[0]
+            return [snapshot[index] for index in np.flatnonzero(~self._healthy_mask(view, now))]
+        return [replica for replica in self._snapshot if not replica.is_healthy_at(now)]
+    
+    def record_heartbeat(self, node_id: str, timestamp: Optional[float] = None) -> bool:
+        """记录副本心跳（同时更新列式视图）"""
+        if timestamp is None:
+            timestamp = time.time()
+        with self.lock:
+            replica = self.replicas.get(node_id)
+            if replica is None:
+                return False
+            replica.last_heartbeat = timestamp
+            view = self._health_view
+            if view is not None and node_id in view[4]:
+                view[1][view[4][node_id]] = timestamp
+            return True
+    
+    def refresh_health(self, now: float):
+        """按给定时间刷新健康从节点列表（心跳检查时调用）"""
+        with self.lock:
+            self._refresh_healthy_slaves(now)
+    
+    def mark_failed(self, replica: ReplicaInfo):
+        """将副本标记为失效"""
+        with self.lock:
+            replica.status = "failed"
+            view = self._health_view
+            if view is not None and view[4].get(replica.node_id) is not None:
+                view[2][view[4][replica.node_id]] = False
+            self._refresh_healthy_slaves(time.time())
+    
+    def _notify_membership_change(self):
+        """通知成员变化"""
+        if self.on_membership_change is not None:
+            self.on_membership_change()
+    
+    def append_log(self, log_entry: ReplicationLog):
+        """追加复制日志，缓冲已满时淘汰最旧的条目"""
+        with self.lock:
+            logs = self.replication_logs
+            if len(logs) == logs.maxlen:
+                evicted = logs[0].sequence_number
+                del self._log_index[evicted]
+                self._evicted_sequence = evicted
+            logs.append(log_entry)
+            self._log_index[log_entry.sequence_number] = log_entry
+    
+    def get_log(self, sequence_number: int) -> Optional[ReplicationLog]:
+        """按序列号获取复制日志"""
+        return self._log_index.get(sequence_number)
+    
+    def get_logs_since(self, sequence_number: int) -> Optional[List[ReplicationLog]]:
+        """获取指定序列号之后的日志，已被淘汰时返回None表示需要全量同步"""
+        with self.lock:
+            if sequence_number >= self.current_sequence:
+                return []
+            if sequence_number < self._evicted_sequence:
+                return None
+            # 缓冲中的序列号递增但不一定连续，二分查找第一条更新的日志
+            logs = self.replication_logs
+            low, high = 0, len(logs)
+            while low < high:
+                mid = (low + high) // 2
+                if logs[mid].sequence_number <= sequence_number:
+                    low = mid + 1
+                else:
+                    high = mid
+            return [logs[i] for i in range(low, len(logs))]
+    
+    def needs_full_resync(self, replica: ReplicaInfo) -> bool:
+        """判断副本是否已落后于日志缓冲的范围"""
+        return replica.lag_sequence < self._evicted_sequence
+    
     def add_replica(self, replica: ReplicaInfo) -> bool:
         """添加副本节点"""
         with self.lock:
@@ -95,7 +386,9 @@ class ReplicationGroup:
                 self.master_id = replica.node_id
             
             self.replicas[replica.node_id] = replica
-            return True
+            self._publish_snapshot()
+        self._notify_membership_change()
+        return True
     
     def remove_replica(self, node_id: str) -> bool:
         """移除副本节点"""
@@ -109,50 +402,180 @@ class ReplicationGroup:
                 self._elect_new_master()
             
             del self.replicas[node_id]
-            return True
+            self._publish_snapshot()
+        self._notify_membership_change()
+        return True
     
     def get_master(self) -> Optional[ReplicaInfo]:
         """获取主节点"""
+        return self._master_snapshot
+    
+    def get_replicas(self) -> Tuple[ReplicaInfo, ...]:
+        """获取所有副本节点"""
+        return self._snapshot
+    
+    def get_slaves(self) -> Tuple[ReplicaInfo, ...]:
+        """获取健康的从节点列表"""
+        return self._healthy_slaves
+    
+    def _elect_new_master(self, now: Optional[float] = None):
+        """选举新的主节点"""
+        if now is None:
+            now = time.time()
         with self.lock:
-            if self.master_id and self.master_id in self.replicas:
-                return self.replicas[self.master_id]
-            return None
+            candidates = [replica for replica in self.replicas.values() 
+                         if replica.is_healthy_at(now) and replica.role != ReplicaRole.MASTER]
+            
+            if candidates:
+                # 按优先级和序列号选择
+                new_master = max(candidates, key=lambda r: (r.priority, -r.lag_sequence))
+                new_master.role = ReplicaRole.MASTER
+                self.master_id = new_master.node_id
+                
+                # 将其他候选者设为从节点
+                for replica in candidates:
+                    if replica.node_id != new_master.node_id:
+                        replica.role = ReplicaRole.SLAVE
+            
+            self._publish_snapshot()
+
+def _parse_endpoint(endpoint: str) -> Optional[Tuple[str, int]]:
+    """解析 host:port 形式的网络地址，无法解析时返回None"""
+    host, sep, port = endpoint.rpartition(':')
+    if not sep or not host or not port.isdigit():
+        return None
+    return host, int(port)
+
+class AsyncReplicationBackend:
+    """异步复制发送后端
     
-    def get_slaves(self) -> List[ReplicaInfo]:
-        """获取从节点列表"""
+    在独立线程中运行事件循环，发往各从节点的请求以协程并发执行，
+    并复用到每个从节点的持久TCP连接
+    """
+    
+    def __init__(self):
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._loop_thread: Optional[threading.Thread] = None
+        self._connections: Dict[str, asyncio.StreamWriter] = {}
+        self.lock = threading.Lock()
+    
+    def submit(self, coro) -> Future:
+        """提交协程到后端事件循环"""
+        return asyncio.run_coroutine_threadsafe(coro, self._get_event_loop())
+    
+    def _get_event_loop(self) -> asyncio.AbstractEventLoop:
+        """获取后端事件循环"""
         with self.lock:
-            return [replica for replica in self.replicas.values() 
-                   if replica.role == ReplicaRole.SLAVE and replica.is_healthy]
+            if self._loop is None:
+                self._loop = uvloop.new_event_loop() if uvloop is not None else asyncio.new_event_loop()
+                self._loop_thread = threading.Thread(
+                    target=self._loop.run_forever, name="replication-io-loop", daemon=True
+                )
+                self._loop_thread.start()
+            return self._loop
     
-    def _elect_new_master(self):
-        """选举新的主节点"""
-        candidates = [replica for replica in self.replicas.values() 
-                     if replica.is_healthy and replica.role != ReplicaRole.MASTER]
+    async def send(self, endpoint: str, payload: bytes):
+        """发送一批复制数据到指定节点"""
+        address = _parse_endpoint(endpoint)
+        if address is None:
+            # 非网络地址（如本地模拟节点），模拟网络延迟
+            await asyncio.sleep(0.01)
+            return
         
-        if candidates:
-            # 按优先级和序列号选择
-            new_master = max(candidates, key=lambda r: (r.priority, -r.lag_sequence))
-            new_master.role = ReplicaRole.MASTER
-            self.master_id = new_master.node_id
-            
-            # 将其他候选者设为从节点
-            for replica in candidates:
-                if replica.node_id != new_master.node_id:
-                    replica.role = ReplicaRole.SLAVE
+        for attempt in range(2):
+            writer, reused = await self._get_connection(endpoint, address)
+            try:
+                writer.write(payload)
+                await writer.drain()
+                return
+            except (ConnectionError, OSError):
+                # 连接失效时丢弃；复用的连接可能已被对端关闭，重新建立连接后重试一次
+                if self._connections.get(endpoint) is writer:
+                    del self._connections[endpoint]
+                writer.close()
+                if not reused or attempt:
+                    raise
+    
+    async def broadcast(self, endpoints: List[str], payload: bytes) -> List[str]:
+        """向多个节点并发发送同一数据，返回发送失败的地址"""
+        results = await asyncio.gather(*(self.send(endpoint, payload) for endpoint in endpoints),
+                                       return_exceptions=True)
+        return [endpoint for endpoint, result in zip(endpoints, results)
+                if isinstance(result, BaseException)]
+    
+    async def _get_connection(self, endpoint: str,
+                              address: Tuple[str, int]) -> Tuple[asyncio.StreamWriter, bool]:
+        """获取到节点的持久连接，返回 (连接, 是否为复用的已有连接)"""
+        writer = self._connections.get(endpoint)
+        if writer is not None and not writer.is_closing():
+            return writer, True
+        
+        _, writer = await asyncio.open_connection(*address)
+        existing = self._connections.get(endpoint)
+        if existing is not None and not existing.is_closing():
+            # 并发建立了连接，保留先建立的
+            writer.close()
+            return existing, True
+        self._connections[endpoint] = writer
+        return writer, False
+    
+    async def _drain_and_close(self, timeout: float):
+        """等待未完成的发送并关闭所有连接"""
+        current = asyncio.current_task()
+        pending = [task for task in asyncio.all_tasks() if task is not current]
+        if pending:
+            await asyncio.wait(pending, timeout=timeout)
+        for writer in self._connections.values():
+            writer.close()
+        self._connections.clear()
+    
+    def close(self, timeout: float = 5.0):
+        """关闭后端事件循环"""
+        with self.lock:
+            loop, thread = self._loop, self._loop_thread
+            self._loop = self._loop_thread = None
+        if loop is None:
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self._drain_and_close(timeout), loop).result(timeout + 1.0)
+        except Exception:
+            pass
+        loop.call_soon_threadsafe(loop.stop)
+        thread.join()
+        loop.close()
 
 class ReplicationManager:
     """复制管理器"""
     
-    def __init__(self, node_id: str, max_workers: int = 5):
+    # 心跳间隔上下限（秒），复制积压超过阈值时缩短间隔以尽早发现故障
+    HEARTBEAT_INTERVAL = 5.0
+    MIN_HEARTBEAT_INTERVAL = 1.0
+    HEARTBEAT_BACKLOG_THRESHOLD = 64
+    
+    def __init__(self, node_id: str, max_workers: int = 5,
+                 executor: Optional[ThreadPoolExecutor] = None,
+                 batch_flush_bytes: int = 16384, batch_flush_count: int = 64,
+                 batch_flush_ms: float = 5.0, snapshot_interval_ms: float = 10.0):
         self.node_id = node_id
         self.groups: Dict[str, ReplicationGroup] = {}
         self.replication_mode = ReplicationMode.ASYNC
         self.max_workers = max_workers
-        self.executor = ThreadPoolExecutor(max_workers=max_workers)
+        # 允许外部注入共享线程池，未注入时使用自有线程池
+        self._owns_executor = executor is None
+        self.executor = executor or ThreadPoolExecutor(max_workers=max_workers)
+        # 网络发送在异步后端中完成，线程池仅用于执行回调
+        self.backend = AsyncReplicationBackend()
         
         # 复制相关队列和线程
-        self.replication_queue = queue.Queue()
-        self.heartbeat_queue = queue.Queue()
+        # 多生产者单消费者队列：deque的append/popleft是原子操作，配合事件唤醒消费者
+        self.replication_queue: deque = deque()
+        self._replication_wakeup = threading.Event()
+        # 批量发送参数：单批最大字节数、最大条数和最长等待时间
+        self.batch_flush_bytes = batch_flush_bytes
+        self.batch_flush_count = batch_flush_count
+        self.batch_flush_ms = batch_flush_ms
+        # 快照复制模式的时间窗口
+        self.snapshot_interval_ms = snapshot_interval_ms
         
         # 回调函数
         self.data_change_callbacks: List[Callable] = []
@@ -162,13 +585,16 @@ class ReplicationManager:
         self.running = False
         self.replication_thread = None
         self.heartbeat_thread = None
+        self._heartbeat_wakeup = threading.Event()
+        self._current_hb_interval = self.HEARTBEAT_INTERVAL
         
-        self.lock = threading.RLock()
+        # 状态查询远多于成员变更，使用读写锁让查询并发执行
+        self.rwlock = RWLock()
         self.logger = logging.getLogger(__name__)
     
     def start(self):
         """启动复制管理器"""
-        with self.lock:
+        with self.rwlock.write_lock:
             if self.running:
                 return
             
@@ -183,11 +609,13 @@ class ReplicationManager:
     
     def stop(self):
         """停止复制管理器"""
-        with self.lock:
+        with self.rwlock.write_lock:
             if not self.running:
                 return
             
             self.running = False
+            self._replication_wakeup.set()
+            self._heartbeat_wakeup.set()
             
             # 等待线程结束
             if self.replication_thread:
@@ -195,24 +623,27 @@ class ReplicationManager:
             if self.heartbeat_thread:
                 self.heartbeat_thread.join(timeout=5.0)
             
-            self.executor.shutdown(wait=True)
+            self.backend.close()
+            if self._owns_executor:
+                self.executor.shutdown(wait=True)
             self.logger.info(f"Replication manager stopped for node {self.node_id}")
     
     def create_replication_group(self, group_id: str, 
                                 consistency_level: ConsistencyLevel = ConsistencyLevel.EVENTUAL) -> ReplicationGroup:
         """创建复制组"""
-        with self.lock:
+        with self.rwlock.write_lock:
             if group_id in self.groups:
                 raise ValueError(f"Replication group {group_id} already exists")
             
             group = ReplicationGroup(group_id, consistency_level)
+            group.on_membership_change = self._heartbeat_wakeup.set
             self.groups[group_id] = group
             return group
     
     def join_replication_group(self, group_id: str, role: ReplicaRole = ReplicaRole.SLAVE,
                               endpoint: str = "", priority: int = 1) -> bool:
         """加入复制组"""
-        with self.lock:
+        with self.rwlock.write_lock:
             if group_id not in self.groups:
                 return False
             
@@ -229,7 +660,7 @@ class ReplicationManager:
     
     def leave_replication_group(self, group_id: str) -> bool:
         """离开复制组"""
-        with self.lock:
+        with self.rwlock.write_lock:
             if group_id not in self.groups:
                 return False
             
@@ -245,7 +676,7 @@ class ReplicationManager:
                            table_name: str, data: Dict[str, Any], 
                            sql: Optional[str] = None) -> bool:
         """复制操作到其他节点"""
-        with self.lock:
+        with self.rwlock.write_lock:
             if group_id not in self.groups:
                 return False
             
@@ -255,22 +686,25 @@ class ReplicationManager:
             if not master or master.node_id != self.node_id:
                 return False  # 只有主节点可以发起复制
             
-            # 创建复制日志
-            group.current_sequence += 1
+            # 创建复制日志，构建成功后才提交序列号，避免序列化失败留下空洞
+            sequence_number = group.current_sequence + 1
             log_entry = ReplicationLog(
-                log_id=f"{group_id}_{group.current_sequence}",
-                sequence_number=group.current_sequence,
+                log_id=f"{group_id}_{sequence_number}",
+                sequence_number=sequence_number,
                 timestamp=time.time(),
                 operation_type=operation_type,
                 table_name=table_name,
                 data=data,
                 sql=sql
             )
+            group.current_sequence = sequence_number
             
-            group.replication_logs.append(log_entry)
+            group.append_log(log_entry)
             
             # 添加到复制队列
-            self.replication_queue.put((group_id, log_entry))
+            self.replication_queue.append((group_id, log_entry))
+            if not self._replication_wakeup.is_set():
+                self._replication_wakeup.set()
             
             return True
     
@@ -278,36 +712,78 @@ class ReplicationManager:
         """复制工作线程"""
         while self.running:
             try:
-                # 从队列获取复制任务
-                group_id, log_entry = self.replication_queue.get(timeout=1.0)
-                
-                if group_id not in self.groups:
-                    continue
+                # 从队列获取复制任务，并按组合并为批次
+                batches = self._drain_replication_queue()
                 
-                group = self.groups[group_id]
-                slaves = group.get_slaves()
+                for group_id, (log_entries, frames) in batches.items():
+                    group = self.groups.get(group_id)
+                    if group is None:
+                        continue
+                    
+                    slaves = group.get_slaves()
+                    if not slaves:
+                        continue
+                    
+                    payload = _frame_batch(b''.join(frames))
+                    if self.replication_mode == ReplicationMode.SYNC:
+                        self._sync_replicate(group_id, log_entries, payload, slaves)
+                    elif self.replication_mode == ReplicationMode.SEMI_SYNC:
+                        self._semi_sync_replicate(group_id, log_entries, payload, slaves)
+                    else:  # ASYNC / SNAPSHOT
+                        self._async_replicate(group_id, log_entries, payload, slaves)
                 
-                if not slaves:
-                    continue
-                
-                if self.replication_mode == ReplicationMode.SYNC:
-                    self._sync_replicate(group_id, log_entry, slaves)
-                elif self.replication_mode == ReplicationMode.SEMI_SYNC:
-                    self._semi_sync_replicate(group_id, log_entry, slaves)
-                else:  # ASYNC
-                    self._async_replicate(group_id, log_entry, slaves)
-                
-            except queue.Empty:
-                continue
             except Exception as e:
                 self.logger.error(f"Replication worker error: {e}")
     
-    def _sync_replicate(self, group_id: str, log_entry: ReplicationLog, slaves: List[ReplicaInfo]):
+    def _drain_replication_queue(self) -> Dict[str, Any]:
+        """取出一批复制任务，按组聚合为 (日志列表, 帧列表)"""
+        pending = self.replication_queue
+        wakeup = self._replication_wakeup
+        if not pending:
+            wakeup.wait(timeout=1.0)
+        
+        batches: Dict[str, Any] = {}
+        flush_count = 0
+        flush_bytes = 0
+        deadline = None
+        # 快照模式收集整个时间窗口内的日志，不受条数和字节上限限制
+        snapshot = self.replication_mode == ReplicationMode.SNAPSHOT
+        flush_ms = self.snapshot_interval_ms if snapshot else self.batch_flush_ms
+        
+        while True:
+            # 先清除信号再取数据，生产者在此之后追加的任务会重新置位
+            wakeup.clear()
+            while pending:
+                group_id, log_entry = pending.popleft()
+                frame = _frame_log_entry(log_entry)
+                log_entries, frames = batches.setdefault(group_id, ([], []))
+                log_entries.append(log_entry)
+                frames.append(frame)
+                flush_count += 1
+                flush_bytes += len(frame)
+                
+                # 达到条数或字节上限时立即发送
+                if not snapshot and (flush_count >= self.batch_flush_count or
+                                     flush_bytes >= self.batch_flush_bytes):
+                    return batches
+            
+            if not batches:
+                return batches
+            
+            # 等待超过刷新间隔时发送
+            if deadline is None:
+                deadline = time.monotonic() + flush_ms / 1000.0
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or not wakeup.wait(timeout=remaining):
+                return batches
+    
+    def _sync_replicate(self, group_id: str, log_entries: List[ReplicationLog],
+                        payload: bytes, slaves: List[ReplicaInfo]):
         """同步复制"""
         futures = []
         
         for slave in slaves:
-            future = self.executor.submit(self._replicate_to_slave, slave, log_entry)
+            future = self.backend.submit(self._replicate_batch_to_slave(slave, log_entries, payload))
             futures.append((future, slave))
         
         # 等待所有从节点完成
@@ -318,64 +794,86 @@ class ReplicationManager:
                 if success:
                     success_count += 1
                 else:
-                    self._handle_replication_failure(slave, log_entry)
+                    self._handle_replication_failure(slave, log_entries)
             except Exception as e:
                 self.logger.error(f"Sync replication to {slave.node_id} failed: {e}")
-                self._handle_replication_failure(slave, log_entry)
+                self._handle_replication_failure(slave, log_entries)
         
         # 强一致性要求所有节点都成功
         if self.groups[group_id].consistency_level == ConsistencyLevel.STRONG:
             if success_count < len(slaves):
                 self.logger.warning(f"Strong consistency violated: only {success_count}/{len(slaves)} replicas succeeded")
     
-    def _semi_sync_replicate(self, group_id: str, log_entry: ReplicationLog, slaves: List[ReplicaInfo]):
+    def _semi_sync_replicate(self, group_id: str, log_entries: List[ReplicationLog],
+                             payload: bytes, slaves: List[ReplicaInfo]):
         """半同步复制"""
         if not slaves:
             return
         
         # 半同步：等待至少一个从节点确认
-        futures = []
-        for slave in slaves:
-            future = self.executor.submit(self._replicate_to_slave, slave, log_entry)
-            futures.append((future, slave))
+        fut_to_slave = {
+            self.backend.submit(self._replicate_batch_to_slave(slave, log_entries, payload)): slave
+            for slave in slaves
+        }
         
         success_count = 0
         required_acks = max(1, len(slaves) // 2)  # 至少半数确认
+        pending = set(fut_to_slave)
         
-        for future, slave in as_completed([f for f, s in futures], timeout=5.0):
-            try:
-                success = future.result()
+        try:
+            for future in as_completed(fut_to_slave, timeout=5.0):
+                pending.discard(future)
+                slave = fut_to_slave[future]
+                try:
+                    success = future.result()
+                except Exception as e:
+                    self.logger.error(f"Semi-sync replication to {slave.node_id} failed: {e}")
+                    self._handle_replication_failure(slave, log_entries)
+                    continue
+                
                 if success:
                     success_count += 1
                     if success_count >= required_acks:
                         break  # 达到要求的确认数
                 else:
-                    self._handle_replication_failure(slave, log_entry)
-            except Exception as e:
-                self.logger.error(f"Semi-sync replication to {slave.node_id} failed: {e}")
-                self._handle_replication_failure(slave, log_entry)
+                    self._handle_replication_failure(slave, log_entries)
+        except FuturesTimeoutError:
+            self.logger.warning(f"Semi-sync replication timed out: only {success_count}/{required_acks} acks received")
+        
+        # 不再等待其余从节点，它们的发送在后台继续完成，失败时再处理
+        for future in pending:
+            future.add_done_callback(self._make_background_ack_handler(fut_to_slave[future], log_entries))
+    
+    def _make_background_ack_handler(self, slave: ReplicaInfo, log_entries: List[ReplicationLog]):
+        """创建处理后台复制结果的回调"""
+        def on_done(future: Future):
+            if future.cancelled():
+                return
+            if future.exception() is not None or not future.result():
+                # 回调在事件循环线程中执行，失败处理转交线程池
+                self.executor.submit(self._handle_replication_failure, slave, log_entries)
+        return on_done
     
-    def _async_replicate(self, group_id: str, log_entry: ReplicationLog, slaves: List[ReplicaInfo]):
+    def _async_replicate(self, group_id: str, log_entries: List[ReplicationLog],
+                         payload: bytes, slaves: List[ReplicaInfo]):
         """异步复制"""
         for slave in slaves:
-            self.executor.submit(self._replicate_to_slave_async, slave, log_entry)
+            self.backend.submit(self._replicate_batch_to_slave_async(slave, log_entries, payload))
     
-    def _replicate_to_slave(self, slave: ReplicaInfo, log_entry: ReplicationLog) -> bool:
-        """复制到单个从节点"""
+    async def _replicate_batch_to_slave(self, slave: ReplicaInfo, log_entries: List[ReplicationLog],
+                                        payload: bytes) -> bool:
+        """将一批日志以单次发送复制到从节点"""
         try:
-            # 这里应该实现实际的网络通信
-            # 模拟复制操作
-            time.sleep(0.01)  # 模拟网络延迟
+            await self.backend.send(slave.endpoint, payload)
             
             # 更新从节点的复制延迟
-            slave.lag_sequence = log_entry.sequence_number
+            slave.lag_sequence = log_entries[-1].sequence_number
             
-            # 触发数据变更回调
-            for callback in self.data_change_callbacks:
-                try:
-                    callback(slave.node_id, log_entry)
-                except Exception as e:
-                    self.logger.error(f"Data change callback error: {e}")
+            # 数据变更回调为同步函数，在线程池中执行以免阻塞事件循环
+            if self.data_change_callbacks:
+                await asyncio.get_running_loop().run_in_executor(
+                    self.executor, self._notify_data_change, slave, log_entries
+                )
             
             return True
             
@@ -383,107 +881,160 @@ class ReplicationManager:
             self.logger.error(f"Failed to replicate to {slave.node_id}: {e}")
             return False
     
-    def _replicate_to_slave_async(self, slave: ReplicaInfo, log_entry: ReplicationLog):
+    def _notify_data_change(self, slave: ReplicaInfo, log_entries: List[ReplicationLog]):
+        """触发数据变更回调"""
+        for log_entry in log_entries:
+            for callback in self.data_change_callbacks:
+                try:
+                    callback(slave.node_id, log_entry)
+                except Exception as e:
+                    self.logger.error(f"Data change callback error: {e}")
+    
+    async def _replicate_batch_to_slave_async(self, slave: ReplicaInfo, log_entries: List[ReplicationLog],
+                                              payload: bytes):
         """异步复制到从节点"""
-        success = self._replicate_to_slave(slave, log_entry)
+        success = await self._replicate_batch_to_slave(slave, log_entries, payload)
         if not success:
-            self._handle_replication_failure(slave, log_entry)
+            await asyncio.get_running_loop().run_in_executor(
+                self.executor, self._handle_replication_failure, slave, log_entries
+            )
     
-    def _handle_replication_failure(self, slave: ReplicaInfo, log_entry: ReplicationLog):
+    def _handle_replication_failure(self, slave: ReplicaInfo, log_entries: List[ReplicationLog]):
         """处理复制失败"""
-        slave.status = "failed"
+        for group in list(self.groups.values()):
+            if group.replicas.get(slave.node_id) is slave:
+                group.mark_failed(slave)
+                break
+        else:
+            slave.status = "failed"
         
         # 触发失败回调
-        for callback in self.failure_callbacks:
-            try:
-                callback(slave.node_id, log_entry)
-            except Exception as e:
-                self.logger.error(f"Failure callback error: {e}")
+        for log_entry in log_entries:
+            for callback in self.failure_callbacks:
+                try:
+                    callback(slave.node_id, log_entry)
+                except Exception as e:
+                    self.logger.error(f"Failure callback error: {e}")
     
     def _heartbeat_worker(self):
         """心跳工作线程"""
+        wakeup = self._heartbeat_wakeup
         while self.running:
             try:
-                self._send_heartbeats()
-                self._check_replica_health()
-                time.sleep(5.0)  # 每5秒发送心跳
+                if self._active_slave_count() == 0:
+                    # 没有从节点时挂起，直到有节点加入或管理器停止
+                    wakeup.wait()
+                    wakeup.clear()
+                    continue
+                
+                # 每轮只读取一次时间，发送心跳和健康检查共用
+                now = time.time()
+                self._send_heartbeats(now)
+                self._check_replica_health(now)
+                self._adjust_heartbeat_interval()
+                if wakeup.wait(timeout=self._current_hb_interval):
+                    wakeup.clear()
             except Exception as e:
                 self.logger.error(f"Heartbeat worker error: {e}")
     
-    def _send_heartbeats(self):
+    def _active_slave_count(self) -> int:
+        """所有复制组中的从节点总数"""
+        return sum(group.slave_count for group in list(self.groups.values()))
+    
+    def _adjust_heartbeat_interval(self):
+        """根据复制积压调整心跳间隔"""
+        if len(self.replication_queue) > self.HEARTBEAT_BACKLOG_THRESHOLD:
+            self._current_hb_interval = max(self.MIN_HEARTBEAT_INTERVAL, self._current_hb_interval / 2)
+        else:
+            self._current_hb_interval = min(self.HEARTBEAT_INTERVAL, self._current_hb_interval * 1.5)
+    
+    def _send_heartbeats(self, now: float):
         """发送心跳"""
-        current_time = time.time()
-        
+        endpoints = []
         for group in self.groups.values():
             master = group.get_master()
             if master and master.node_id == self.node_id:
-                # 主节点发送心跳给从节点
-                for slave in group.get_slaves():
-                    self.heartbeat_queue.put(("heartbeat", slave.node_id, current_time))
+                # 主节点发送心跳给从节点（仅限可连接的网络地址）
+                endpoints.extend(slave.endpoint for slave in group.get_slaves()
+                                 if _parse_endpoint(slave.endpoint) is not None)
+        
+        if endpoints:
+            # 所有心跳作为协程在后端事件循环中并发发送，不等待完成
+            future = self.backend.submit(self.backend.broadcast(endpoints, _frame_heartbeat(self.node_id, now)))
+            future.add_done_callback(self._log_heartbeat_failures)
+    
+    def _log_heartbeat_failures(self, future: Future):
+        """记录发送失败的心跳"""
+        try:
+            failed = future.result()
+        except Exception as e:
+            self.logger.error(f"Heartbeat broadcast error: {e}")
+            return
+        for endpoint in failed:
+            self.logger.debug(f"Heartbeat to {endpoint} failed")
     
-    def _check_replica_health(self):
+    def _check_replica_health(self, now: float):
         """检查副本健康状态"""
-        current_time = time.time()
-        
         for group in self.groups.values():
-            unhealthy_replicas = []
-            
-            for replica in group.replicas.values():
-                if not replica.is_healthy:
-                    unhealthy_replicas.append(replica)
-            
             # 处理不健康的副本
-            for replica in unhealthy_replicas:
+            for replica in group.get_unhealthy_replicas(now):
                 if replica.role == ReplicaRole.MASTER:
                     # 主节点故障，触发选主
-                    group._elect_new_master()
-                else:
+                    group._elect_new_master(now)
+                elif replica.status != "failed":
                     # 从节点故障，标记为失效
-                    replica.status = "failed"
+                    group.mark_failed(replica)
+            
+            group.refresh_health(now)
     
     def get_replication_status(self, group_id: str) -> Dict[str, Any]:
         """获取复制状态"""
-        with self.lock:
-            if group_id not in self.groups:
-                return {}
-            
-            group = self.groups[group_id]
-            master = group.get_master()
-            slaves = group.get_slaves()
-            
-            return {
-                'group_id': group_id,
-                'consistency_level': group.consistency_level.value,
-                'master': {
-                    'node_id': master.node_id,
-                    'endpoint': master.endpoint,
-                    'status': master.status
-                } if master else None,
-                'slaves': [
-                    {
-                        'node_id': slave.node_id,
-                        'endpoint': slave.endpoint,
-                        'status': slave.status,
-                        'lag_sequence': slave.lag_sequence,
-                        'last_heartbeat': slave.last_heartbeat
-                    } for slave in slaves
-                ],
-                'current_sequence': group.current_sequence,
-                'log_count': len(group.replication_logs),
-                'replication_mode': self.replication_mode.value
-            }
+        with self.rwlock.read_lock:
+            return self._group_status(group_id)
+    
+    def _group_status(self, group_id: str) -> Dict[str, Any]:
+        """构建复制组状态（调用方需持有读锁，读锁不可重入）"""
+        if group_id not in self.groups:
+            return {}
+        
+        group = self.groups[group_id]
+        master = group.get_master()
+        slaves = group.get_slaves()
+        
+        return {
+            'group_id': group_id,
+            'consistency_level': group.consistency_level.value,
+            'master': {
+                'node_id': master.node_id,
+                'endpoint': master.endpoint,
+                'status': master.status
+            } if master else None,
+            'slaves': [
+                {
+                    'node_id': slave.node_id,
+                    'endpoint': slave.endpoint,
+                    'status': slave.status,
+                    'lag_sequence': slave.lag_sequence,
+                    'last_heartbeat': slave.last_heartbeat,
+                    'needs_full_resync': group.needs_full_resync(slave)
+                } for slave in slaves
+            ],
+            'current_sequence': group.current_sequence,
+            'log_count': len(group.replication_logs),
+            'replication_mode': self.replication_mode.value
+        }
     
     def get_all_groups_status(self) -> Dict[str, Any]:
         """获取所有复制组状态"""
-        with self.lock:
+        with self.rwlock.read_lock:
             return {
-                group_id: self.get_replication_status(group_id)
+                group_id: self._group_status(group_id)
                 for group_id in self.groups.keys()
             }
     
     def set_replication_mode(self, mode: ReplicationMode):
         """设置复制模式"""
-        with self.lock:
+        with self.rwlock.write_lock:
             self.replication_mode = mode
             self.logger.info(f"Replication mode changed to {mode.value}")
     
@@ -497,7 +1048,7 @@ class ReplicationManager:
     
     def get_statistics(self) -> Dict[str, Any]:
         """获取统计信息"""
-        with self.lock:
+        with self.rwlock.read_lock:
             total_replicas = sum(len(group.replicas) for group in self.groups.values())
             total_logs = sum(len(group.replication_logs) for group in self.groups.values())
             
@@ -507,10 +1058,13 @@ class ReplicationManager:
                 'total_replicas': total_replicas,
                 'total_logs': total_logs,
                 'replication_mode': self.replication_mode.value,
-                'queue_size': self.replication_queue.qsize(),
+                'queue_size': len(self.replication_queue),
                 'running': self.running
             }
 
+# 以写操作关键字开头的语句
+_WRITE_OPERATION_RE = re.compile(r'\s*(?:INSERT|UPDATE|DELETE|CREATE|DROP|ALTER)\b', re.IGNORECASE)
+
 class ReadWriteSeparator:
     """读写分离器"""
     
@@ -522,28 +1076,25 @@ class ReadWriteSeparator:
     
     def route_query(self, group_id: str, sql: str, is_write_operation: bool = None) -> Optional[str]:
         """路由查询到合适的节点"""
-        with self.lock:
-            if group_id not in self.replication_manager.groups:
-                return None
-            
-            group = self.replication_manager.groups[group_id]
-            
-            if is_write_operation is None:
-                is_write_operation = self._is_write_operation(sql)
-            
-            if is_write_operation:
-                # 写操作只能路由到主节点
-                master = group.get_master()
-                return master.node_id if master else None
-            else:
-                # 读操作根据策略路由
-                return self._route_read_query(group)
+        # 只读取副本快照，无需加锁
+        group = self.replication_manager.groups.get(group_id)
+        if group is None:
+            return None
+        
+        if is_write_operation is None:
+            is_write_operation = self._is_write_operation(sql)
+        
+        if is_write_operation:
+            # 写操作只能路由到主节点
+            master = group.get_master()
+            return master.node_id if master else None
+        else:
+            # 读操作根据策略路由
+            return self._route_read_query(group)
     
     def _is_write_operation(self, sql: str) -> bool:
         """判断是否为写操作"""
-        sql_upper = sql.strip().upper()
-        write_keywords = ['INSERT', 'UPDATE', 'DELETE', 'CREATE', 'DROP', 'ALTER']
-        return any(sql_upper.startswith(keyword) for keyword in write_keywords)
+        return _WRITE_OPERATION_RE.match(sql) is not None
     
     def _route_read_query(self, group: ReplicationGroup) -> Optional[str]:
         """路由读查询"""
@@ -553,14 +1104,15 @@ class ReadWriteSeparator:
         if self.read_preference == "master_only":
             return master.node_id if master else None
         
+        # 按复制组轮询，成员变化不影响轮询序列
         elif self.read_preference == "slave_only":
             if slaves:
-                return self.load_balancer.select_node([s.node_id for s in slaves])
+                return self.load_balancer.select_node(tuple(s.node_id for s in slaves), group.group_id)
             return None
         
         else:  # slave_first
             if slaves:
-                return self.load_balancer.select_node([s.node_id for s in slaves])
+                return self.load_balancer.select_node(tuple(s.node_id for s in slaves), group.group_id)
             return master.node_id if master else None
     
     def set_read_preference(self, preference: str):
@@ -574,21 +1126,19 @@ class RoundRobinLoadBalancer:
     """轮询负载均衡器"""
     
     def __init__(self):
-        self.counters: Dict[str, int] = {}
-        self.lock = threading.RLock()
+        self.counters: Dict[Hashable, Iterator[int]] = {}
+        self.lock = threading.Lock()
     
-    def select_node(self, nodes: List[str]) -> Optional[str]:
-        """选择节点"""
+    def select_node(self, nodes: Tuple[str, ...], key: Hashable = None) -> Optional[str]:
+        """选择节点，key标识轮询序列（默认为节点元组本身）"""
         if not nodes:
             return None
         
-        with self.lock:
-            nodes_key = "|".join(sorted(nodes))
-            
-            if nodes_key not in self.counters:
-                self.counters[nodes_key] = 0
-            
-            selected_index = self.counters[nodes_key] % len(nodes)
-            self.counters[nodes_key] = (self.counters[nodes_key] + 1) % len(nodes)
-            
-            return nodes[selected_index]
+        if key is None:
+            key = nodes
+        counter = self.counters.get(key)
+        if counter is None:
+            with self.lock:
+                counter = self.counters.setdefault(key, itertools.count())
+        
+        return nodes[next(counter) % len(nodes)]
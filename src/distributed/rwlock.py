@@ -0,0 +1,93 @@
+"""
+读写锁模块
+
+为读多写少的分布式组件提供读写锁，允许多个读者并发访问共享状态
+"""
+
+import threading
+
+
+class _LockGuard:
+    """锁守卫，支持with语句"""
+
+    __slots__ = ('_acquire', '_release')
+
+    def __init__(self, acquire, release):
+        self._acquire = acquire
+        self._release = release
+
+    def __enter__(self):
+        self._acquire()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self._release()
+        return False
+
+
+class RWLock:
+    """读写锁（写者优先）
+
+    - 多个读者可以同时持有读锁
+    - 写锁可被同一线程重入，持有写锁的线程也可以再获取读锁
+    - 读锁不可重入，也不支持读锁升级为写锁
+
+    用法:
+        with rwlock.read_lock:
+            ...
+        with rwlock.write_lock:
+            ...
+    """
+
+    def __init__(self):
+        self._cond = threading.Condition(threading.Lock())
+        self._readers = 0
+        self._writer: int = None  # 持有写锁的线程ID
+        self._write_depth = 0
+        self._waiting_writers = 0
+
+        self.read_lock = _LockGuard(self.acquire_read, self.release_read)
+        self.write_lock = _LockGuard(self.acquire_write, self.release_write)
+
+    def acquire_read(self):
+        """获取读锁"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer != me:
+                # 有写者持有或等待时阻塞，避免写者饥饿
+                while self._writer is not None or self._waiting_writers:
+                    self._cond.wait()
+            self._readers += 1
+
+    def release_read(self):
+        """释放读锁"""
+        with self._cond:
+            self._readers -= 1
+            if self._readers == 0:
+                self._cond.notify_all()
+
+    def acquire_write(self):
+        """获取写锁"""
+        me = threading.get_ident()
+        with self._cond:
+            if self._writer == me:
+                self._write_depth += 1
+                return
+
+            self._waiting_writers += 1
+            try:
+                while self._writer is not None or self._readers:
+                    self._cond.wait()
+            finally:
+                self._waiting_writers -= 1
+
+            self._writer = me
+            self._write_depth = 1
+
+    def release_write(self):
+        """释放写锁"""
+        with self._cond:
+            self._write_depth -= 1
+            if self._write_depth == 0:
+                self._writer = None
+                self._cond.notify_all()
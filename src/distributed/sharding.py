@@ -6,12 +6,25 @@
 
 import hashlib
 import json
+import struct
 import threading
 from abc import ABC, abstractmethod
-from typing import Dict, List, Any, Optional, Tuple
+from typing import Dict, List, Any, Optional, Tuple, Mapping, Sequence
 from enum import Enum
-from dataclasses import dataclass, asdict
+from dataclasses import dataclass, field, asdict, replace
 import time
+from collections import OrderedDict
+from bisect import bisect_left, bisect_right
+from functools import lru_cache
+from types import MappingProxyType
+
+try:
+    import xxhash
+except ImportError:  # xxhash为可选依赖，仅在选择xxh3哈希函数时需要
+    xxhash = None
+
+# 读取MD5摘要的低32位（与 int(hexdigest, 16) % 2**32 结果相同）
+_unpack_low32 = struct.Struct('>I').unpack_from
 
 class ShardingType(Enum):
     """分片类型枚举"""
@@ -46,21 +59,105 @@ class ShardMetadata:
     shards: List[ShardInfo]
     total_shards: int
     created_time: float = None
+    # 哈希区间查找索引 (按起点排序的min_hash列表, max_hash列表, shard_id列表)
+    # 元数据发布后不再原地修改，变更时会重建ShardMetadata，索引随之重新构建
+    _hash_index: Optional[Tuple[List[int], List[int], List[str]]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # 键范围查找索引，结构同上；范围重叠或键不可比较时为空元组，表示只能逐个扫描
+    _range_index: Optional[Tuple] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    # 活跃分片及其ID（按元数据中的顺序）
+    _active_shards: Optional[Tuple[ShardInfo, ...]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
+    _active_shard_ids: Optional[Tuple[str, ...]] = field(
+        default=None, init=False, repr=False, compare=False
+    )
     
     def __post_init__(self):
         if self.created_time is None:
             self.created_time = time.time()
+    
+    @property
+    def active_shards(self) -> Tuple[ShardInfo, ...]:
+        """活跃分片（惰性构建）"""
+        active = self._active_shards
+        if active is None:
+            active = self._active_shards = tuple(
+                shard for shard in self.shards if shard.status == "active"
+            )
+        return active
+    
+    @property
+    def active_shard_ids(self) -> Tuple[str, ...]:
+        """活跃分片ID（惰性构建）"""
+        active_ids = self._active_shard_ids
+        if active_ids is None:
+            active_ids = self._active_shard_ids = tuple(shard.shard_id for shard in self.active_shards)
+        return active_ids
+    
+    @property
+    def hash_index(self) -> Tuple[List[int], List[int], List[str]]:
+        """活跃分片的哈希区间索引（惰性构建）"""
+        index = self._hash_index
+        if index is None:
+            ranged = sorted(
+                (shard.hash_range[0], shard.hash_range[1], shard.shard_id)
+                for shard in self.active_shards
+                if shard.hash_range
+            )
+            index = self._hash_index = (
+                [min_hash for min_hash, _, _ in ranged],
+                [max_hash for _, max_hash, _ in ranged],
+                [shard_id for _, _, shard_id in ranged],
+            )
+        return index
+    
+    @property
+    def range_index(self) -> Tuple:
+        """活跃分片的键范围索引（惰性构建），不可用时为空元组"""
+        index = self._range_index
+        if index is None:
+            index = self._range_index = self._build_range_index()
+        return index
+    
+    def _build_range_index(self) -> Tuple:
+        """按范围起点排序活跃分片，要求范围两两不相交"""
+        ranged = [
+            (shard.key_range[0], shard.key_range[1], shard.shard_id)
+            for shard in self.active_shards
+            if shard.key_range
+        ]
+        try:
+            # 空范围不会命中任何键，不进入索引
+            ranged = [item for item in ranged if item[0] < item[1]]
+            ranged.sort(key=lambda item: item[0])
+            for (_, prev_max, _), (next_min, _, _) in zip(ranged, ranged[1:]):
+                if prev_max > next_min:
+                    return ()
+        except TypeError:
+            return ()
+        return (
+            [min_val for min_val, _, _ in ranged],
+            [max_val for _, max_val, _ in ranged],
+            [shard_id for _, _, shard_id in ranged],
+        )
 
 class ShardingStrategy(ABC):
     """分片策略抽象基类"""
     
+    # determine_shard的结果是否只取决于键值和元数据（可按元数据版本缓存）
+    CACHEABLE = True
+    
     @abstractmethod
     def determine_shard(self, shard_key_value: Any, metadata: ShardMetadata) -> str:
         """确定数据应该存储在哪个分片"""
         pass
     
     @abstractmethod
-    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> List[str]:
+    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> Sequence[str]:
         """根据查询条件确定需要查询的分片"""
         pass
 
@@ -69,32 +166,46 @@ class RangeShardingStrategy(ShardingStrategy):
     
     def determine_shard(self, shard_key_value: Any, metadata: ShardMetadata) -> str:
         """根据范围确定分片"""
-        for shard in metadata.shards:
-            if shard.key_range and shard.status == "active":
-                min_val, max_val = shard.key_range
-                if min_val <= shard_key_value < max_val:
-                    return shard.shard_id
+        index = metadata.range_index
+        if index:
+            shard_id = self._find_range_shard(shard_key_value, index)
+            if shard_id is not None:
+                return shard_id
+        else:
+            for shard in metadata.active_shards:
+                if shard.key_range:
+                    min_val, max_val = shard.key_range
+                    if min_val <= shard_key_value < max_val:
+                        return shard.shard_id
         
         # 如果没有找到合适的分片，返回第一个活跃分片
-        for shard in metadata.shards:
-            if shard.status == "active":
-                return shard.shard_id
+        active_shard_ids = metadata.active_shard_ids
+        if active_shard_ids:
+            return active_shard_ids[0]
         
         raise ValueError(f"No active shard found for key value: {shard_key_value}")
     
-    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> List[str]:
+    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> Sequence[str]:
         """根据范围条件确定查询分片"""
         shard_key = metadata.shard_key
         
         if shard_key not in conditions:
             # 如果查询条件中没有分片键，需要查询所有分片
-            return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+            return metadata.active_shard_ids
         
         condition = conditions[shard_key]
-        target_shards = []
+        index = metadata.range_index
+        if index:
+            if isinstance(condition, dict):
+                target_shards = self._slice_range_shards(condition, index)
+            else:
+                shard_id = self._find_range_shard(condition, index)
+                target_shards = [shard_id] if shard_id is not None else []
+            return target_shards if target_shards else metadata.active_shard_ids
         
-        for shard in metadata.shards:
-            if shard.status != "active" or not shard.key_range:
+        target_shards = []
+        for shard in metadata.active_shards:
+            if not shard.key_range:
                 continue
                 
             min_val, max_val = shard.key_range
@@ -109,7 +220,32 @@ class RangeShardingStrategy(ShardingStrategy):
                 if min_val <= condition < max_val:
                     target_shards.append(shard.shard_id)
         
-        return target_shards if target_shards else [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+        return target_shards if target_shards else metadata.active_shard_ids
+    
+    @staticmethod
+    def _find_range_shard(shard_key_value: Any, index: Tuple) -> Optional[str]:
+        """在键范围索引上二分查找包含该键的分片"""
+        min_vals, max_vals, shard_ids = index
+        i = bisect_right(min_vals, shard_key_value) - 1
+        if i >= 0 and shard_key_value < max_vals[i]:
+            return shard_ids[i]
+        return None
+    
+    @staticmethod
+    def _slice_range_shards(condition: Dict[str, Any], index: Tuple) -> List[str]:
+        """范围条件命中的分片在索引中是连续的一段，二分确定其边界"""
+        min_vals, max_vals, shard_ids = index
+        # 范围互不相交，max_vals同样有序
+        start, end = 0, len(shard_ids)
+        for op, value in condition.items():
+            if op == '>' or op == '>=':
+                start = max(start, bisect_right(max_vals, value))
+            elif op == '<':
+                end = min(end, bisect_left(min_vals, value))
+            elif op == '<=':
+                # 起点等于上界的分片同样命中
+                end = min(end, bisect_right(min_vals, value))
+        return shard_ids[start:end]
     
     def _range_overlaps(self, condition: Dict[str, Any], min_val: Any, max_val: Any) -> bool:
         """检查范围条件是否与分片范围重叠"""
@@ -118,122 +254,166 @@ class RangeShardingStrategy(ShardingStrategy):
             if op == '>' or op == '>=':
                 if value >= max_val:
                     return False
-            elif op == '<' or op == '<=':
+            elif op == '<':
                 if value <= min_val:
                     return False
+            elif op == '<=':
+                if value < min_val:
+                    return False
         return True
 
 class HashShardingStrategy(ShardingStrategy):
     """哈希分片策略"""
     
     def __init__(self, hash_function: str = "md5"):
+        if hash_function == "xxh3" and xxhash is None:
+            raise ValueError("Hash function xxh3 requires the xxhash package")
         self.hash_function = hash_function
     
     def determine_shard(self, shard_key_value: Any, metadata: ShardMetadata) -> str:
         """根据哈希值确定分片"""
         hash_value = self._hash_key(shard_key_value)
         
-        for shard in metadata.shards:
-            if shard.hash_range and shard.status == "active":
-                min_hash, max_hash = shard.hash_range
-                if min_hash <= hash_value < max_hash:
-                    return shard.shard_id
+        # 在按起点排序的哈希区间上二分查找
+        min_hashes, max_hashes, shard_ids = metadata.hash_index
+        index = bisect_right(min_hashes, hash_value) - 1
+        if index >= 0 and hash_value < max_hashes[index]:
+            return shard_ids[index]
         
         # 如果没有找到合适的分片，使用模运算
-        active_shards = [s for s in metadata.shards if s.status == "active"]
-        if active_shards:
-            shard_index = hash_value % len(active_shards)
-            return active_shards[shard_index].shard_id
+        active_shard_ids = metadata.active_shard_ids
+        if active_shard_ids:
+            return active_shard_ids[hash_value % len(active_shard_ids)]
         
         raise ValueError(f"No active shard found for key value: {shard_key_value}")
     
-    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> List[str]:
+    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> Sequence[str]:
         """哈希分片的查询分片确定"""
         shard_key = metadata.shard_key
         
         if shard_key not in conditions:
             # 没有分片键条件，需要查询所有分片
-            return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+            return metadata.active_shard_ids
         
         condition = conditions[shard_key]
         
         if isinstance(condition, dict):
             # 范围查询在哈希分片中需要查询所有分片
-            return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+            return metadata.active_shard_ids
         else:
             # 等值查询可以精确定位到一个分片
             try:
                 target_shard = self.determine_shard(condition, metadata)
                 return [target_shard]
             except ValueError:
-                return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+                return metadata.active_shard_ids
     
     def _hash_key(self, key_value: Any) -> int:
         """计算键值的哈希值"""
-        key_str = str(key_value)
+        # 所有键按字符串形式哈希，保证整数与其字符串字面量落在同一分片
+        key_bytes = key_value.encode() if isinstance(key_value, str) else str(key_value).encode()
         if self.hash_function == "md5":
-            return int(hashlib.md5(key_str.encode()).hexdigest(), 16) % (2**32)
+            return _unpack_low32(hashlib.md5(key_bytes).digest(), 12)[0]
+        elif self.hash_function == "xxh3":
+            return xxhash.xxh3_64_intdigest(key_bytes) & 0xFFFFFFFF
         else:
-            return hash(key_str) % (2**32)
+            return hash(key_bytes) % (2**32)
 
 class DirectoryShardingStrategy(ShardingStrategy):
     """目录分片策略"""
     
-    def __init__(self):
-        self.directory: Dict[Any, str] = {}
+    # 首次出现的键会写入目录，不缓存查找结果
+    CACHEABLE = False
+    
+    DIRECTORY_SIZE = 1_000_000
+    
+    def __init__(self, max_entries: int = DIRECTORY_SIZE):
+        # 有界LRU目录：键值 -> 分片ID，超出容量时淘汰最久未使用的映射
+        self.directory: "OrderedDict[Any, str]" = OrderedDict()
+        self.max_entries = max_entries
+        self.directory_lock = threading.Lock()
+    
+    def _lookup(self, shard_key_value: Any) -> Optional[str]:
+        """无锁查询目录映射"""
+        shard_id = self.directory.get(shard_key_value)
+        # 更新LRU顺序只是尽力而为，锁被占用时跳过，命中路径不等待
+        if shard_id is not None and self.directory_lock.acquire(blocking=False):
+            try:
+                if shard_key_value in self.directory:
+                    self.directory.move_to_end(shard_key_value)
+            finally:
+                self.directory_lock.release()
+        return shard_id
     
     def determine_shard(self, shard_key_value: Any, metadata: ShardMetadata) -> str:
         """根据目录映射确定分片"""
-        if shard_key_value in self.directory:
-            return self.directory[shard_key_value]
+        shard_id = self._lookup(shard_key_value)
+        if shard_id is not None:
+            return shard_id
         
         # 如果目录中没有映射，选择负载最轻的分片
-        active_shards = [s for s in metadata.shards if s.status == "active"]
-        if active_shards:
-            # 简单地选择第一个活跃分片
-            selected_shard = active_shards[0].shard_id
-            self.directory[shard_key_value] = selected_shard
-            return selected_shard
+        active_shard_ids = metadata.active_shard_ids
+        if active_shard_ids:
+            with self.directory_lock:
+                # 加锁后再次检查，并发插入同一新键时以先写入的映射为准
+                shard_id = self.directory.get(shard_key_value)
+                if shard_id is not None:
+                    return shard_id
+                
+                # 简单地选择第一个活跃分片
+                selected_shard = active_shard_ids[0]
+                self.directory[shard_key_value] = selected_shard
+                if len(self.directory) > self.max_entries:
+                    self.directory.popitem(last=False)
+                return selected_shard
         
         raise ValueError(f"No active shard found for key value: {shard_key_value}")
     
-    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> List[str]:
+    def get_query_shards(self, conditions: Dict[str, Any], metadata: ShardMetadata) -> Sequence[str]:
         """根据目录映射确定查询分片"""
         shard_key = metadata.shard_key
         
         if shard_key not in conditions:
-            return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+            return metadata.active_shard_ids
         
         condition = conditions[shard_key]
         
         if isinstance(condition, dict):
             # 范围查询需要查询所有可能的分片
-            return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+            return metadata.active_shard_ids
         else:
             # 等值查询
-            if condition in self.directory:
-                return [self.directory[condition]]
+            shard_id = self._lookup(condition)
+            if shard_id is not None:
+                return [shard_id]
             else:
-                return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+                return metadata.active_shard_ids
 
 class ShardManager:
     """分片管理器"""
     
-    def __init__(self):
-        self.metadata_store: Dict[str, ShardMetadata] = {}
+    INSERT_SHARD_CACHE_SIZE = 8192
+    
+    def __init__(self, hash_function: str = "md5"):
+        # 元数据快照：只读映射，写者复制后整体替换，读者无需加锁
+        self._metadata_snapshot: Mapping[str, ShardMetadata] = MappingProxyType({})
         self.strategies: Dict[ShardingType, ShardingStrategy] = {
             ShardingType.RANGE: RangeShardingStrategy(),
-            ShardingType.HASH: HashShardingStrategy(),
+            ShardingType.HASH: HashShardingStrategy(hash_function),
             ShardingType.DIRECTORY: DirectoryShardingStrategy()
         }
-        self.lock = threading.RLock()
+        # 元数据版本号，任何分片元数据变更都会递增，用于使上层缓存失效
+        self.epoch = 0
+        self._write_lock = threading.Lock()
+        # 按 (表名, 键类型, 键值, 元数据版本) 缓存插入分片查找结果
+        self._cached_insert_shard = lru_cache(maxsize=self.INSERT_SHARD_CACHE_SIZE)(self._lookup_insert_shard)
     
     def create_sharded_table(self, table_name: str, shard_key: str, 
                            shard_type: ShardingType, shard_count: int,
                            nodes: List[str]) -> ShardMetadata:
         """创建分片表"""
-        with self.lock:
-            if table_name in self.metadata_store:
+        with self._write_lock:
+            if table_name in self._metadata_snapshot:
                 raise ValueError(f"Sharded table {table_name} already exists")
             
             shards = []
@@ -290,91 +470,148 @@ class ShardManager:
                 total_shards=shard_count
             )
             
-            self.metadata_store[table_name] = metadata
+            self._publish({**self._metadata_snapshot, table_name: metadata})
             return metadata
     
+    def _publish(self, store: Dict[str, ShardMetadata]):
+        """发布新的元数据快照（调用方需持有写锁）"""
+        # 先发布快照再递增版本号，读到新版本号的读者一定能看到新快照
+        self._metadata_snapshot = MappingProxyType(store)
+        self.epoch += 1
+    
+    def _replace_table(self, metadata: ShardMetadata, shards: List[ShardInfo], total_shards: int):
+        """以新的分片列表重建表元数据并发布（调用方需持有写锁）"""
+        new_metadata = replace(metadata, shards=shards, total_shards=total_shards)
+        self._publish({**self._metadata_snapshot, metadata.table_name: new_metadata})
+    
     def get_shard_for_insert(self, table_name: str, data: Dict[str, Any]) -> str:
         """获取插入数据应该使用的分片"""
-        with self.lock:
-            if table_name not in self.metadata_store:
-                raise ValueError(f"Table {table_name} is not sharded")
-            
-            metadata = self.metadata_store[table_name]
-            shard_key_value = data.get(metadata.shard_key)
-            
+        metadata = self._metadata_snapshot.get(table_name)
+        if metadata is None:
+            raise ValueError(f"Table {table_name} is not sharded")
+        
+        shard_key_value = data.get(metadata.shard_key)
+        
+        if shard_key_value is None:
+            raise ValueError(f"Shard key {metadata.shard_key} not found in data")
+        
+        return self._determine_insert_shard(metadata, shard_key_value)
+    
+    def get_shards_for_insert_batch(self, table_name: str,
+                                    rows: List[Dict[str, Any]]) -> List[Optional[str]]:
+        """批量获取插入数据应该使用的分片，无法确定分片的记录对应None"""
+        metadata = self._metadata_snapshot.get(table_name)
+        if metadata is None:
+            raise ValueError(f"Table {table_name} is not sharded")
+        
+        shard_key = metadata.shard_key
+        determine = self._determine_insert_shard
+        shard_ids = []
+        for row in rows:
+            shard_key_value = row.get(shard_key)
             if shard_key_value is None:
-                raise ValueError(f"Shard key {metadata.shard_key} not found in data")
-            
-            strategy = self.strategies[metadata.shard_type]
-            return strategy.determine_shard(shard_key_value, metadata)
+                shard_ids.append(None)
+                continue
+            try:
+                shard_ids.append(determine(metadata, shard_key_value))
+            except ValueError:
+                shard_ids.append(None)
+        return shard_ids
     
-    def get_shards_for_query(self, table_name: str, conditions: Dict[str, Any]) -> List[str]:
+    def _determine_insert_shard(self, metadata: ShardMetadata, shard_key_value: Any) -> str:
+        """确定键值所在分片"""
+        strategy = self.strategies[metadata.shard_type]
+        if strategy.CACHEABLE:
+            try:
+                # 键类型参与缓存键，避免 1 / 1.0 / True 共用同一条目
+                return self._cached_insert_shard(
+                    metadata.table_name, type(shard_key_value), shard_key_value, self.epoch
+                )
+            except TypeError:
+                pass  # 不可哈希的键值，直接计算
+        return strategy.determine_shard(shard_key_value, metadata)
+    
+    def _lookup_insert_shard(self, table_name: str, key_type: type,
+                             shard_key_value: Any, epoch: int) -> str:
+        """计算键值所在分片（结果按元数据版本缓存）"""
+        metadata = self._metadata_snapshot[table_name]
+        return self.strategies[metadata.shard_type].determine_shard(shard_key_value, metadata)
+    
+    def get_shards_for_query(self, table_name: str, conditions: Dict[str, Any]) -> Sequence[str]:
         """获取查询需要访问的分片列表"""
-        with self.lock:
-            if table_name not in self.metadata_store:
-                # 非分片表，返回空列表表示查询本地
-                return []
-            
-            metadata = self.metadata_store[table_name]
-            strategy = self.strategies[metadata.shard_type]
-            return strategy.get_query_shards(conditions, metadata)
+        metadata = self._metadata_snapshot.get(table_name)
+        if metadata is None:
+            # 非分片表，返回空列表表示查询本地
+            return []
+        
+        strategy = self.strategies[metadata.shard_type]
+        return strategy.get_query_shards(conditions, metadata)
     
-    def get_all_shards(self, table_name: str) -> List[str]:
+    def get_all_shards(self, table_name: str) -> Sequence[str]:
         """获取表的所有活跃分片"""
-        with self.lock:
-            if table_name not in self.metadata_store:
-                return []
-            
-            metadata = self.metadata_store[table_name]
-            return [shard.shard_id for shard in metadata.shards if shard.status == "active"]
+        metadata = self._metadata_snapshot.get(table_name)
+        if metadata is None:
+            return ()
+        
+        return metadata.active_shard_ids
     
     def get_shard_info(self, shard_id: str) -> Optional[ShardInfo]:
         """获取分片信息"""
-        with self.lock:
-            for metadata in self.metadata_store.values():
-                for shard in metadata.shards:
-                    if shard.shard_id == shard_id:
-                        return shard
-            return None
+        for metadata in self._metadata_snapshot.values():
+            for shard in metadata.shards:
+                if shard.shard_id == shard_id:
+                    return shard
+        return None
+    
+    def get_shard_infos(self, shard_ids: List[str]) -> Dict[str, ShardInfo]:
+        """批量获取分片信息（一次遍历元数据）"""
+        wanted = set(shard_ids)
+        return {
+            shard.shard_id: shard
+            for metadata in self._metadata_snapshot.values()
+            for shard in metadata.shards
+            if shard.shard_id in wanted
+        }
     
     def get_table_metadata(self, table_name: str) -> Optional[ShardMetadata]:
         """获取表的分片元数据"""
-        with self.lock:
-            return self.metadata_store.get(table_name)
+        return self._metadata_snapshot.get(table_name)
     
     def update_shard_range(self, table_name: str, shard_id: str, 
                           key_range: Tuple[Any, Any]) -> bool:
         """更新范围分片的键范围"""
-        with self.lock:
-            if table_name not in self.metadata_store:
+        with self._write_lock:
+            metadata = self._metadata_snapshot.get(table_name)
+            if metadata is None:
                 return False
             
-            metadata = self.metadata_store[table_name]
-            for shard in metadata.shards:
+            for i, shard in enumerate(metadata.shards):
                 if shard.shard_id == shard_id:
-                    shard.key_range = key_range
-                    shard.last_updated = time.time()
+                    shards = list(metadata.shards)
+                    shards[i] = replace(shard, key_range=key_range, last_updated=time.time())
+                    self._replace_table(metadata, shards, metadata.total_shards)
                     return True
             return False
     
     def set_shard_status(self, shard_id: str, status: str) -> bool:
         """设置分片状态"""
-        with self.lock:
-            for metadata in self.metadata_store.values():
-                for shard in metadata.shards:
+        with self._write_lock:
+            for metadata in self._metadata_snapshot.values():
+                for i, shard in enumerate(metadata.shards):
                     if shard.shard_id == shard_id:
-                        shard.status = status
-                        shard.last_updated = time.time()
+                        shards = list(metadata.shards)
+                        shards[i] = replace(shard, status=status, last_updated=time.time())
+                        self._replace_table(metadata, shards, metadata.total_shards)
                         return True
             return False
     
     def add_shard(self, table_name: str, node_id: str) -> str:
         """添加新分片"""
-        with self.lock:
-            if table_name not in self.metadata_store:
+        with self._write_lock:
+            metadata = self._metadata_snapshot.get(table_name)
+            if metadata is None:
                 raise ValueError(f"Table {table_name} is not sharded")
             
-            metadata = self.metadata_store[table_name]
             shard_id = f"{table_name}_shard_{len(metadata.shards)}"
             
             new_shard = ShardInfo(
@@ -383,65 +620,64 @@ class ShardManager:
                 shard_type=metadata.shard_type
             )
             
-            metadata.shards.append(new_shard)
-            metadata.total_shards += 1
+            self._replace_table(metadata, metadata.shards + [new_shard], metadata.total_shards + 1)
             
             return shard_id
     
     def remove_shard(self, table_name: str, shard_id: str) -> bool:
         """移除分片"""
-        with self.lock:
-            if table_name not in self.metadata_store:
+        with self._write_lock:
+            metadata = self._metadata_snapshot.get(table_name)
+            if metadata is None:
                 return False
             
-            metadata = self.metadata_store[table_name]
             for i, shard in enumerate(metadata.shards):
                 if shard.shard_id == shard_id:
-                    metadata.shards.pop(i)
-                    metadata.total_shards -= 1
+                    self._replace_table(metadata, metadata.shards[:i] + metadata.shards[i + 1:],
+                                        metadata.total_shards - 1)
                     return True
             return False
     
     def get_statistics(self) -> Dict[str, Any]:
         """获取分片统计信息"""
-        with self.lock:
-            stats = {
-                'total_sharded_tables': len(self.metadata_store),
-                'tables': {}
+        snapshot = self._metadata_snapshot
+        stats = {
+            'total_sharded_tables': len(snapshot),
+            'tables': {}
+        }
+        
+        for table_name, metadata in snapshot.items():
+            active_shards = len(metadata.active_shard_ids)
+            stats['tables'][table_name] = {
+                'shard_type': metadata.shard_type.value,
+                'shard_key': metadata.shard_key,
+                'total_shards': metadata.total_shards,
+                'active_shards': active_shards,
+                'created_time': metadata.created_time
             }
-            
-            for table_name, metadata in self.metadata_store.items():
-                active_shards = sum(1 for shard in metadata.shards if shard.status == "active")
-                stats['tables'][table_name] = {
-                    'shard_type': metadata.shard_type.value,
-                    'shard_key': metadata.shard_key,
-                    'total_shards': metadata.total_shards,
-                    'active_shards': active_shards,
-                    'created_time': metadata.created_time
-                }
-            
-            return stats
+        
+        return stats
     
     def export_metadata(self) -> str:
         """导出分片元数据为JSON"""
-        with self.lock:
-            export_data = {}
-            for table_name, metadata in self.metadata_store.items():
-                export_data[table_name] = {
-                    'table_name': metadata.table_name,
-                    'shard_key': metadata.shard_key,
-                    'shard_type': metadata.shard_type.value,
-                    'total_shards': metadata.total_shards,
-                    'created_time': metadata.created_time,
-                    'shards': [asdict(shard) for shard in metadata.shards]
-                }
-            return json.dumps(export_data, indent=2, default=str)
+        export_data = {}
+        for table_name, metadata in self._metadata_snapshot.items():
+            export_data[table_name] = {
+                'table_name': metadata.table_name,
+                'shard_key': metadata.shard_key,
+                'shard_type': metadata.shard_type.value,
+                'total_shards': metadata.total_shards,
+                'created_time': metadata.created_time,
+                'shards': [asdict(shard) for shard in metadata.shards]
+            }
+        return json.dumps(export_data, indent=2, default=str)
     
     def import_metadata(self, metadata_json: str) -> bool:
         """从JSON导入分片元数据"""
         try:
-            with self.lock:
+            with self._write_lock:
                 import_data = json.loads(metadata_json)
+                store = dict(self._metadata_snapshot)
                 
                 for table_name, table_data in import_data.items():
                     shards = []
@@ -459,8 +695,10 @@ class ShardManager:
                         created_time=table_data['created_time']
                     )
                     
-                    self.metadata_store[table_name] = metadata
+                    store[table_name] = metadata
                 
+                # 全部解析成功后一次性发布
+                self._publish(store)
                 return True
         except Exception as e:
             print(f"Error importing metadata: {e}")
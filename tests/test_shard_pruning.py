@@ -0,0 +1,53 @@
+"""
+测试范围分片的查询裁剪
+"""
+
+import sys
+from pathlib import Path
+sys.path.insert(0, str(Path(__file__).parent.parent))
+
+import pytest
+
+from src.distributed.sharding import ShardManager, ShardingType
+from src.distributed.query_processor import DistributedQueryOptimizer
+
+
+@pytest.fixture
+def optimizer():
+    manager = ShardManager()
+    manager.create_sharded_table('t', 'id', ShardingType.RANGE, 2, ['node1', 'node2'])
+    manager.update_shard_range('t', 't_shard_0', (0, 100))
+    manager.update_shard_range('t', 't_shard_1', (100, 200))
+    return DistributedQueryOptimizer(manager)
+
+
+def _target_shards(optimizer, sql):
+    plan = optimizer.optimize_query(sql, 't')
+    return sorted(fragment.target_shard for fragment in plan.fragments)
+
+
+@pytest.mark.parametrize('where, expected', [
+    ('id <= 100', ['t_shard_0', 't_shard_1']),
+    ('id < 100', ['t_shard_0']),
+    ('id <= 99', ['t_shard_0']),
+    ('id >= 100', ['t_shard_1']),
+    ('id > 99', ['t_shard_0', 't_shard_1']),
+    ('id > 100', ['t_shard_1']),
+    ('id >= 99', ['t_shard_0', 't_shard_1']),
+    ('id = 100', ['t_shard_1']),
+    ('id >= 50 AND id <= 100', ['t_shard_0', 't_shard_1']),
+])
+def test_range_boundaries(optimizer, where, expected):
+    assert _target_shards(optimizer, f"SELECT * FROM t WHERE {where}") == expected
+    assert _target_shards(optimizer, f"DELETE FROM t WHERE {where}") == expected
+
+
+def test_or_falls_back_to_all_shards(optimizer):
+    sql = "SELECT * FROM t WHERE id = 1 OR id = 2"
+    assert _target_shards(optimizer, sql) == ['t_shard_0', 't_shard_1']
+
+
+def test_in_list_unions_shards(optimizer):
+    assert _target_shards(optimizer, "SELECT * FROM t WHERE id IN (1, 2)") == ['t_shard_0']
+    assert _target_shards(optimizer, "SELECT * FROM t WHERE id IN (1, 150)") == ['t_shard_0', 't_shard_1']
+    assert _target_shards(optimizer, "DELETE FROM t WHERE id IN (150, 199)") == ['t_shard_1']